@@ -1,16 +1,25 @@
-import sys, os, ctypes, threading, winreg
+import sys, os, ctypes, threading, winreg, time
+import multiprocessing
+
+# App congelada: el mismo .exe hace de proceso Ghostscript (pdf/gs_worker.py),
+# antes de cargar la GUI y el OCR
+if len(sys.argv) > 1 and sys.argv[1] == "--gs-worker":
+    from pdf.gs_worker import main as _gs_worker
+    sys.exit(_gs_worker(sys.argv[2:]))
+
 import customtkinter as ctk
 from tkinter import messagebox
 
 from utils.log_utils import (
-    set_debug, is_debug, registrar_log,
+    set_debug, is_debug, registrar_log, cerrar_logs,
     registrar_link_documento, obtener_link_documento
 )
+from utils import metricas
 from core.monitor_core import aplicar_nueva_config
+from core import historial
+from gui.lista_virtual import ListaVirtual, clave_orden
 from gui.apariencia_gui import cargar_tamano_log, guardar_tamano_log, abrir_modal_apariencia
 
-import re
-
 # === assets e icono ===
 # getattr = pregunta si el atributo sys.frozen existe y es verdadero, si el programa es un .exe estara en True si es Python normal .py estara en False
 if getattr(sys, "frozen", False):  
@@ -65,11 +74,11 @@ def abrir_panel_debug(root):
     aplicar_icono(win)
     win.after(200, lambda: aplicar_icono(win))
 
-    ancho, alto = 300, 200
+    ancho, alto = 620, 560
     x = (win.winfo_screenwidth() - ancho) // 2
     y = (win.winfo_screenheight() - alto) // 2
     win.geometry(f"{ancho}x{alto}+{x}+{y}")
-    win.resizable(False, False)
+    win.resizable(True, True)
 
     win.transient(root)
     win.grab_set()
@@ -85,7 +94,7 @@ def abrir_panel_debug(root):
     titulo.pack(pady=(16, 10))
 
     frame = ctk.CTkFrame(win)
-    frame.pack(fill="both", expand=True, padx=16, pady=10)
+    frame.pack(fill="x", padx=16, pady=10)
 
     def aplicar_estado():
         # Solo flags OCR (independientes del debug general)
@@ -100,9 +109,44 @@ def abrir_panel_debug(root):
     sw_fact = ctk.CTkSwitch(frame, text="Ver OCR Factura", variable=var_fact, command=aplicar_estado)
     sw_fact.pack(anchor="w", padx=14, pady=8)
 
+    # ---- Tiempos por etapa (utils/metricas, siempre activos) ----
+    ctk.CTkLabel(
+        win, text="Tiempos por etapa (desde el inicio o el último reinicio)",
+        font=ctk.CTkFont(size=14, weight="bold")
+    ).pack(anchor="w", padx=16)
+
+    txt_metricas = ctk.CTkTextbox(win, font=ctk.CTkFont(family="Consolas", size=12), wrap="none")
+    txt_metricas.pack(fill="both", expand=True, padx=16, pady=(4, 8))
+
+    def _ms(segundos):
+        return f"{segundos * 1000:,.0f}"
+
+    def refrescar_metricas():
+        if not win.winfo_exists():
+            return
+        filas = metricas.resumen()
+        lineas = [f"{'etapa':<26}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}"]
+        for f in filas:
+            lineas.append(f"{f['etapa'][:25]:<26}{f['n']:>7}{_ms(f['p50_s']):>10}{_ms(f['p95_s']):>10}{_ms(f['max_s']):>10}")
+        if not filas:
+            lineas.append("(sin documentos procesados todavía)")
+        txt_metricas.configure(state="normal")
+        txt_metricas.delete("1.0", "end")
+        txt_metricas.insert("1.0", "\n".join(lineas))
+        txt_metricas.configure(state="disabled")
+        win.after(1000, refrescar_metricas)
+
+    def exportar_metricas():
+        metricas.exportar()
+        messagebox.showinfo("Métricas", f"Exportadas en:\n{metricas.ruta_json}\n{metricas.ruta_csv}", parent=win)
+
     btn_frame = ctk.CTkFrame(win, fg_color="transparent")
     btn_frame.pack(fill="x", padx=16, pady=(0, 12))
     ctk.CTkButton(btn_frame, text="Cerrar", command=win.destroy).pack(side="right")
+    ctk.CTkButton(btn_frame, text="Exportar JSON/CSV", command=exportar_metricas).pack(side="left")
+    ctk.CTkButton(btn_frame, text="Reiniciar", command=metricas.reiniciar).pack(side="left", padx=(8, 0))
+
+    refrescar_metricas()
 
     # Aplica estado inicial (por si el módulo cambió)
     aplicar_estado()
@@ -136,13 +180,19 @@ def instanciaUnica():
         show_startup_error("FacturaScan ya está en ejecución.")
         sys.exit(0)
 
+# Los procesos hijo del motor OCR (multiprocessing/spawn) re-importan este módulo
+# como "__mp_main__": no deben reclamar la instancia única ni abrir la configuración.
+ES_PROCESO_PRINCIPAL = __name__ == "__main__"
+
 # Solo 1 instancia en ejecución
-instanciaUnica()
+if ES_PROCESO_PRINCIPAL:
+    multiprocessing.freeze_support()
+    instanciaUnica()
 
 # Imports críticos
 try:
     from gui.config_gui import cargar_o_configurar, actualizar_rutas, seleccionar_razon_sucursal_grid
-    from core.monitor_core import  procesar_archivo, procesar_entrada_una_vez
+    from core.monitor_core import  procesar_archivo, procesar_entrada_una_vez, iniciar_vigilancia
 except Exception as e:
     show_startup_error(f"No se pudo importar un módulo crítico:\n\n{e}")
     sys.exit(1)
@@ -153,7 +203,7 @@ for _mod in ["PIL", "pdf2image", "easyocr", "win32com.client", "reportlab"]:
     if importlib.util.find_spec(_mod) is None:
         faltan.append(f"- {_mod}: no encontrado")
 
-if faltan:
+if faltan and ES_PROCESO_PRINCIPAL:
     show_startup_error("Módulos opcionales no disponibles:\n\n" + "\n".join(faltan))
 
 # Helper para terminar con mensaje
@@ -175,15 +225,16 @@ def _cancelar_todos_after(win):
 
 # CONFIGURACIÓN INICIAL
 variables = None
-try:
-    variables = cargar_o_configurar()
-except Exception as e:
-    fatal("CONFIG", e)
+if ES_PROCESO_PRINCIPAL:
+    try:
+        variables = cargar_o_configurar()
+    except Exception as e:
+        fatal("CONFIG", e)
 
-if variables is None:
-    fatal("CONFIG", Exception("No se obtuvo configuración"))
+    if variables is None:
+        fatal("CONFIG", Exception("No se obtuvo configuración"))
 
-aplicar_nueva_config(variables)
+    aplicar_nueva_config(variables)
 
 from inicial import __version__, MOSTRAR_BT_CAMBIAR_SUCURSAL_OF, ACTUALIZAR_PROGRAMA
 VERSION = __version__
@@ -298,6 +349,14 @@ def cerrar_aplicacion(ventana, modales_abiertos=None):
         except Exception:
             pass
     finally:
+        # os._exit no corre los atexit: métricas, logs y pool de Ghostscript a mano
+        try:
+            metricas.cerrar()
+            if "pdf.gs_api" in sys.modules:
+                sys.modules["pdf.gs_api"].cerrar()
+            cerrar_logs()
+        except Exception:
+            pass
         os._exit(0)
 
 # Apariencia botones:
@@ -307,12 +366,25 @@ HOBERCOLOR = "#00C9B1"
 TEXCOLOR = "#000000"
 BORDERCOLOR = "#000000"
 
+# Historial: máximo de resultados por búsqueda (los más recientes) y pausa de
+# tecleo antes de buscar en vivo
+LIMITE_HISTORIAL = 2000
+ESPERA_BUSQUEDA_VIVO_MS = 350
+
+# Consola (stdout/stderr en el textbox): lo encolado se junta en UN insert por
+# cuadro, drenando la cola como máximo CONSOLA_PRESUPUESTO_MS; el textbox guarda
+# las últimas CONSOLA_MAX_LINEAS y recorta de a CONSOLA_RECORTE_LINEAS.
+CONSOLA_INTERVALO_MS = 50
+CONSOLA_PRESUPUESTO_MS = 8
+CONSOLA_MAX_LINEAS = 3000
+CONSOLA_RECORTE_LINEAS = 500
+
 
 # ================== INTERFAZ PRINCIPAL ==================
 def menu_Principal():
     from PIL import Image
     from datetime import datetime
-    from core.scanner import escanear_y_guardar_pdf, seleccionar_scanner_predeterminado
+    from core.scanner import escanear_y_guardar_pdf, seleccionar_scanner_predeterminado, origen_ultimo_escaneo
 
     registrar_log("🟢 FacturaScan iniciado correctamente")
 
@@ -339,6 +411,13 @@ def menu_Principal():
     except Exception:
         pass
 
+    # Cola de compresión diferida (retoma lo que quedó pendiente de la sesión anterior)
+    try:
+        from core.monitor_core import iniciar_compresion_diferida
+        iniciar_compresion_diferida()
+    except Exception:
+        pass
+
     # Centro y tamaño
     ancho, alto = 720, 600
     x = (ventana.winfo_screenwidth() - ancho) // 2
@@ -558,6 +637,7 @@ def menu_Principal():
         ).pack(anchor="w")
 
         def _limpiar_filtros():
+            last_search_token["value"] += 1   # cancela una búsqueda en curso
             var_anio.set("Todos")
             var_mes.set("Todos")
             var_dia.set("Todos")
@@ -566,16 +646,14 @@ def menu_Principal():
             _actualizar_dias()
             # Si estaba cargando/buscando, oculta el spinner
             _set_loading(False)
+            searching["value"] = False
+            lbl_estado.configure(text="")
 
             # Limpia resultados y muestra placeholder
-            for w in cont_lista.winfo_children():
-                w.destroy()
-
-            ctk.CTkLabel(
-                cont_lista,
-                text="✅ Filtros limpiados. Ajusta los filtros y presiona “Buscar” para listar documentos.",
-                text_color="#16a34a"  # verde suave
-            ).pack(pady=24)
+            lista.mostrar_mensaje(
+                "✅ Filtros limpiados. Ajusta los filtros y presiona “Buscar” para listar documentos.",
+                "#16a34a"  # verde suave
+            )
 
             # (opcional) enfocar el campo de búsqueda para seguir rápido
             try:
@@ -628,6 +706,10 @@ def menu_Principal():
         )
         cb_anio.pack(side="left", padx=(0, 16))
 
+        # Estado de la búsqueda (resultados que van llegando / límite)
+        lbl_estado = ctk.CTkLabel(fila1, text="", font=fuente_filtro, text_color="#6b7280")
+        lbl_estado.pack(side="right")
+
         # Fila 2: buscador + tipo + Buscar + Cerrar
         fila2 = ctk.CTkFrame(filtros, fg_color="transparent")
         fila2.pack(fill="x", pady=(4, 8))
@@ -678,17 +760,26 @@ def menu_Principal():
         )
         btn_limpiar.pack(side="right", padx=(8, 8))
 
-        # ---- Zona de lista (scrollable) ----
-        cont_lista = ctk.CTkScrollableFrame(hist, fg_color="#f9fafb")
-        cont_lista.pack(fill="both", expand=True, padx=16, pady=(0, 12))
+        # ---- Zona de lista (virtualizada: solo existen las filas visibles) ----
+        columnas_hist = [
+            {"clave": "fecha", "titulo": "Fecha", "ancho": 10,
+             "formato": lambda f: f.strftime("%Y-%m-%d") if f and f.year > 1 else "-"},
+            {"clave": "rut", "titulo": "RUT", "ancho": 11, "alinear": ">"},
+            {"clave": "numero", "titulo": "Número", "ancho": 15, "alinear": ">"},
+            {"clave": "archivo", "titulo": "Archivo", "ancho": 40},
+        ]
+        lista = ListaVirtual(
+            hist,
+            columnas_hist,
+            al_activar=lambda fila: _activar_fila(fila),
+            al_ordenar=lambda clave, desc: _ordenar_arbol(clave, desc),
+            font=fuente_row,
+            orden=("fecha", True),
+        )
+        lista.pack(fill="both", expand=True, padx=16, pady=(0, 12))
 
         # Placeholder inicial
-        placeholder = ctk.CTkLabel(
-            cont_lista,
-            text="Ajusta los filtros y presiona “Buscar” para listar documentos.",
-            text_color=HOBERCOLOR
-        )
-        placeholder.pack(pady=24)
+        lista.mostrar_mensaje("Ajusta los filtros y presiona “Buscar” para listar documentos.", HOBERCOLOR)
 
         # ---- Overlay de carga (spinner) ----
         loading = ctk.CTkFrame(hist, fg_color="white", corner_radius=12)
@@ -769,223 +860,92 @@ def menu_Principal():
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo abrir el archivo:\n{e}")
 
-        # Mapa año -> info {frame, visible}
-        secciones_ano = {}
+        # Árbol año → mes → documentos, aplanado en filas de la lista virtual.
+        # Expandir/colapsar solo rearma la lista de Python: no crea widgets.
+        arbol = {
+            "agrup": {},          # {anio: {mes: [regs]}}
+            "abiertos": set(),    # anios y (anio, mes) expandidos
+            "orden": ("fecha", True),
+            "ordenados": {},      # caché {(anio, mes): regs ordenados según "orden"}
+        }
+
+        def _nombre_mes(m):
+            nombres = {
+                1:"Enero",2:"Febrero",3:"Marzo",4:"Abril",5:"Mayo",6:"Junio",
+                7:"Julio",8:"Agosto",9:"Septiembre",10:"Octubre",11:"Noviembre",12:"Diciembre"
+            }
+            return nombres.get(m, str(m))
+
+        def _regs_mes(anio, mes):
+            key = (anio, mes)
+            if key not in arbol["ordenados"]:
+                clave, desc = arbol["orden"]
+                if clave == "fecha":
+                    orden_key = lambda x: (x["fecha"], x.get("archivo") or "")
+                else:
+                    orden_key = lambda x: (clave_orden(x.get(clave)), x["fecha"])
+                arbol["ordenados"][key] = sorted(arbol["agrup"][anio][mes], key=orden_key, reverse=desc)
+            return arbol["ordenados"][key]
+
+        def _refrescar_arbol(conservar_posicion=False):
+            filas = []
+            agrup, abiertos = arbol["agrup"], arbol["abiertos"]
+            for anio in sorted(agrup.keys(), reverse=True):
+                abierto = anio in abiertos
+                filas.append({"_grupo": f"{'▾' if abierto else '▸'} Año {anio}", "_nivel": 0, "_id": anio})
+                if not abierto:
+                    continue
+                for mes in sorted(agrup[anio].keys(), reverse=True):
+                    abierto_mes = (anio, mes) in abiertos
+                    n = len(agrup[anio][mes])
+                    filas.append({
+                        "_grupo": f"{'▾' if abierto_mes else '▸'} {_nombre_mes(mes)} ({n})",
+                        "_nivel": 1,
+                        "_id": (anio, mes),
+                    })
+                    if abierto_mes:
+                        filas.extend(_regs_mes(anio, mes))
+            lista.mostrar(filas, conservar_posicion=conservar_posicion)
+
+        def _activar_fila(fila):
+            if "_grupo" in fila:
+                # Año o mes: alternar abierto/cerrado
+                abiertos = arbol["abiertos"]
+                abiertos.symmetric_difference_update({fila["_id"]})
+                _refrescar_arbol(conservar_posicion=True)
+            else:
+                _abrir_pdf(fila["ruta"])
 
-        def _pintar_por_ano(lista):
-            # Limpia
-            for w in cont_lista.winfo_children():
-                w.destroy()
+        def _ordenar_arbol(clave, desc):
+            arbol["orden"] = (clave, desc)
+            arbol["ordenados"].clear()
+            _refrescar_arbol(conservar_posicion=True)
 
-            if not lista:
-                ctk.CTkLabel(
-                    cont_lista,
-                    text="Sin resultados para los filtros ingresados.",
-                    text_color="#6b7280"
-                ).pack(pady=20)
-                return
+        def _agregar_registros(registros, reemplazar=False):
+            """Suma un lote de resultados al árbol (o lo reemplaza) conservando lo expandido."""
+            if reemplazar:
+                arbol["agrup"] = {}
+            agrup = arbol["agrup"]
 
             # --- Agrupar: año -> mes -> registros ---
-            from datetime import datetime as _dt_min
-            agrup = {}  # {anio: {mes: [regs]}}
-
-            for r in lista:
+            for r in registros:
                 anio = r.get("anio")
                 mes = r.get("mes")
                 if not anio or not mes:
                     continue
                 agrup.setdefault(anio, {}).setdefault(mes, []).append(r)
+                arbol["ordenados"].pop((anio, mes), None)
+            if reemplazar:
+                arbol["ordenados"] = {}
 
-            # Orden: años desc, meses desc
-            anios_ordenados = sorted(agrup.keys(), reverse=True)
-
-            # Estado UI: año abierto/cerrado, mes abierto/cerrado
-            ui_state = {
-                "anio": {},   # {anio: {"visible": bool, "frame": frame, "header": header}}
-                "mes": {}     # {(anio, mes): {"visible": bool, "frame": frame, "header": header}}
-            }
-
-            def _nombre_mes(m):
-                nombres = {
-                    1:"Enero",2:"Febrero",3:"Marzo",4:"Abril",5:"Mayo",6:"Junio",
-                    7:"Julio",8:"Agosto",9:"Septiembre",10:"Octubre",11:"Noviembre",12:"Diciembre"
-                }
-                return nombres.get(m, str(m))
-
-            def _toggle_mes(anio, mes):
-                key = (anio, mes)
-                info = ui_state["mes"].get(key)
-                if not info:
-                    return
-
-                if info["visible"]:
-                    info["frame"].pack_forget()
-                    info["visible"] = False
-                    return
-
-                # Si se va a abrir: crear/repintar lista de docs del mes
-                frame_mes = info["frame"]
-
-                # Limpiar contenido anterior para evitar duplicados
-                for w in frame_mes.winfo_children():
-                    w.destroy()
-
-                regs = sorted(
-                    agrup[anio][mes],
-                    key=lambda x: (x["fecha"] or _dt_min.min, x.get("archivo") or ""),
-                    reverse=True
-                )
-
-                # Pintar documentos del mes (solo aquí, lazy)
-                for r in regs:
-                    fecha_txt = r["fecha"].strftime("%Y-%m-%d") if r.get("fecha") else "-"
-                    rut_txt = r.get("rut") or "-"
-                    num_txt = r.get("numero") or "-"
-                    nom_txt = r.get("archivo") or "-"
-
-                    texto_row = (
-                        f"{fecha_txt}   |   RUT: {rut_txt:>11}   |   "
-                        f"Número: {num_txt:>10}   |   {nom_txt}"
-                    )
-
-                    btn_row = ctk.CTkButton(
-                        frame_mes,
-                        text=texto_row,
-                        anchor="w",
-                        height=28,
-                        fg_color="#f3f4f6",
-                        hover_color="#e5e7eb",
-                        text_color="#111827",
-                        font=fuente_row,
-                        command=lambda p=r["ruta"]: _abrir_pdf(p)
-                    )
-                    btn_row.pack(fill="x", padx=8, pady=2)
-
-                # Mostrar el frame justo debajo del header de mes
-                frame_mes.pack(fill="x", padx=26, pady=(0, 6), after=info["header"])
-                info["visible"] = True
-
-            def _toggle_anio(anio):
-                info = ui_state["anio"].get(anio)
-                if not info:
-                    return
-
-                if info["visible"]:
-                    # Colapsa todo el año (y sus meses si estaban)
-                    info["frame"].pack_forget()
-                    info["visible"] = False
-                    return
-
-                # Expandir: pintar SOLO los headers de meses (no documentos)
-                frame_anio = info["frame"]
-                for w in frame_anio.winfo_children():
-                    w.destroy()
-
-                meses = sorted(agrup[anio].keys(), reverse=True)
-
-                for mes in meses:
-                    header_mes = ctk.CTkButton(
-                        frame_anio,
-                        text=f"▸ {_nombre_mes(mes)}",
-                        anchor="w",
-                        height=30,
-                        fg_color="#eef2ff",
-                        hover_color="#e0e7ff",
-                        text_color="#111827",
-                        font=ctk.CTkFont(size=13, weight="bold")
-                    )
-                    header_mes.pack(fill="x", padx=8, pady=(6, 0))
-
-                    frame_mes = ctk.CTkFrame(frame_anio, fg_color="white", corner_radius=8)
-                    # no lo packeamos hasta que se abra
-
-                    ui_state["mes"][(anio, mes)] = {
-                        "visible": False,
-                        "frame": frame_mes,
-                        "header": header_mes
-                    }
-
-                    header_mes.configure(command=lambda a=anio, m=mes: _toggle_mes(a, m))
-
-                # Mostrar el frame del año debajo del header del año
-                frame_anio.pack(fill="x", padx=16, pady=(0, 6), after=info["header"])
-                info["visible"] = True
-
-            # Pintar AÑOS (solo headers)
-            for anio in anios_ordenados:
-                header_anio = ctk.CTkButton(
-                    cont_lista,
-                    text=f"Año {anio}",
-                    anchor="w",
-                    height=34,
-                    fg_color="#e5e7eb",
-                    hover_color="#d1d5db",
-                    text_color="#111827",
-                    font=ctk.CTkFont(size=14, weight="bold")
-                )
-                header_anio.pack(fill="x", pady=(6, 0))
-
-                frame_anio = ctk.CTkFrame(cont_lista, fg_color="white", corner_radius=8)
-                # no se muestra hasta abrir
-
-                ui_state["anio"][anio] = {
-                    "visible": False,
-                    "frame": frame_anio,
-                    "header": header_anio
-                }
-
-                header_anio.configure(command=lambda a=anio: _toggle_anio(a))
-
-        def _filtrar(registros, sel_anio, sel_mes, sel_dia, sel_tipo, texto):
-            texto = (texto or "").strip().lower()
-
-            def coincide(r):
-                if sel_anio != "Todos":
-                    if str(r.get("anio")) != sel_anio:
-                        return False
-
-                if sel_mes != "Todos":
-                    try:
-                        m_int = int(sel_mes)
-                    except Exception:
-                        return False
-                    if r.get("mes") != m_int:
-                        return False
-
-                if sel_dia != "Todos":
-                    try:
-                        d_int = int(sel_dia)
-                    except Exception:
-                        return False
-                    if r.get("dia") != d_int:
-                        return False
-
-                if sel_tipo != "Todos":
-                    if r.get("tipo") != sel_tipo:
-                        return False
-
-                if texto:
-                    cad = " ".join([
-                        r.get("rut", ""),
-                        r.get("numero", ""),
-                        r.get("archivo", ""),
-                        r.get("tipo", ""),
-                    ]).lower()
-                    if texto not in cad:
-                        return False
-
-                return True
-
-            return [r for r in registros if coincide(r)]
-
-        def _iniciar_busqueda():
-            # Evitar doble click
-            if searching["value"]:
-                return
+            if agrup:
+                _refrescar_arbol(conservar_posicion=True)
 
-            searching["value"] = True
+        def _iniciar_busqueda(en_vivo=False):
+            # Una búsqueda nueva invalida (y corta) la anterior vía token
             last_search_token["value"] += 1
             token = last_search_token["value"]
+            searching["value"] = True
 
             # snapshot de filtros al momento del click
             sel_anio = var_anio.get()
@@ -994,39 +954,85 @@ def menu_Principal():
             sel_tipo = var_tipo_doc.get()
             texto    = var_buscar.get()
 
-            _set_loading(True, "🔎 Buscando documentos…")
+            arbol["agrup"], arbol["abiertos"], arbol["ordenados"] = {}, set(), {}
+            lista.mostrar_mensaje("🔎 Buscando documentos…")
+            lbl_estado.configure(text="🔎 Buscando…")
+            # En vivo no se bloquea el buscador (el usuario sigue tecleando)
+            if not en_vivo:
+                _set_loading(True, "🔎 Buscando documentos…")
+
+            def vigente():
+                return ui_alive["value"] and token == last_search_token["value"]
+
+            def al_lote(registros, reemplazar):
+                def _ui():
+                    if not vigente():
+                        return
+                    _set_loading(False)   # con el primer lote ya hay algo que mirar
+                    _agregar_registros(registros, reemplazar)
+                    n = sum(len(regs) for meses in arbol["agrup"].values() for regs in meses.values())
+                    lbl_estado.configure(text=f"🔎 {n} resultado(s)…")
+                hist.after(0, _ui)
 
             def worker():
                 try:
-                    # Carga “pesada”
-                    regs = _construir_historial_desde_salida()
-                    filtrados = _filtrar(regs, sel_anio, sel_mes, sel_dia, sel_tipo, texto)
+                    total = _buscar_en_historial(
+                        sel_anio, sel_mes, sel_dia, sel_tipo, texto,
+                        al_lote=al_lote,
+                        cancelado=lambda: not vigente(),
+                        limite=LIMITE_HISTORIAL,
+                    )
 
                     def _ui():
                         # si se cerró la ventana o ya hubo otra búsqueda, ignorar
-                        if not ui_alive["value"]:
+                        if not vigente():
                             return
-                        if token != last_search_token["value"]:
-                            return
-
-                        _pintar_por_ano(filtrados)
                         _set_loading(False)
                         searching["value"] = False
+                        if not total:
+                            lista.mostrar_mensaje("Sin resultados para los filtros ingresados.")
+                            lbl_estado.configure(text="")
+                        elif total >= LIMITE_HISTORIAL:
+                            lbl_estado.configure(text=f"Mostrando los {total} más recientes (afina los filtros)")
+                        else:
+                            lbl_estado.configure(text=f"{total} resultado(s)")
 
                     hist.after(0, _ui)
 
                 except Exception as e:
+                    msg = str(e)   # `e` deja de existir al salir del except
+
                     def _ui_err():
-                        if not ui_alive["value"]:
+                        if not vigente():
                             return
                         _set_loading(False)
                         searching["value"] = False
-                        messagebox.showerror("Historial", f"Error al buscar documentos:\n{e}")
+                        lbl_estado.configure(text="")
+                        messagebox.showerror("Historial", f"Error al buscar documentos:\n{msg}")
 
                     hist.after(0, _ui_err)
 
             threading.Thread(target=worker, daemon=True).start()
 
+        # Búsqueda en vivo: tras una pausa al teclear (≥ 3 caracteres, ej. parte de un RUT)
+        busqueda_vivo = {"after_id": None}
+
+        def _on_tecleo(*_):
+            if busqueda_vivo["after_id"] is not None:
+                try:
+                    hist.after_cancel(busqueda_vivo["after_id"])
+                except Exception:
+                    pass
+                busqueda_vivo["after_id"] = None
+            if len(var_buscar.get().strip()) >= 3:
+                def _disparar():
+                    busqueda_vivo["after_id"] = None
+                    if ui_alive["value"]:
+                        _iniciar_busqueda(en_vivo=True)
+                busqueda_vivo["after_id"] = hist.after(ESPERA_BUSQUEDA_VIVO_MS, _disparar)
+
+        var_buscar.trace_add("write", _on_tecleo)
+
         # Enter en el buscador = Buscar
         entry_buscar.bind("<Return>", lambda e: _iniciar_busqueda())
 
@@ -1095,95 +1101,87 @@ def menu_Principal():
             pass
 
     # === HISTORIAL DESDE CARPETA DE SALIDA ============================
-    def _construir_historial_desde_salida():
+    def _buscar_en_historial(sel_anio, sel_mes, sel_dia, sel_tipo, texto, al_lote, cancelado=None, limite=None):
         """
-        Lee TODOS los PDFs que existan en la carpeta de salida y subcarpetas
-        y construye una lista de registros con:
-        - ruta, archivo
-        - fecha (desde fecha de modificación del archivo)
-        - anio, mes, dia
-        - rut
-        - numero (factura o guía)
-        - tipo: 'Factura', 'Guía de despacho', 'CHEP' u 'Otros'
+        Busca en la carpeta de salida ("Todos" = sin filtro) y entrega los registros
+        por partes llamando `al_lote(registros, reemplazar)` desde este hilo:
+          1) Lo que ya está en el índice (core/historial.py), más nuevo primero: aparece al instante.
+          2) Reconciliación del índice (solo carpetas cambiadas): los PDFs nuevos se
+             agregan a medida que aparecen.
+          3) Si hubo borrados o fechas actualizadas (o el límite dejó fuera PDFs nuevos)
+             se repite la consulta y se reemplaza todo.
+        `cancelado()` → True corta en cualquier punto (también el recorrido de carpetas).
+        `limite`: máximo de registros a entregar. Devuelve cuántos se entregaron.
+        Cada registro: ruta, archivo, fecha (datetime), anio, mes, dia, rut,
+        numero, tipo ('Factura', 'Guía de despacho', 'CHEP' u 'Otros').
         """
         carpeta_salida = variables.get("CarpSalida")
         if not carpeta_salida or not os.path.isdir(carpeta_salida):
-            return []
-
-        registros = []
-
-        for root, dirs, files in os.walk(carpeta_salida):
-            for name in files:
-                if not name.lower().endswith(".pdf"):
-                    continue
-
-                ruta = os.path.join(root, name)
-
-                # --- Fecha desde el sistema de archivos ---
-                try:
-                    ts = os.path.getmtime(ruta)
-                    dt = datetime.fromtimestamp(ts)
-                except Exception:
-                    dt = datetime.min
-
+            return 0
 
-                # --- Nombre base y versiones en mayúscula/minúscula ---
-                base_no_ext = os.path.splitext(name)[0]
-                lower = base_no_ext.lower()
-                upper = base_no_ext.upper()
-
-                # --- RUT ---
-                m_rut = re.search(r"(\d{7,8}-[0-9kK])", base_no_ext)
-                rut = m_rut.group(1) if m_rut else ""
-
-                # --- Tipo de documento y número ---
-                tipo = "Factura"
-                numero = ""
-
-                if "_guia_" in lower:
-                    # Guías de despacho: Lo Valledor_76505519-9_guia_252346_2025.pdf
-                    tipo = "Guía de despacho"
-                    m_num = re.search(r"_guia_([0-9]+)", lower)
-                    if m_num:
-                        numero = m_num.group(1)
-
-                elif "_chep_" in lower:
-                    # CHEP: JJ Perez_CHEP_20251118_150925.pdf
-                    tipo = "CHEP"
-                    m_num = re.search(r"_chep_([0-9]{8})_([0-9]{6})", lower)
-                    if m_num:
-                        # Ej: 20251118-150925
-                        numero = f"{m_num.group(1)}-{m_num.group(2)}"
-
-                else:
-                    # Facturas: Lo Blanco_93178000-K_factura_19211105_2025_3.pdf
-                    if "_factura_" in lower:
-                        tipo = "Factura"
-                        m_num = re.search(r"_factura_([0-9]+)", lower)
-                        if m_num:
-                            numero = m_num.group(1)
-                    else:
-                        tipo = "Otros"
-
-
-                registros.append({
-                    "ruta": ruta,
-                    "archivo": name,
-                    "rut": rut,
-                    "numero": numero,
-                    "tipo": tipo,
-                    "fecha": dt,
-                    "anio": dt.year if dt else None,
-                    "mes": dt.month if dt else None,
-                    "dia": dt.day if dt else None,
-                })
-
-        # Orden por fecha (más nuevo primero) y luego por nombre
-        registros.sort(
-            key=lambda r: ((r["fecha"] or datetime.min), r["archivo"]),
-            reverse=True
+        def _num(valor):
+            try:
+                return int(valor) if valor != "Todos" else None
+            except (TypeError, ValueError):
+                return None
+
+        filtros = dict(
+            anio=_num(sel_anio),
+            mes=_num(sel_mes),
+            dia=_num(sel_dia),
+            tipo=sel_tipo if sel_tipo != "Todos" else None,
+            texto=texto,
         )
-        return registros
+        cancelado = cancelado or (lambda: False)
+        estado = {"total": 0, "vistos": set(), "claves": [], "cambiados": 0,
+                  "nuevos": 0, "ultimo": time.monotonic()}
+
+        def _emitir(partes, reemplazar=False):
+            """Pasa lotes a la UI sin duplicados y respetando el límite. False = no seguir."""
+            if reemplazar:
+                estado["total"], estado["vistos"] = 0, set()
+            for regs in partes:
+                if cancelado():
+                    return False
+                regs = [r for r in regs if r["ruta"] not in estado["vistos"]]
+                if limite:
+                    regs = regs[:max(0, limite - estado["total"])]
+                estado["vistos"].update(r["ruta"] for r in regs)
+                estado["total"] += len(regs)
+                if regs or reemplazar:
+                    al_lote(regs, reemplazar)
+                    reemplazar = False
+                if limite and estado["total"] >= limite:
+                    return False
+            if reemplazar:
+                al_lote([], True)   # consulta vacía: igual hay que limpiar lo anterior
+            return True
+
+        def _al_avanzar(claves, n_cambiados):
+            estado["claves"].extend(claves)
+            estado["nuevos"] += len(claves)
+            estado["cambiados"] += n_cambiados
+            # Lo nuevo se muestra cada ~250 ms (no por cada carpeta)
+            if estado["claves"] and time.monotonic() - estado["ultimo"] >= 0.25:
+                _emitir(historial.iterar(carpeta_salida, claves=estado["claves"], **filtros))
+                estado["claves"], estado["ultimo"] = [], time.monotonic()
+
+        # 1) Índice tal como está
+        _emitir(historial.iterar(carpeta_salida, limite=limite, **filtros))
+
+        # 2) Ponerlo al día (cancelable) mostrando lo que aparezca
+        if cancelado():
+            return estado["total"]
+        historial.reconciliar(carpeta_salida, cancelado=cancelado, al_avanzar=_al_avanzar)
+        if cancelado():
+            return estado["total"]
+        if estado["claves"]:
+            _emitir(historial.iterar(carpeta_salida, claves=estado["claves"], **filtros))
+
+        # 3) Borrados, fechas cambiadas o nuevos que el límite dejó fuera: consulta completa otra vez
+        if estado["cambiados"] or (limite and estado["total"] >= limite and estado["nuevos"]):
+            _emitir(historial.iterar(carpeta_salida, limite=limite, **filtros), reemplazar=True)
+        return estado["total"]
 
     def imprimir_config_actual():
         """Imprime la configuración actual en el log (resumen estándar)."""
@@ -1331,11 +1329,57 @@ def menu_Principal():
             except Exception: pass
 
     # === Actualización del textbox ===
+    consola = {"after_id": None}
+
+    def _drenar_consola():
+        """Saca de la cola lo que alcance en el presupuesto y lo junta en un texto."""
+        partes, limite = [], time.perf_counter() + CONSOLA_PRESUPUESTO_MS / 1000
+        while True:
+            try:
+                partes.append(log_queue.get_nowait())
+            except _q.Empty:
+                break
+            if len(partes) % 64 == 0 and time.perf_counter() >= limite:
+                break
+        texto = "".join(partes)
+        # Si llegó más de lo que la consola guarda, solo se insertan las últimas líneas
+        if texto.count("\n") > CONSOLA_MAX_LINEAS:
+            texto = "\n".join(texto.split("\n")[-(CONSOLA_MAX_LINEAS + 1):])
+        return texto
+
+    def _recortar_consola():
+        """Borra de una vez las líneas más viejas (respeta la cabecera de sucursal)."""
+        lineas = int(texto_log.index("end-1c").split(".")[0])
+        if lineas <= CONSOLA_MAX_LINEAS + CONSOLA_RECORTE_LINEAS:
+            return
+        desde = 1
+        idx = texto_log.search("Seleccione una opción:", "1.0", stopindex="60.0")
+        if idx:
+            desde = int(idx.split(".")[0]) + 1
+        hasta = lineas - CONSOLA_MAX_LINEAS
+        if hasta > desde:
+            texto_log.delete(f"{desde}.0", f"{hasta}.0")
+
     def actualizar_texto():
-        while not log_queue.empty():
-            texto_log.insert("end", log_queue.get())
-            texto_log.see("end")
-        ventana.after(100, actualizar_texto)
+        # Una sola cadena de after: si se llama de nuevo se reprograma la existente
+        if consola["after_id"] is not None:
+            try: ventana.after_cancel(consola["after_id"])
+            except Exception: pass
+            consola["after_id"] = None
+        try:
+            texto = _drenar_consola()
+            if texto:
+                # Autoscroll solo si el usuario estaba mirando el final
+                al_final = texto_log.yview()[1] >= 0.999
+                texto_log.insert("end", texto)
+                _recortar_consola()
+                if al_final:
+                    texto_log.see("end")
+        except Exception:
+            pass
+        # Si quedó cola pendiente se sigue en el próximo ciclo del loop de Tk
+        espera = 1 if not log_queue.empty() else CONSOLA_INTERVALO_MS
+        consola["after_id"] = ventana.after(espera, actualizar_texto)
 
     # ====== Hilos de acciones principales ======
     def hilo_escanear():
@@ -1362,7 +1406,7 @@ def menu_Principal():
                 print(msg)
                 registrar_log(msg)
 
-                resultado = procesar_archivo(ruta)
+                resultado = procesar_archivo(ruta, origen=origen_ultimo_escaneo())
                 if resultado:
                     nombre_out = os.path.basename(resultado)
 
@@ -1538,6 +1582,29 @@ def menu_Principal():
     menu_app.add_command(label="Escanear documento", command=_menu_escanear)
     menu_app.add_separator()
     menu_app.add_command(label="Procesar carpeta", command=_menu_procesar)
+
+    # Modo vigilancia: procesa cada PDF que llega a la carpeta de entrada
+    vigilancia = {"obj": None}
+    var_vigilancia = tk.BooleanVar(value=False)
+
+    def _toggle_vigilancia():
+        if var_vigilancia.get():
+            try:
+                vigilancia["obj"] = iniciar_vigilancia(pausado=lambda: bool(en_proceso.get("activo")))
+                print("👁️ Modo vigilancia activado: los PDFs nuevos en la carpeta de entrada se procesan al llegar.")
+                registrar_log("👁️ Modo vigilancia activado")
+            except Exception as e:
+                var_vigilancia.set(False)
+                messagebox.showerror("Modo vigilancia", f"No se pudo activar la vigilancia:\n{e}")
+        else:
+            if vigilancia["obj"] is not None:
+                threading.Thread(target=vigilancia["obj"].detener, daemon=True).start()
+                vigilancia["obj"] = None
+            print("👁️ Modo vigilancia desactivado.")
+            registrar_log("👁️ Modo vigilancia desactivado")
+
+    menu_app.add_checkbutton(label="Modo vigilancia (procesar al llegar)",
+                             variable=var_vigilancia, command=_toggle_vigilancia)
     menubar.add_cascade(label="Menu", menu=menu_app)
     
     # --- Ajustes ---
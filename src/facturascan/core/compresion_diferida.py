@@ -0,0 +1,134 @@
+# Cola persistente de compresiones diferidas (COMPRESION_DIFERIDA en monitor_core).
+#
+#  - procesar_archivo enruta y renombra el PDF sin esperar a Ghostscript y deja
+#    aquí la ruta final: quien escanea solo espera OCR + enrutado.
+#  - La cola es una tabla SQLite (compresion_pendiente.sqlite): sobrevive a
+#    cierres de la app y los procesos hijo del motor OCR pueden encolar sin pasar
+#    por el proceso GUI.
+#  - Un único hilo del proceso GUI la vacía de a un trabajo cuando el OCR está
+#    ocioso (ocupado() en falso durante COMPRESION_DIFERIDA_OCIO_S), con
+#    Ghostscript a prioridad baja. Un trabajo se borra solo al terminar: si la
+#    app se cierra a mitad, se repite en el próximo arranque.
+#  - Si el archivo ya no está (el usuario lo movió) el trabajo se descarta; si la
+#    compresión falla se reintenta más tarde, hasta COMPRESION_DIFERIDA_INTENTOS.
+
+import os
+import time
+import threading
+
+from utils.log_utils import registrar_log_proceso
+from utils.sqlite_utils import abrir_sqlite
+from utils import metricas
+
+COMPRESION_DIFERIDA_OCIO_S     = 3     # segundos sin OCR antes de comprimir
+COMPRESION_DIFERIDA_REVISAR_S  = 5     # cada cuánto se revisa la cola si no hay aviso
+COMPRESION_DIFERIDA_INTENTOS   = 3
+
+_conexion = abrir_sqlite(
+    "compresion_pendiente.sqlite",
+    "CREATE TABLE IF NOT EXISTS pendientes ("
+    " ruta TEXT PRIMARY KEY, etiqueta TEXT NOT NULL, creado REAL NOT NULL,"
+    " intentos INTEGER NOT NULL DEFAULT 0, proximo REAL NOT NULL DEFAULT 0)",
+    timeout=10,
+)
+_aviso = threading.Event()
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def encolar(ruta, etiqueta="") -> bool:
+    """Agrega `ruta` a la cola. False si no se pudo (el llamador comprime en línea)."""
+    try:
+        con = _conexion()
+        con.execute(
+            "INSERT OR REPLACE INTO pendientes (ruta, etiqueta, creado) VALUES (?, ?, ?)",
+            (ruta, etiqueta or "", time.time()),
+        )
+        con.commit()
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Cola de compresión no disponible: {e}")
+        return False
+    _aviso.set()
+    return True
+
+
+def pendientes() -> int:
+    try:
+        return _conexion().execute("SELECT COUNT(*) FROM pendientes").fetchone()[0]
+    except Exception:
+        return 0
+
+
+def _siguiente(con):
+    return con.execute(
+        "SELECT ruta, etiqueta, intentos FROM pendientes WHERE proximo <= ? ORDER BY creado LIMIT 1",
+        (time.time(),),
+    ).fetchone()
+
+
+def _terminar(con, ruta):
+    con.execute("DELETE FROM pendientes WHERE ruta = ?", (ruta,))
+    con.commit()
+
+
+def _reintentar(con, ruta, intentos):
+    if intentos + 1 >= COMPRESION_DIFERIDA_INTENTOS:
+        registrar_log_proceso(f"❌ Compresión diferida descartada tras {intentos + 1} intentos: {ruta}")
+        return _terminar(con, ruta)
+    con.execute(
+        "UPDATE pendientes SET intentos = ?, proximo = ? WHERE ruta = ?",
+        (intentos + 1, time.time() + 60 * (intentos + 1), ruta),
+    )
+    con.commit()
+
+
+def _bucle(comprimir, ocupado):
+    ultimo_ocupado = time.monotonic()
+    while True:
+        _aviso.wait(COMPRESION_DIFERIDA_REVISAR_S)
+        _aviso.clear()
+        try:
+            con = _conexion()
+            while True:
+                if ocupado():
+                    ultimo_ocupado = time.monotonic()
+                    break
+                if time.monotonic() - ultimo_ocupado < COMPRESION_DIFERIDA_OCIO_S:
+                    break
+                trabajo = _siguiente(con)
+                if trabajo is None:
+                    break
+                ruta, etiqueta, intentos = trabajo
+                if not os.path.exists(ruta):
+                    registrar_log_proceso(f"⏭️ Compresión diferida: {ruta} ya no existe")
+                    _terminar(con, ruta)
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    comprimir(ruta, etiqueta)
+                except Exception as e:
+                    registrar_log_proceso(f"⚠️ Compresión diferida falló ({ruta}): {e}")
+                    _reintentar(con, ruta, intentos)
+                    continue
+                metricas.registrar("compresión diferida", time.perf_counter() - t0)
+                _terminar(con, ruta)
+        except Exception as e:
+            registrar_log_proceso(f"⚠️ Error en la cola de compresión: {e}")
+
+
+def iniciar(comprimir, ocupado):
+    """
+    Arranca el hilo que vacía la cola (una vez por proceso).
+    `comprimir(ruta, etiqueta)` hace el trabajo; `ocupado()` → True mientras haya OCR.
+    """
+    global _hilo
+    with _hilo_lock:
+        if _hilo is not None:
+            return
+        _hilo = threading.Thread(target=_bucle, args=(comprimir, ocupado),
+                                 name="compresion-diferida", daemon=True)
+        _hilo.start()
+    n = pendientes()
+    if n:
+        registrar_log_proceso(f"🗜️ Compresión diferida: {n} pendiente(s) de la sesión anterior")
+        _aviso.set()
@@ -0,0 +1,327 @@
+# Índice persistente del historial de documentos procesados.
+#
+#  - historial.sqlite en la carpeta de caché (utils/sqlite_utils).
+#  - monitor_core registra cada PDF en el momento en que queda en su carpeta final.
+#  - reconciliar() pone el índice al día con lo que hay en disco (copias manuales,
+#    borrados, archivos movidos o reemplazados) revisando SOLO las carpetas cuyo
+#    mtime cambió: las demás se recorren con la lista de subcarpetas guardada, sin
+#    listar archivos.
+#  - buscar() / iterar() filtran con SQL (índices por fecha y RUT) en vez de
+#    os.walk + filtro lineal; iterar() entrega los resultados por partes.
+#
+# Las rutas se comparan por su "clave" (abspath + normcase): en Windows
+# C:\Salida y c:\salida son la misma carpeta.
+
+import os
+import re
+import json
+from datetime import datetime
+
+from utils.log_utils import registrar_log_proceso
+from utils.sqlite_utils import abrir_sqlite
+
+_RE_RUT      = re.compile(r"(\d{7,8}-[0-9kK])")
+_RE_GUIA     = re.compile(r"_guia_([0-9]+)")
+_RE_CHEP     = re.compile(r"_chep_([0-9]{8})_([0-9]{6})")
+_RE_FACTURA  = re.compile(r"_factura_([0-9]+)")
+_RE_SUCURSAL = re.compile(r"^(.+?)_(?:\d{7,8}-[0-9kK]|noreconocido|chep)_", re.IGNORECASE)
+
+
+_conexion = abrir_sqlite(
+    "historial.sqlite",
+    "CREATE TABLE IF NOT EXISTS documentos ("
+    " clave TEXT PRIMARY KEY, ruta TEXT NOT NULL, carpeta TEXT NOT NULL, archivo TEXT NOT NULL,"
+    " rut TEXT, numero TEXT, tipo TEXT, sucursal TEXT,"
+    " fecha REAL, anio INTEGER, mes INTEGER, dia INTEGER);"
+    "CREATE INDEX IF NOT EXISTS idx_doc_fecha   ON documentos(fecha);"
+    "CREATE INDEX IF NOT EXISTS idx_doc_rut     ON documentos(rut);"
+    "CREATE INDEX IF NOT EXISTS idx_doc_carpeta ON documentos(carpeta);"
+    "CREATE TABLE IF NOT EXISTS directorios ("
+    " clave TEXT PRIMARY KEY, mtime REAL NOT NULL, subdirs TEXT NOT NULL);",
+)
+
+
+def _clave(ruta: str) -> str:
+    return os.path.normcase(os.path.abspath(ruta))
+
+
+def _rango(clave_raiz: str):
+    """Límites para `clave >= ? AND clave < ?`: todo lo que cuelga de la raíz (usa el índice)."""
+    prefijo = clave_raiz.rstrip("\\/") + os.sep
+    return prefijo, prefijo + "\uffff"
+
+
+def datos_desde_nombre(nombre: str) -> dict:
+    """
+    RUT, número, tipo y sucursal a partir del nombre que les pone monitor_core:
+      Lo Blanco_93178000-K_factura_19211105_2025_3.pdf
+      Lo Valledor_76505519-9_guia_252346_2025.pdf
+      JJ Perez_CHEP_20251118_150925.pdf
+    tipo: 'Factura', 'Guía de despacho', 'CHEP' u 'Otros'.
+    """
+    base = os.path.splitext(nombre)[0]
+    lower = base.lower()
+
+    m = _RE_RUT.search(base)
+    rut = m.group(1) if m else ""
+
+    numero = ""
+    if "_guia_" in lower:
+        tipo = "Guía de despacho"
+        m = _RE_GUIA.search(lower)
+        if m:
+            numero = m.group(1)
+    elif "_chep_" in lower:
+        tipo = "CHEP"
+        m = _RE_CHEP.search(lower)
+        if m:
+            # Ej: 20251118-150925
+            numero = f"{m.group(1)}-{m.group(2)}"
+    elif "_factura_" in lower:
+        tipo = "Factura"
+        m = _RE_FACTURA.search(lower)
+        if m:
+            numero = m.group(1)
+    else:
+        tipo = "Otros"
+
+    m = _RE_SUCURSAL.search(base)
+    sucursal = m.group(1) if m else ""
+    return {"rut": rut, "numero": numero, "tipo": tipo, "sucursal": sucursal}
+
+
+def _fila(ruta: str, mtime: float, sucursal: str = None):
+    nombre = os.path.basename(ruta)
+    datos = datos_desde_nombre(nombre)
+    if sucursal:
+        datos["sucursal"] = sucursal
+    dt = datetime.fromtimestamp(mtime)
+    return (
+        _clave(ruta), ruta, _clave(os.path.dirname(ruta)), nombre,
+        datos["rut"], datos["numero"], datos["tipo"], datos["sucursal"],
+        mtime, dt.year, dt.month, dt.day,
+    )
+
+_INSERT = "INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def registrar(ruta: str, sucursal: str = None):
+    """Agrega/actualiza un PDF recién ubicado. Nunca lanza: el índice es accesorio."""
+    try:
+        mtime = os.path.getmtime(ruta)
+        con = _conexion()
+        con.execute(_INSERT, _fila(ruta, mtime, sucursal))
+        con.commit()
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ No se pudo registrar en historial ({ruta}): {e}")
+
+
+def reconciliar(raiz: str, cancelado=None, al_avanzar=None) -> int:
+    """
+    Sincroniza el índice con la carpeta `raiz`. Solo lista las carpetas cuyo mtime
+    cambió desde la última vez (agregar/borrar/renombrar archivos cambia el mtime de
+    la carpeta); las demás se atraviesan con sus subcarpetas ya conocidas.
+    `cancelado()` → True corta el recorrido (lo ya revisado queda guardado).
+    En una carpeta re-listada también se actualizan los PDFs cuyo mtime ya no es
+    el guardado (reemplazados con el mismo nombre, recomprimidos).
+    `al_avanzar(claves_nuevas, n_cambiados)` se llama tras cada carpeta re-listada;
+    n_cambiados = filas borradas o actualizadas (lo ya mostrado puede estar viejo).
+    Devuelve la cantidad de carpetas re-listadas.
+    """
+    if not raiz or not os.path.isdir(raiz):
+        return 0
+
+    con = _conexion()
+    clave_raiz = _clave(raiz)
+    desde, hasta = _rango(clave_raiz)
+    conocidas = {
+        clave: (mtime, json.loads(subdirs))
+        for clave, mtime, subdirs in con.execute(
+            "SELECT clave, mtime, subdirs FROM directorios WHERE clave = ? OR (clave >= ? AND clave < ?)",
+            (clave_raiz, desde, hasta),
+        )
+    }
+
+    pendientes = [raiz]
+    vistas = set()
+    relistadas = 0
+    while pendientes:
+        if cancelado and cancelado():
+            con.commit()
+            return relistadas
+
+        carpeta = pendientes.pop()
+        clave = _clave(carpeta)
+        vistas.add(clave)
+        try:
+            # mtime ANTES de listar: un cambio durante el listado queda para la próxima
+            mtime = os.stat(carpeta).st_mtime
+        except OSError:
+            continue
+
+        previa = conocidas.get(clave)
+        if previa and previa[0] == mtime:
+            pendientes.extend(os.path.join(carpeta, s) for s in previa[1])
+            continue
+
+        subdirs, pdfs = [], {}
+        try:
+            with os.scandir(carpeta) as it:
+                for e in it:
+                    try:
+                        if e.is_dir():
+                            subdirs.append(e.name)
+                        elif e.name.lower().endswith(".pdf"):
+                            pdfs[_clave(e.path)] = e
+                    except OSError:
+                        continue
+        except OSError as e:
+            registrar_log_proceso(f"⚠️ Historial: no se pudo listar {carpeta}: {e}")
+            continue
+
+        en_indice = dict(con.execute("SELECT clave, fecha FROM documentos WHERE carpeta = ?", (clave,)))
+        borrar = [(c,) for c in en_indice.keys() - pdfs.keys()]
+        nuevos, cambiados = [], []
+        for c, e in pdfs.items():
+            try:
+                mtime_pdf = e.stat().st_mtime
+            except OSError:
+                continue
+            if c not in en_indice:
+                nuevos.append(_fila(e.path, mtime_pdf))
+            elif en_indice[c] != mtime_pdf:
+                cambiados.append((mtime_pdf, e.path))
+
+        con.executemany("DELETE FROM documentos WHERE clave = ?", borrar)
+        con.executemany(_INSERT, nuevos)
+        for mtime_pdf, ruta in cambiados:
+            # Solo la fecha: la sucursal registrada por monitor_core se conserva
+            dt = datetime.fromtimestamp(mtime_pdf)
+            con.execute(
+                "UPDATE documentos SET fecha = ?, anio = ?, mes = ?, dia = ? WHERE clave = ?",
+                (mtime_pdf, dt.year, dt.month, dt.day, _clave(ruta)),
+            )
+        con.execute(
+            "INSERT OR REPLACE INTO directorios VALUES (?, ?, ?)",
+            (clave, mtime, json.dumps(subdirs)),
+        )
+        con.commit()
+        relistadas += 1
+        pendientes.extend(os.path.join(carpeta, s) for s in subdirs)
+        if al_avanzar and (nuevos or borrar or cambiados):
+            al_avanzar([f[0] for f in nuevos], len(borrar) + len(cambiados))
+
+    # Carpetas que ya no existen (o que dejaron de colgar de la raíz)
+    for clave in conocidas.keys() - vistas:
+        con.execute("DELETE FROM documentos WHERE carpeta = ?", (clave,))
+        con.execute("DELETE FROM directorios WHERE clave = ?", (clave,))
+    con.commit()
+
+    if relistadas:
+        registrar_log_proceso(f"🗂️ Historial: {relistadas} carpeta(s) re-listadas")
+    return relistadas
+
+
+_COLUMNAS = "ruta, archivo, rut, numero, tipo, fecha, anio, mes, dia"
+
+
+def _consulta(raiz, anio=None, mes=None, dia=None, tipo=None, texto="", limite=None, claves=None):
+    desde, hasta = _rango(_clave(raiz))
+    where, params = ["clave >= ?", "clave < ?"], [desde, hasta]
+
+    if claves is not None:
+        where.append(f"clave IN ({','.join('?' * len(claves))})")
+        params += list(claves)
+
+    if anio:
+        # Año (y mes/día) como rango de fechas: aprovecha el índice por fecha.
+        # Día sin mes ("Todos") = ese día en cualquier mes del año.
+        try:
+            if mes and dia:
+                ini = datetime(anio, mes, dia)
+                fin = datetime.fromordinal(ini.toordinal() + 1)
+            elif mes:
+                ini, fin = datetime(anio, mes, 1), datetime(anio + (mes == 12), mes % 12 + 1, 1)
+            else:
+                ini, fin = datetime(anio, 1, 1), datetime(anio + 1, 1, 1)
+        except ValueError:
+            ini = fin = datetime(anio, 1, 1)        # fecha imposible (31 de febrero): nada
+        where.append("fecha >= ? AND fecha < ?")
+        params += [ini.timestamp(), fin.timestamp()]
+        if dia and not mes:
+            where.append("dia = ?")
+            params.append(dia)
+    else:
+        if mes:
+            where.append("mes = ?")
+            params.append(mes)
+        if dia:
+            where.append("dia = ?")
+            params.append(dia)
+
+    if tipo:
+        where.append("tipo = ?")
+        params.append(tipo)
+
+    texto = (texto or "").strip().lower()
+    if texto:
+        where.append("instr(lower(rut || ' ' || numero || ' ' || archivo || ' ' || tipo), ?) > 0")
+        params.append(texto)
+
+    sql = f"SELECT {_COLUMNAS} FROM documentos WHERE {' AND '.join(where)} ORDER BY fecha DESC, archivo DESC"
+    if limite:
+        sql += " LIMIT ?"
+        params.append(int(limite))
+    return sql, params
+
+
+def _registro(fila) -> dict:
+    ruta, archivo, rut, numero, tipo, fecha, a, m, d = fila
+    return {
+        "ruta": ruta,
+        "archivo": archivo,
+        "rut": rut or "",
+        "numero": numero or "",
+        "tipo": tipo or "Otros",
+        "fecha": datetime.fromtimestamp(fecha) if fecha is not None else datetime.min,
+        "anio": a,
+        "mes": m,
+        "dia": d,
+    }
+
+
+def iterar(raiz: str, lote: int = 200, claves=None, **filtros):
+    """
+    Igual que buscar(), pero entrega listas de hasta `lote` registros a medida que
+    SQLite los produce (el primer lote llega sin esperar al resto).
+    `claves`: restringe a esas claves de documento (ver reconciliar/al_avanzar).
+    """
+    if claves is None:
+        tramos = [None]
+    else:
+        # SQLite limita las variables por consulta: se parte en tramos
+        claves = list(claves)
+        tramos = [claves[i:i + 500] for i in range(0, len(claves), 500)]
+
+    con = _conexion()
+    for tramo in tramos:
+        sql, params = _consulta(raiz, claves=tramo, **filtros)
+        cur = con.execute(sql, params)
+        while True:
+            filas = cur.fetchmany(lote)
+            if not filas:
+                break
+            yield [_registro(f) for f in filas]
+
+
+def buscar(raiz: str, anio=None, mes=None, dia=None, tipo=None, texto="", limite=None) -> list:
+    """
+    Documentos bajo `raiz` que cumplen los filtros (None = todos), del más nuevo
+    al más antiguo. `texto` se busca (sin distinguir mayúsculas) en RUT, número,
+    nombre de archivo y tipo. Devuelve dicts con ruta, archivo, rut, numero, tipo,
+    fecha (datetime), anio, mes, dia.
+    """
+    registros = []
+    for parte in iterar(raiz, anio=anio, mes=mes, dia=dia, tipo=tipo, texto=texto, limite=limite):
+        registros.extend(parte)
+    return registros
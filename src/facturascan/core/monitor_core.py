@@ -2,10 +2,18 @@ import os, re
 from datetime import datetime
 import threading
 import sys
-
-from ocr.ocr_utils import ocr_zona_factura_desde_png, extraer_rut, extraer_numero_factura
+import time, shutil, traceback, queue, contextlib
+from dataclasses import dataclass, field
+
+from ocr.ocr_utils import (ocr_zona_factura_desde_png, extraer_rut, extraer_numero_factura,
+                           FuenteImagen, FuentePdf, cabecera_desde_capa_texto, parametros_ocr_cabecera,
+                           CAJA_CABECERA, NIVELES_ESCALADA, ocr_escalado, datos_clave)
+from ocr import cache_ocr, timbre, plantillas, orientacion_origen
+from core import historial, nombres, compresion_diferida
 from pdf.pdf_tools import comprimir_pdf
+from pdf import politica_compresion
 from utils.log_utils import registrar_log_proceso, registrar_log, is_debug, registrar_link_documento
+from utils import metricas
 from pathlib import Path
 
 # ===================== Helpers de carpetas (idempotentes por ejecución) =====================
@@ -39,9 +47,6 @@ def mkdir(path: str) -> str:
 
 # =============================================================================================
 
-# Lock para generar nombres únicos de archivos en entorno multi-hilo
-nombre_lock = threading.Lock()
-
 # Cargar configuración de la app (razón social, rutas, etc.)
 # variables = cargar_o_configurar()
 variables = {}
@@ -61,13 +66,71 @@ CARPETA_SALIDA_USO_ATM = variables.get("CarpSalidaUsoAtm", "").strip()
 BASE_APPDATA = os.environ.get("LOCALAPPDATA", r"C:\FacturaScan")
 FALLBACK_USO_ATM_DIR = os.path.join(BASE_APPDATA, "ATM")
 
-# Intervalo para escaneos temporizados (si se implementa watch loop)
+# Modo vigilancia (core/vigilancia.py): segundos entre pasadas del sondeo de respaldo
+# y de estabilidad mínima de un PDF nuevo antes de procesarlo
 INTERVALO = 1
+HILOS_VIGILANCIA = 2        # PDFs procesados a la vez en modo vigilancia
 
 # ===== Ajustes globales de compresión de PDF (Ghostscript) =====
 CALIDAD_PDF   = "default"   # screen, ebook, printer, prepress, default
 DPI_PDF       = 200
 COMPRIMIR_PDF = True
+# "proceso": un gswin64c.exe por documento
+# "gsapi":   API C de Ghostscript (gsdll64.dll) en procesos reutilizados (ver pdf/gs_api.py)
+MOTOR_GS      = "proceso"
+# True: pdf/politica_compresion.py decide por documento si vale la pena comprimir
+POLITICA_COMPRESION = True
+# True: el PDF se enruta y renombra sin esperar a Ghostscript; la compresión queda en
+# una cola persistente que se vacía cuando el OCR está ocioso (core/compresion_diferida.py)
+COMPRESION_DIFERIDA = False
+
+# ===== Ajustes globales de OCR =====
+# True: los ángulos que quedan tras el primero (0°) se envían en un solo lote a EasyOCR
+OCR_EN_LOTE   = True
+
+# 👉 DPI de rasterizado de la pág.1 (más/menos velocidad/calidad del header)
+OCR_DPI       = 280
+
+# True: Poppler rasteriza solo la ventana de cabecera (a OCR_DPI/2) y una página en baja
+# para estimar la orientación; False: página completa a OCR_DPI como antes
+OCR_SOLO_CABECERA = True
+
+# True: si la pág.1 trae capa de texto (DTE nativo) con la cabecera legible, se usa
+# directamente (pdftotext) y no se rasteriza ni se pasa por EasyOCR
+TEXTO_PDF_PRIMERO = True
+
+# True: resultados OCR en caché persistente por contenido del PDF (ver ocr/cache_ocr.py)
+CACHE_OCR = True
+
+# True: antes del OCR se busca el timbre electrónico SII (PDF417, ver ocr/timbre.py);
+# si se lee, RUT, folio y tipo de DTE salen de ahí
+LEER_TIMBRE = True
+# True: con timbre leído no se pasa por EasyOCR (las reglas CHEP / USO ATM, que leen
+# el texto de la cabecera, no se evalúan); False: se hace el OCR igual
+TIMBRE_OMITE_OCR = True
+
+# True: se recuerda por RUT emisor dónde y en qué ángulo está su recuadro SII
+# (ver ocr/plantillas.py) y esas zonas se prueban antes del recorte fijo
+PLANTILLAS_PROVEEDOR = True
+
+# True: el orden de ángulos del OCR sigue la orientación habitual del origen
+# (escáner/bandeja o carpeta, ver ocr/orientacion_origen.py)
+ORIENTACION_POR_ORIGEN = True
+
+# True: si el primer OCR (barato) no entrega RUT y folio, se reintenta subiendo de
+# nivel (más DPI, región amplia, todos los ángulos, variantes de contraste; ver
+# NIVELES_ESCALADA en ocr/ocr_utils.py) antes de mandar a No_Reconocidos
+ESCALADA_OCR = True
+
+# ===== Motor de procesamiento de carpeta =====
+# "hilos":    ThreadPoolExecutor compartiendo un único lector OCR (por defecto)
+# "pipeline": etapas raster → OCR → post-proceso con hilos y colas acotadas propias
+# "procesos": N procesos, cada uno con su propio lector OCR (ver core/motor_procesos.py)
+MOTOR_OCR     = "hilos"
+PROCESOS_OCR  = 0           # 0 = automático según núcleos
+HILOS_RASTER  = 2           # pipeline: hilos de rasterizado (Poppler)
+HILOS_OCR     = 0           # pipeline: hilos de OCR (0 = automático, núcleos/2 hasta 4)
+HILOS_POST    = 2           # pipeline: hilos de enrutado + Ghostscript + renombrado
 
 def aplicar_nueva_config(nuevas: dict):
     global variables, RAZON_SOCIAL, RUT_EMPRESA, SUCURSAL, DIRECCION
@@ -112,20 +175,33 @@ def generar_nombre_incremental(base_path, nombre_base, extension):
     """
     Genera un nombre único dentro de base_path:
     nombre_base + ( _1 | _2 | ... ) + extension
-    Protegido por lock para evitar colisiones entre hilos.
+    El nombre queda reservado en core/nombres.py (lock por carpeta): otro hilo no
+    lo recibe aunque el archivo todavía no se haya movido.
     """
     base_path = ensure_dir(base_path)
-    with nombre_lock:
-        contador = 0
-        while True:
-            if contador == 0:
-                nombre_final = f"{nombre_base}{extension}"
-            else:
-                nombre_final = f"{nombre_base}_{contador}{extension}"
-            ruta_completa = os.path.join(base_path, nombre_final)
-            if not os.path.exists(ruta_completa):
-                return nombre_final
-            contador += 1
+    return nombres.reservar(base_path, nombre_base, extension)
+
+def _mover_a_nombre_libre(src, carpeta, nombre_base, extension=".pdf", intentos=6):
+    """
+    Reserva nombre_base(_n)+extension en `carpeta` y mueve `src` ahí sin pisar
+    nada. Si el nombre apareció en disco entre la reserva y el movimiento (otro
+    proceso del motor OCR reservó el mismo, p. ej. CHEP con la misma hora) se
+    pide el siguiente. Si el movimiento falla por otra causa, la reserva se libera.
+    Devuelve la ruta final.
+    """
+    carpeta = ensure_dir(carpeta)
+    for _ in range(intentos):
+        nombre = generar_nombre_incremental(carpeta, nombre_base, extension)
+        destino = os.path.join(carpeta, nombre)
+        try:
+            _mover_sin_pisar(src, destino)
+            return destino
+        except FileExistsError:
+            continue                      # ocupado en disco: la reserva se mantiene
+        except Exception:
+            nombres.liberar(carpeta, nombre)
+            raise
+    raise FileExistsError(f"sin nombre libre para {nombre_base}{extension} en {carpeta}")
 
 def _es_guia_despacho(texto: str) -> bool:
     """
@@ -193,77 +269,240 @@ def _es_guia_despacho(texto: str) -> bool:
 
 
 # ===================== Pipeline principal por archivo =====================
-def procesar_archivo(pdf_path):
+# procesar_archivo encadena las etapas en serie dentro de un mismo hilo.
+# procesar_en_pipeline usa EXACTAMENTE las mismas etapas, pero cada una con sus
+# propios hilos y colas acotadas entre ellas (ver más abajo).
+
+@dataclass
+class _Documento:
+    """Estado de 1 PDF mientras recorre las etapas."""
+    pdf_path: str
+    origen: str = ""               # escáner/bandeja o carpeta de entrada (orientación habitual)
+    nombre: str = ""
+    t0: float = field(default_factory=time.perf_counter)
+    t_etapa: float = 0.0           # fin de la última etapa marcada (mark)
+    fuente: object = None          # FuentePdf / FuenteImagen de la pág.1 (se libera tras el OCR)
+    texto: str = ""                # texto OCR de la cabecera
+    angulo: int = 0                # ángulo elegido por el OCR
+    clave_cache: str = ""          # clave de caché OCR (vacía si la caché está apagada)
+    timbre: dict = None            # datos del timbre SII (rut, tipo, folio) si se pudo leer
+    cajas_ocr: list = None         # cajas de texto del recorte fijo (para aprender la plantilla)
+    orden_probable: tuple = None   # (ángulos, confianza) según la historia del origen
+    angulo_leido: bool = False     # True si doc.angulo salió del OCR de esta corrida
+    rut_escalada: str = ""         # RUT fijado por la escalada si el texto es de la región amplia
+    ruta_destino: str = ""         # dónde quedó tras enrutar (temporal en facturas)
+    etiqueta: str = ""             # contexto para logs de compresión (CHEP, USO ATM, ...)
+    comprimir: bool = False        # True si la etapa de post-proceso debe comprimir
+    base_name: str = ""            # facturas: nombre final pendiente de renombrado
+    carpeta_final: str = ""        # facturas: carpeta anual de destino
+    resultado: str = None          # ruta final que se devuelve al llamador
+    terminado: bool = False        # True si ya no quedan etapas (error o sin post-proceso)
+    error: object = None           # excepción no controlada en alguna etapa (pipeline)
+
+    def __post_init__(self):
+        if not self.nombre:
+            self.nombre = os.path.basename(self.pdf_path)
+        if not self.origen:
+            self.origen = orientacion_origen.origen_carpeta(self.pdf_path)
+        self.t_etapa = self.t0
+
+    def mark(self, etapa: str):
+        """PERF: duración de la etapa (desde la marca anterior) → métricas; total al log debug."""
+        ahora = time.perf_counter()
+        dt, self.t_etapa = ahora - self.t_etapa, ahora
+        metricas.registrar(etapa, dt)
+        registrar_log_proceso(f"⏱️ {self.nombre} | {etapa}: {dt:0.2f}s (total {ahora - self.t0:0.2f}s)")
+
+    def terminar(self, resultado=None):
+        if not self.terminado:
+            metricas.registrar("total documento", time.perf_counter() - self.t0)
+        self.resultado = resultado
+        self.terminado = True
+        # Ubicación final conocida → al índice del historial (sin esperar a un re-escaneo)
+        if resultado and resultado != self.pdf_path:
+            historial.registrar(resultado, sucursal=SUCURSAL)
+
+# ---------------- helpers rápidos ----------------
+def _norm_rut(s: str) -> str:
+    return re.sub(r'[^0-9Kk]', '', s or '').upper()
+
+def _fast_move(src: str, dst: str):
+    try:
+        os.replace(src, dst)   # más rápido si es mismo volumen
+    except Exception:
+        shutil.move(src, dst)
+
+def _mover_sin_pisar(src: str, dst: str):
+    """Como _fast_move, pero si `dst` ya existe lanza FileExistsError en vez de reemplazarlo."""
+    try:
+        if os.name == "nt":
+            os.rename(src, dst)            # en Windows rename no reemplaza
+        else:
+            os.link(src, dst)              # en POSIX rename sí: link falla si existe
+            os.remove(src)
+        return
+    except FileExistsError:
+        raise
+    except OSError:
+        pass                               # otro volumen (share de red, otra unidad)
+    with open(src, "rb") as origen:
+        with open(dst, "xb") as destino:   # "x": falla si existe
+            try:
+                shutil.copyfileobj(origen, destino, 1 << 20)
+            except BaseException:
+                destino.close()
+                os.remove(dst)
+                raise
+    shutil.copystat(src, dst)
+    os.remove(src)
+
+def _wait_until_stable(path: str, timeout=3.0, step=0.15):
+    """Evita leer PDFs aún en escritura (scanner/copias de red)."""
+    end = time.time() + timeout
+    try:
+        last = (os.path.getsize(path), os.path.getmtime(path))
+        while time.time() < end:
+            time.sleep(step)
+            cur = (os.path.getsize(path), os.path.getmtime(path))
+            if cur == last:
+                return True
+            last = cur
+    except Exception:
+        pass
+    return True
+
+def _comprimir(ruta: str, etiqueta: str = "", prioridad_baja: bool = False, estricto: bool = False):
     """
-    Pipeline de 1 PDF (rápido/robusto):
-      1) Espera breve si el archivo aún se está escribiendo.
-      2) PDF -> Imagen (solo pág.1, DPI ajustable).
-      3) OCR header (con auto-rotación y recorte interno).
-      4) Reglas: USO ATM / GUÍA DESPACHO.
-      5) Extracción RUT/folio y clasificación Cliente/Proveedores o No_Reconocidos.
-      6) Compresión opcional (Ghostscript).
-      7) Renombrado final (con reintentos).
+    Compresión opcional con Ghostscript (mismo contenido, menor tamaño).
+    estricto=True (cola diferida): si Ghostscript falla se lanza RuntimeError para que
+    el trabajo se reintente; en línea el documento simplemente queda sin comprimir.
     """
-    import os, re, time, shutil, traceback
-    from datetime import datetime
+    if not (COMPRIMIR_PDF and GS_PATH and os.path.exists(ruta)):
+        return
+    contexto = f" ({etiqueta})" if etiqueta else ""
+    datos, motivo = {"tamano": os.path.getsize(ruta)}, "política desactivada"
+    if POLITICA_COMPRESION:
+        try:
+            datos = politica_compresion.analizar(ruta)
+            comprimir, motivo = politica_compresion.decidir(datos, DPI_PDF)
+        except Exception as e:
+            comprimir, motivo = True, f"error en política: {e}"
+        if not comprimir:
+            registrar_log_proceso(f"⏭️ Sin compresión{contexto}: {os.path.basename(ruta)} | {motivo}")
+            politica_compresion.registrar_resultado(ruta, etiqueta, datos, False, motivo)
+            return
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        ok = comprimir_pdf(
+            GS_PATH,
+            ruta,
+            calidad=CALIDAD_PDF,
+            dpi=DPI_PDF,
+            tamano_pagina='a4',
+            motor=MOTOR_GS,
+            marca=politica_compresion.marca(CALIDAD_PDF, DPI_PDF),
+            prioridad_baja=prioridad_baja,
+        )
+        if ok:
+            registrar_log_proceso(
+                f"📚 Compresión Ghostscript OK{contexto}: {ruta} "
+                f"(calidad={CALIDAD_PDF}, dpi={DPI_PDF})"
+            )
+    except Exception as e:
+        registrar_log_proceso(
+            f"⚠️ Error al comprimir con Ghostscript '{GS_PATH}' "
+            f"para archivo{contexto} {ruta}. Se deja sin comprimir. Detalle: {e}"
+        )
+    try:
+        despues = os.path.getsize(ruta)
+    except OSError:
+        despues = None
+    politica_compresion.registrar_resultado(
+        ruta, etiqueta, datos, True, motivo if ok else f"{motivo} | falló", despues, time.perf_counter() - t0
+    )
+    if estricto and not ok:
+        raise RuntimeError(f"Ghostscript no pudo comprimir {os.path.basename(ruta)}")
+
+# ---------------- 0-1) espera + PDF → Imagen ----------------
+def _etapa_rasterizar(doc: _Documento):
+    """Espera a que el archivo esté estable; toma la cabecera de la capa de texto o rasteriza la página 1."""
     from pdf2image import convert_from_path
 
-    # ===== PERF: medición de etapas =====
-    t0 = time.perf_counter()
-    def mark(etapa: str):
-        dt = time.perf_counter() - t0
-        registrar_log_proceso(f"⏱️ {os.path.basename(pdf_path)} | {etapa}: {dt:0.2f}s")
+    registrar_log(f"📄 Entrada: {doc.nombre}")
 
+    # 0) esperar si el archivo aún se vuelca
+    _wait_until_stable(doc.pdf_path)
+    doc.mark("archivo estable")
 
-    modo_debug = is_debug()
-    nombre     = os.path.basename(pdf_path)
-    registrar_log(f"📄 Entrada: {nombre}")
+    # 1a) Mismo PDF ya leído antes (re-ejecución, duplicado, reproceso): sin raster ni OCR
+    if CACHE_OCR:
+        try:
+            doc.clave_cache = cache_ocr.clave_ocr(doc.pdf_path, _parametros_cache())
+        except Exception as e:
+            registrar_log_proceso(f"⚠️ No se pudo calcular la clave de caché ({doc.nombre}): {e}")
+        if doc.clave_cache:
+            en_cache = cache_ocr.obtener(doc.clave_cache)
+            if en_cache is not None:
+                doc.texto, doc.angulo, doc.timbre, doc.rut_escalada = en_cache
+                registrar_log_proceso(f"💾 Cabecera desde caché OCR ({doc.angulo}°): {doc.nombre}")
+                if doc.timbre:
+                    registrar_log_proceso(f"🔖 Timbre SII (caché): {timbre.describir(doc.timbre)} | {doc.nombre}")
+                doc.mark("caché OCR")
+                return
 
-    # ---------------- helpers rápidos ----------------
-    def _norm_rut(s: str) -> str:
-        return re.sub(r'[^0-9Kk]', '', s or '').upper()
+    fuente_pdf = FuentePdf(doc.pdf_path, dpi=OCR_DPI)
 
-    def _fast_move(src: str, dst: str):
+    # 1b) DTE nativo: la cabecera sale de la capa de texto (milisegundos, sin OCR)
+    if TEXTO_PDF_PRIMERO:
         try:
-            os.replace(src, dst)   # más rápido si es mismo volumen
-        except Exception:
-            shutil.move(src, dst)
+            texto = cabecera_desde_capa_texto(doc.pdf_path, tamano_pts=fuente_pdf.tamano_pts())
+        except Exception as e:
+            texto = ""
+            registrar_log_proceso(f"⚠️ Sin capa de texto utilizable ({doc.nombre}): {e}")
+        if texto:
+            doc.texto = texto
+            registrar_log_proceso(f"📝 Cabecera desde capa de texto: {doc.nombre}")
+            doc.mark("capa de texto")
+            return
 
-    def _wait_until_stable(path: str, timeout=3.0, step=0.15):
-        """Evita leer PDFs aún en escritura (scanner/copias de red)."""
-        end = time.time() + timeout
+    # 1c) Timbre electrónico SII (PDF417 al pie): RUT, tipo y folio exactos
+    if LEER_TIMBRE and timbre.disponible():
         try:
-            last = (os.path.getsize(path), os.path.getmtime(path))
-            while time.time() < end:
-                time.sleep(step)
-                cur = (os.path.getsize(path), os.path.getmtime(path))
-                if cur == last:
-                    return True
-                last = cur
-        except Exception:
-            pass
-        return True
-
-    # Prepara rutas DEBUG (solo para recortes/rotadas del header)
-    nombre_base   = os.path.splitext(nombre)[0]
-    base_dir      = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
-    ruta_debug_dir= ensure_dir(os.path.join(base_dir, "debug"))
-    ruta_recorte  = os.path.join(ruta_debug_dir, f"{nombre_base}_recorte.png") if modo_debug else None
-
-    # Normaliza RUT empresa una sola vez
-    RUT_EMP_NORM = _norm_rut(RUT_EMPRESA)
+            doc.timbre = timbre.timbre_desde_pdf(doc.pdf_path, fuente_pdf.tamano_pts())
+        except Exception as e:
+            registrar_log_proceso(f"⚠️ No se pudo leer el timbre ({doc.nombre}): {e}")
+        doc.mark("timbre")
+        if doc.timbre:
+            registrar_log_proceso(f"🔖 Timbre SII: {timbre.describir(doc.timbre)} | {doc.nombre}")
+            if TIMBRE_OMITE_OCR:
+                if doc.clave_cache:
+                    cache_ocr.guardar(doc.clave_cache, "", 0, doc.timbre)
+                return
 
-    # ------------- 0) esperar si el archivo aún se vuelca -------------
-    _wait_until_stable(pdf_path)
-    mark("archivo estable")
+    # 1d) PDF → Imagen (pág.1, DPI ajustable)
+    # 👉 Ajusta OCR_DPI si quieres más/menos velocidad/calidad del header
+    if OCR_SOLO_CABECERA:
+        # Solo se rasteriza lo que el OCR va a leer: la página en baja (orientación)
+        # y la cabecera del ángulo más probable; el resto de ángulos se pide si hace falta
+        try:
+            doc.fuente = fuente_pdf
+            if ORIENTACION_POR_ORIGEN:
+                doc.orden_probable = orientacion_origen.orden(doc.origen)
+            if PLANTILLAS_PROVEEDOR and plantillas.zonas():
+                plantillas.precargar(doc.fuente)
+            else:
+                doc.fuente.precargar(orden_probable=doc.orden_probable)
+        except Exception:
+            registrar_log_proceso(f"❌ Error rasterizando {doc.nombre}:\n{traceback.format_exc()}")
+            return doc.terminar()
+        doc.mark("pdf->cabecera")
+        return
 
-    # ------------- 1) PDF → Imagen (pág.1, DPI ajustable) -------------
-    # 👉 Ajusta este DPI si quieres más/menos velocidad/calidad del header:
-    OCR_DPI = 280
     try:
         # Nota: ya añadiste Poppler al PATH; no hace falta poppler_path=...
         imagenes = convert_from_path(
-            pdf_path,
+            doc.pdf_path,
             dpi=OCR_DPI,
             fmt="jpeg",
             grayscale=True,
@@ -272,36 +511,149 @@ def procesar_archivo(pdf_path):
             last_page=1
         )
         if not imagenes:
-            registrar_log_proceso(f"❌ No se pudo rasterizar {nombre}.")
-            return
+            registrar_log_proceso(f"❌ No se pudo rasterizar {doc.nombre}.")
+            return doc.terminar()
 
         # Sin filtros pesados: el preprocesado lo hace el OCR (crop+gris+autocontraste)
-        imagen = imagenes[0]
         # Copia independiente (por si `convert_from_path` devuelve objeto con recursos compartidos)
-        imagen = imagen.copy()
+        doc.fuente = FuenteImagen(imagenes[0].copy(), dpi=OCR_DPI)
         del imagenes
-    except Exception as e:
-        registrar_log_proceso(f"❌ Error rasterizando {nombre}:\n{traceback.format_exc()}")
+        if ORIENTACION_POR_ORIGEN:
+            doc.orden_probable = orientacion_origen.orden(doc.origen)
+    except Exception:
+        registrar_log_proceso(f"❌ Error rasterizando {doc.nombre}:\n{traceback.format_exc()}")
+        return doc.terminar()
+    doc.mark("pdf->imagen")
+
+def _parametros_cache() -> dict:
+    """Todo lo que cambia el texto OCR: si algo difiere, la clave de caché también."""
+    params = parametros_ocr_cabecera()
+    params.update(dpi=OCR_DPI, solo_cabecera=OCR_SOLO_CABECERA)
+    # Una entrada guardada sin lector de timbre (o con otra política) no sirve con él
+    params["timbre"] = (LEER_TIMBRE and timbre.disponible(), TIMBRE_OMITE_OCR)
+    if ESCALADA_OCR:
+        params["escalada"] = [(n["caja"], n["escala_dpi"], n["variantes"], n.get("incluye_receptor", False))
+                              for n in NIVELES_ESCALADA]
+    return params
+
+# ---------------- 2) OCR header (recorte interno + auto-rotación) ----------------
+def _etapa_ocr(doc: _Documento):
+    # Sin fuente = la cabecera ya vino de la capa de texto
+    if doc.fuente is None:
         return
-    mark("pdf->imagen")
 
-    # -------- 2) OCR header (usa recorte interno + auto-rotación) --------
-    mark("antes OCR")
+    # Prepara rutas DEBUG (solo para recortes/rotadas del header)
+    ruta_recorte = None
+    if is_debug():
+        nombre_base    = os.path.splitext(doc.nombre)[0]
+        base_dir       = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__)
+        ruta_debug_dir = ensure_dir(os.path.join(base_dir, "debug"))
+        ruta_recorte   = os.path.join(ruta_debug_dir, f"{nombre_base}_recorte.png")
+
+    doc.mark("espera OCR")
     try:
-        texto = ocr_zona_factura_desde_png(imagen, ruta_debug=ruta_recorte)
+        # Zonas aprendidas de proveedores conocidos: ventana chica, un solo ángulo
+        sondeo = None
+        if PLANTILLAS_PROVEEDOR:
+            try:
+                sondeo = plantillas.sondear(doc.fuente)
+            except Exception as e:
+                registrar_log_proceso(f"⚠️ Error sondeando plantillas ({doc.nombre}): {e}")
+        if sondeo:
+            doc.texto, doc.angulo = sondeo
+        else:
+            detalle = {} if PLANTILLAS_PROVEEDOR else None
+            doc.texto, doc.angulo = ocr_zona_factura_desde_png(
+                doc.fuente, ruta_debug=ruta_recorte, en_lote=OCR_EN_LOTE, devolver_angulo=True,
+                detalle=detalle, orden_probable=doc.orden_probable
+            )
+            if detalle:
+                doc.cajas_ocr = detalle.get("cajas")
+        doc.angulo_leido = True
+        if ESCALADA_OCR and not doc.timbre:
+            _escalar(doc)
     except Exception as e:
-        registrar_log_proceso(f"⚠️ Error OCR ({nombre}): {e}")
-        return
+        registrar_log_proceso(f"⚠️ Error OCR ({doc.nombre}): {e}")
+        return doc.terminar()
     finally:
-        try:
-            imagen.close()
-        except Exception:
-            pass
-    mark("después OCR")
+        doc.fuente.cerrar()
+        doc.fuente = None
+    doc.mark("OCR plantilla" if sondeo else "OCR")
 
-    # -------- 2.5) Regla especial: CHEP --------
+    if doc.clave_cache and (doc.texto or doc.timbre):
+        cache_ocr.guardar(doc.clave_cache, doc.texto, doc.angulo, doc.timbre, doc.rut_escalada)
+
+def _datos_region_amplia(rut_cabecera):
+    """
+    datos_clave para un nivel cuya caja alcanza el bloque del receptor: ahí el primer
+    RUT puede ser el del cliente. Manda el RUT leído en la cabecera; si no hubo, solo
+    vale el de un proveedor conocido (ocr/plantillas.py). El folio se toma tal cual.
+    """
+    def datos(texto):
+        rut, folio = datos_clave(texto)
+        if rut_cabecera:
+            return rut_cabecera, folio
+        return (rut if PLANTILLAS_PROVEEDOR and plantillas.conocido(rut) else ""), folio
+    return datos
+
+def _escalar(doc: _Documento):
+    """Sube por NIVELES_ESCALADA mientras el texto de la cabecera no dé RUT + folio."""
+    from ocr.ocr_utils import looks_like_chep
+
+    rut, folio = datos_clave(doc.texto)
+    if rut and folio:
+        registrar_log_proceso(f"🪜 {doc.nombre}: RUT y folio en el nivel 1")
+        return
+    # CHEP / USO ATM se enrutan por su texto, no llevan RUT/folio SII
+    if looks_like_chep(doc.texto) or "USO ATM" in " ".join((doc.texto or "").upper().split()):
+        return
+
+    orden = doc.orden_probable[0] if doc.orden_probable else (0, 180, 90, 270)
+    angulos = [doc.angulo] + [a for a in orden if a != doc.angulo]
+    for n, nivel in enumerate(NIVELES_ESCALADA, start=2):
+        datos = datos_clave
+        if nivel.get("incluye_receptor"):
+            datos = _datos_region_amplia(datos_clave(doc.texto)[0])
+        t0 = time.perf_counter()
+        texto, angulo, completo = ocr_escalado(doc.fuente, nivel, angulos, (doc.texto, doc.angulo), datos)
+        metricas.registrar(f"OCR nivel {n}", time.perf_counter() - t0)
+        if texto != doc.texto:
+            # Las cajas del primer intento ya no corresponden al texto: no se aprende plantilla
+            doc.texto, doc.angulo, doc.cajas_ocr = texto, angulo, None
+            if nivel.get("incluye_receptor"):
+                doc.rut_escalada = datos(texto)[0] or "desconocido"
+        if completo:
+            registrar_log(f"🪜 {doc.nombre}: RUT y folio en el nivel {n} ({nivel['nombre']})")
+            return
+    registrar_log(f"🪜 {doc.nombre}: sin RUT y folio tras {len(NIVELES_ESCALADA) + 1} niveles")
+
+def _aprender_de_lectura(doc: _Documento, rut, folio):
+    """
+    Con un RUT leído por OCR: suma el ángulo a la historia del origen
+    (ocr/orientacion_origen.py) y, si además hay folio y vino del recorte fijo,
+    guarda dónde estaban (ocr/plantillas.py).
+    """
+    if not doc.angulo_leido:
+        return
+    try:
+        if ORIENTACION_POR_ORIGEN:
+            orientacion_origen.registrar(doc.origen, doc.angulo)
+        if PLANTILLAS_PROVEEDOR and doc.cajas_ocr and folio:
+            plantillas.aprender(rut, folio, doc.angulo, doc.cajas_ocr, CAJA_CABECERA)
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ No se pudo aprender de la lectura ({doc.nombre}): {e}")
+
+# ---------------- 3-6) reglas + clasificación + movimiento ----------------
+def _etapa_enrutar(doc: _Documento):
+    """
+    Aplica las reglas (CHEP, USO ATM, guía de despacho, No_Reconocidos, Cliente/Proveedores)
+    y mueve el PDF a su carpeta. Deja marcado si falta compresión/renombrado.
+    """
     from ocr.ocr_utils import looks_like_chep
-    
+
+    pdf_path, texto = doc.pdf_path, doc.texto
+
+    # -------- 2.5) Regla especial: CHEP --------
     try:
         if looks_like_chep(texto):
             # Subcarpeta fija "chep" dentro de la Carpeta de Salida
@@ -309,35 +661,14 @@ def procesar_archivo(pdf_path):
 
             # nombre simple; si prefieres, puedes reutilizar tu patrón base_name
             base_name    = f"{SUCURSAL}_CHEP_{datetime.now():%Y%m%d_%H%M%S}"
-            nombre_final = generar_nombre_incremental(destino_dir, base_name, ".pdf")
-            ruta_destino = os.path.join(destino_dir, nombre_final)
-
-            _fast_move(pdf_path, ruta_destino)
-
-            # Compresión opcional (igual que el resto del flujo)
-            if COMPRIMIR_PDF and GS_PATH:
-                try:
-                    # Solo se comprime el PDF con Ghostscript, sin ejecutar nada externo sospechoso
-                    comprimir_pdf(
-                        GS_PATH,
-                        ruta_destino,
-                        calidad=CALIDAD_PDF,
-                        dpi=DPI_PDF,
-                        tamano_pagina='a4'
-                    )
-                    registrar_log_proceso(
-                        f"📚 Compresión Ghostscript OK (CHEP): {ruta_destino} "
-                        f"(calidad={CALIDAD_PDF}, dpi={DPI_PDF})"
-                    )
-                except Exception as e:
-                    registrar_log_proceso(
-                        f"⚠️ Error al comprimir con Ghostscript '{GS_PATH}' "
-                        f"para archivo CHEP {ruta_destino}: {e}"
-                    )
+            ruta_destino = _mover_a_nombre_libre(pdf_path, destino_dir, base_name)
+            doc.mark("movimiento")
 
             uri = Path(ruta_destino).as_uri()
             registrar_log(f"🏷️ CHEP detectado → {uri}")
-            return ruta_destino
+            doc.ruta_destino, doc.etiqueta, doc.comprimir = ruta_destino, "CHEP", True
+            doc.resultado = ruta_destino
+            return
     except Exception as e:
         registrar_log_proceso(f"❗ Error en regla CHEP: {e}")
 
@@ -353,85 +684,71 @@ def procesar_archivo(pdf_path):
                 origen      = "fallback C:"
 
             base_name    = f"Recibo_Valores_{datetime.now():%Y%m%d_%H%M%S}"
-            nombre_final = generar_nombre_incremental(destino_dir, base_name, ".pdf")
-            ruta_destino = os.path.join(destino_dir, nombre_final)
-            _fast_move(pdf_path, ruta_destino)
-
-            if COMPRIMIR_PDF and GS_PATH:
-                try:
-                    # Solo se comprime el PDF con Ghostscript, manteniendo el contenido del documento
-                    comprimir_pdf(
-                        GS_PATH,
-                        ruta_destino,
-                        calidad=CALIDAD_PDF,
-                        dpi=DPI_PDF,
-                        tamano_pagina='a4'
-                    )
-                    registrar_log_proceso(
-                        f"📚 Compresión Ghostscript OK (USO ATM): {ruta_destino} "
-                        f"(calidad={CALIDAD_PDF}, dpi={DPI_PDF})"
-                    )
-                except Exception as e:
-                    registrar_log_proceso(
-                        f"⚠️ Error al comprimir con Ghostscript '{GS_PATH}' "
-                        f"para archivo USO ATM {ruta_destino}: {e}"
-                    )
+            ruta_destino = _mover_a_nombre_libre(pdf_path, destino_dir, base_name)
+            doc.mark("movimiento")
 
             uri = Path(ruta_destino).as_uri()
             registrar_log(f"📥 'USO ATM' → {uri}")
-            return ruta_destino
+            doc.ruta_destino, doc.etiqueta, doc.comprimir = ruta_destino, "USO ATM", True
+            doc.resultado = ruta_destino
+            return
         except Exception as e:
             registrar_log_proceso(f"❗ Error moviendo 'USO ATM': {e}")
             try:
                 no_rec = ensure_dir(os.path.join(CARPETA_SALIDA, "No_Reconocidos"))
                 base_error = f"Recibo_Valores_{datetime.now():%Y%m%d_%H%M%S}"
-                nombre_fallo = generar_nombre_incremental(no_rec, base_error, ".pdf")
-                ruta_fallo   = os.path.join(no_rec, nombre_fallo)
-                _fast_move(pdf_path, ruta_fallo)
-                registrar_log_proceso(f"⚠️ 'USO ATM' → No_Reconocidos. Guardado: {nombre_fallo}")
-                return ruta_fallo
+                ruta_fallo = _mover_a_nombre_libre(pdf_path, no_rec, base_error)
+                registrar_log_proceso(f"⚠️ 'USO ATM' → No_Reconocidos. Guardado: {os.path.basename(ruta_fallo)}")
+                return doc.terminar(ruta_fallo)
             except Exception as e2:
                 registrar_log_proceso(f"❌ Falla secundaria moviendo a No_Reconocidos: {e2}")
-                return
+                return doc.terminar()
 
-    # -------- 3.6) Regla especial: Guía de despacho --------
-    if _es_guia_despacho(texto):
+    # -------- 3.6) Regla especial: Guía de despacho (TD 52 si hay timbre) --------
+    es_guia = doc.timbre["tipo"] == 52 if doc.timbre else _es_guia_despacho(texto)
+    if es_guia:
         try:
             destino_dir = obtener_carpeta_salida_anual(os.path.join(CARPETA_SALIDA, "guias de despachos"))
             mkdir(destino_dir)
 
-            rut_proveedor    = extraer_rut(texto) or "desconocido"
-            numero_documento = extraer_numero_factura(texto) or ""
+            if doc.timbre:
+                rut_proveedor, numero_documento = doc.timbre["rut"], doc.timbre["folio"]
+            else:
+                rut_proveedor    = doc.rut_escalada or extraer_rut(texto) or "desconocido"
+                numero_documento = timbre.normalizar_folio(extraer_numero_factura(texto))
             anio             = datetime.now().strftime("%Y")
+            doc.mark("extracción")
+            if rut_proveedor != "desconocido":
+                _aprender_de_lectura(doc, rut_proveedor, numero_documento)
 
             rut_nombre   = rut_proveedor if rut_proveedor != "desconocido" else "noreconocido"
             folio_nombre = numero_documento if numero_documento else "noreconocido"
             base_name    = f"{SUCURSAL}_{rut_nombre}_guia_{folio_nombre}_{anio}"
-
-            nombre_final = generar_nombre_incremental(destino_dir, base_name, ".pdf")
-            ruta_destino = os.path.join(destino_dir, nombre_final)
-            _fast_move(pdf_path, ruta_destino)
-
-            if COMPRIMIR_PDF and GS_PATH:
-                try:
-                    comprimir_pdf(GS_PATH, ruta_destino, calidad=CALIDAD_PDF, dpi=DPI_PDF, tamano_pagina='a4')
-                except Exception as e:
-                    registrar_log_proceso(f"⚠️ Compresión fallida guía: {ruta_destino} | {e}")
+            ruta_destino = _mover_a_nombre_libre(pdf_path, destino_dir, base_name)
+            doc.mark("movimiento")
 
             uri = Path(ruta_destino).as_uri()
             registrar_log(f"📦 Guía detectada → {uri}")
-            return ruta_destino
+            doc.ruta_destino, doc.etiqueta, doc.comprimir = ruta_destino, "guía", True
+            doc.resultado = ruta_destino
+            return
         except Exception as e:
             registrar_log_proceso(f"❗ Error moviendo guía de despacho: {e}")
             # si falla, seguimos con flujo normal
 
     # -------- 4) Extraer RUT/Folio y armar nombre base --------
-    rut_proveedor  = extraer_rut(texto)
-    numero_factura = extraer_numero_factura(texto)
+    if doc.timbre:
+        rut_proveedor, numero_factura = doc.timbre["rut"], doc.timbre["folio"]
+    else:
+        rut_proveedor  = doc.rut_escalada or extraer_rut(texto)
+        numero_factura = timbre.normalizar_folio(extraer_numero_factura(texto))
     anio           = datetime.now().strftime("%Y")
+    doc.mark("extracción")
 
     rut_valido     = bool(rut_proveedor and rut_proveedor != "desconocido")
     folio_valido   = bool(numero_factura)
+    if rut_valido:
+        _aprender_de_lectura(doc, rut_proveedor, numero_factura)
     rut_nombre     = rut_proveedor if rut_valido else "noreconocido"
     folio_nombre   = numero_factura if folio_valido else "noreconocido"
     base_name      = f"{SUCURSAL}_{rut_nombre}_factura_{folio_nombre}_{anio}"
@@ -448,41 +765,19 @@ def procesar_archivo(pdf_path):
             # Fallback: usamos directamente la carpeta de salida
             no_rec_dir = CARPETA_SALIDA
 
-        nombre_final = generar_nombre_incremental(no_rec_dir, base_name, ".pdf")
-        ruta_destino = os.path.join(no_rec_dir, nombre_final)
-
         # 2) Mover de Entrada -> No_Reconocidos, pero sin dejar que una excepción corte todo
         try:
-            _fast_move(pdf_path, ruta_destino)
+            ruta_destino = _mover_a_nombre_libre(pdf_path, no_rec_dir, base_name)
         except Exception as e:
             registrar_log_proceso(
                 f"❗ Error moviendo a No_Reconocidos "
-                f"({pdf_path} → {ruta_destino}): {e}"
+                f"({pdf_path} → {no_rec_dir}): {e}"
             )
             # Si falla el move, nos quedamos con el PDF original como destino lógico
             ruta_destino = pdf_path
+        doc.mark("movimiento")
 
-        # 3) Compresión opcional, sólo si el archivo realmente existe
-        if COMPRIMIR_PDF and GS_PATH and os.path.exists(ruta_destino):
-            try:
-                comprimir_pdf(
-                    GS_PATH,
-                    ruta_destino,
-                    calidad=CALIDAD_PDF,
-                    dpi=DPI_PDF,
-                    tamano_pagina="a4",
-                )
-                registrar_log_proceso(
-                    f"📚 Compresión Ghostscript OK (No_Reconocidos): {ruta_destino} "
-                    f"(calidad={CALIDAD_PDF}, dpi={DPI_PDF})"
-                )
-            except Exception as e:
-                registrar_log_proceso(
-                    f"⚠️ Error al comprimir con Ghostscript '{GS_PATH}' "
-                    f"para archivo No_Reconocidos {ruta_destino}: {e}"
-                )
-
-        # 4) Log de motivo y salida
+        # 3) Log de motivo y salida
         motivo = []
         if not rut_valido:
             motivo.append("RUT no reconocido")
@@ -497,11 +792,13 @@ def procesar_archivo(pdf_path):
         registrar_log(
             f"⚠️ No_Reconocidos: {uri} | Motivo: {', '.join(motivo)}"
         )
-        return ruta_destino
-
+        # 4) Compresión opcional (post-proceso), sólo si el archivo realmente existe
+        doc.ruta_destino, doc.etiqueta, doc.comprimir = ruta_destino, "No_Reconocidos", True
+        doc.resultado = ruta_destino
+        return
 
     # -------- 6) Clasificación Cliente / Proveedores --------
-    subcarpeta       = "Cliente" if _norm_rut(rut_proveedor) == RUT_EMP_NORM else "Proveedores"
+    subcarpeta       = "Cliente" if _norm_rut(rut_proveedor) == _norm_rut(RUT_EMPRESA) else "Proveedores"
     carpeta_clase    = os.path.join(CARPETA_SALIDA, subcarpeta)
     carpeta_anual    = obtener_carpeta_salida_anual(carpeta_clase)
     mkdir(carpeta_anual)
@@ -511,41 +808,38 @@ def procesar_archivo(pdf_path):
     temp_ruta   = os.path.join(carpeta_anual, f"{temp_nombre}.pdf")
 
     try:
-        _fast_move(pdf_path, temp_ruta)
+        _mover_sin_pisar(pdf_path, temp_ruta)
     except Exception as e:
         registrar_log_proceso(f"❗ Error moviendo original: {e}")
-        return
+        return doc.terminar()
+    doc.mark("movimiento")
 
-    # -------- 7) Compresión opcional --------
-    if COMPRIMIR_PDF and GS_PATH:
-        try:
-            # Uso de Ghostscript exclusivamente para comprimir el PDF (reduce tamaño, mismo contenido)
-            comprimir_pdf(
-                GS_PATH,
-                temp_ruta,
-                calidad=CALIDAD_PDF,
-                dpi=DPI_PDF,
-                tamano_pagina='a4'
-            )
-            registrar_log_proceso(
-                f"📚 Compresión Ghostscript OK: {temp_ruta} "
-                f"(calidad={CALIDAD_PDF}, dpi={DPI_PDF})"
-            )
-        except Exception as e:
-            registrar_log_proceso(
-                f"⚠️ Error al comprimir con Ghostscript '{GS_PATH}' "
-                f"para archivo {temp_ruta}. Se deja sin comprimir. Detalle: {e}"
-            )
+    doc.ruta_destino, doc.etiqueta, doc.comprimir = temp_ruta, "", True
+    doc.base_name, doc.carpeta_final = base_name, carpeta_anual
+
+# ---------------- 7-8) compresión + renombrado final ----------------
+def _etapa_postproceso(doc: _Documento):
+    # -------- 7) Compresión opcional (en línea o diferida tras el renombrado) --------
+    diferir = doc.comprimir and COMPRESION_DIFERIDA and COMPRIMIR_PDF and GS_PATH
+    if doc.comprimir and not diferir:
+        _comprimir(doc.ruta_destino, doc.etiqueta)
+        doc.mark("compresión")
+
+    if not doc.base_name:
+        if diferir:
+            _diferir_compresion(doc.resultado, doc.etiqueta)
+        return doc.terminar(doc.resultado)
 
     # -------- 8) Renombrado final seguro --------
+    carpeta_anual, base_name, temp_ruta = doc.carpeta_final, doc.base_name, doc.ruta_destino
     try:
-        for _ in range(6):
-            nombre_final = generar_nombre_incremental(carpeta_anual, base_name, ".pdf")
-            ruta_destino = os.path.join(carpeta_anual, nombre_final)
-            if not os.path.exists(ruta_destino):
-                os.rename(temp_ruta, ruta_destino)
-                return ruta_destino
-            time.sleep(0.15)
+        # El nombre ya viene confirmado y reservado; si igual aparece (otro
+        # proceso lo creó entremedio) se pide el siguiente
+        ruta_destino = _mover_a_nombre_libre(temp_ruta, carpeta_anual, base_name)
+        doc.mark("renombrado")
+        if diferir:
+            _diferir_compresion(ruta_destino, doc.etiqueta)
+        return doc.terminar(ruta_destino)
     except Exception as e:
         fallback_name = f"{base_name}_backup_{datetime.now():%H%M%S%f}.pdf"
         fallback_path = os.path.join(carpeta_anual, fallback_name)
@@ -554,16 +848,216 @@ def procesar_archivo(pdf_path):
         except Exception:
             pass
         registrar_log_proceso(f"❗ Renombrado fallido. Guardado como: {fallback_name} | {e}")
-        return fallback_path
+        return doc.terminar(fallback_path)
+    return doc.terminar()
+
+def _diferir_compresion(ruta, etiqueta):
+    """Deja la compresión en la cola persistente; si la cola falla, comprime ahora."""
+    if not ruta or not os.path.exists(ruta):
+        return
+    if compresion_diferida.encolar(ruta, etiqueta):
+        registrar_log_proceso(f"🗜️ Compresión diferida: {os.path.basename(ruta)}")
+    else:
+        _comprimir(ruta, etiqueta)
+
+# Orden de las etapas; el pipeline agrupa "enrutar" con el post-proceso (I/O)
+_ETAPAS = (_etapa_rasterizar, _etapa_ocr, _etapa_enrutar, _etapa_postproceso)
+
+def procesar_archivo(pdf_path, origen=""):
+    """
+    Pipeline de 1 PDF (rápido/robusto):
+      1) Espera breve si el archivo aún se está escribiendo.
+      2) Capa de texto de la cabecera (DTE nativos), timbre SII (PDF417) o PDF -> Imagen
+         (solo pág.1, DPI ajustable).
+      3) OCR header, solo si no hubo capa de texto ni timbre (con auto-rotación y recorte interno);
+         si no salen RUT y folio, se reintenta con más esfuerzo (ESCALADA_OCR).
+      4) Reglas: USO ATM / GUÍA DESPACHO (TD 52 si hay timbre).
+      5) RUT/folio (del timbre o extraídos del texto) y clasificación Cliente/Proveedores
+         o No_Reconocidos.
+      6) Compresión opcional (Ghostscript).
+      7) Renombrado final (con reintentos).
+    `origen`: escáner/bandeja de donde vino (por defecto, su carpeta).
+    """
+    # Un mismo PDF no se procesa dos veces a la vez (vigilancia + escaneo/proceso manual)
+    clave = os.path.normcase(os.path.abspath(pdf_path))
+    with _en_curso_lock:
+        if clave in _en_curso:
+            registrar_log_proceso(f"⏭️ {os.path.basename(pdf_path)} ya se está procesando")
+            return None
+        _en_curso.add(clave)
+    try:
+        doc = _Documento(pdf_path, origen=origen)
+        for etapa in _ETAPAS:
+            etapa(doc)
+            if doc.terminado:
+                break
+        return doc.resultado
+    finally:
+        with _en_curso_lock:
+            _en_curso.discard(clave)
+
+_en_curso = set()
+_en_curso_lock = threading.Lock()
+_lotes_externos = 0         # lotes del motor "procesos" (el OCR corre en los hijos)
+
+@contextlib.contextmanager
+def _actividad():
+    global _lotes_externos
+    with _en_curso_lock:
+        _lotes_externos += 1
+    try:
+        yield
+    finally:
+        with _en_curso_lock:
+            _lotes_externos -= 1
+
+def ocupado() -> bool:
+    """True mientras se procesa algún documento (cualquier motor, o vigilancia)."""
+    return bool(_en_curso) or _lotes_externos > 0
+
+def _comprimir_diferido(ruta, etiqueta):
+    _comprimir(ruta, etiqueta, prioridad_baja=True, estricto=True)
+    # El PDF recomprimido tiene otro mtime: el historial muestra la fecha actual
+    historial.registrar(ruta, sucursal=SUCURSAL)
+
+def iniciar_compresion_diferida():
+    """Arranca el hilo de la cola de compresión (retoma lo pendiente de la sesión anterior)."""
+    compresion_diferida.iniciar(_comprimir_diferido, ocupado)
+
+# ===================== Pipeline por etapas (productor/consumidor) =====================
+# Rasterizado (Poppler, I/O + subproceso) → OCR (CPU, concurrencia limitada)
+# → enrutado + compresión Ghostscript + renombrado (I/O + subproceso).
+# Las colas entre etapas son acotadas: si el OCR va lento, el rasterizado se frena
+# solo (no se acumulan páginas en RAM); si Ghostscript va lento, no bloquea cupos de OCR.
+
+def procesar_en_pipeline(rutas, al_terminar, hilos_raster=None, hilos_ocr=None, hilos_post=None):
+    """
+    Procesa `rutas` con una etapa de hilos por tipo de trabajo.
+    `al_terminar(ruta, resultado, error)` se llama en el hilo que invoca esta función.
+    """
+    nucleos = os.cpu_count() or 1
+    hilos_raster = hilos_raster or HILOS_RASTER
+    hilos_ocr    = hilos_ocr or HILOS_OCR or max(1, min(nucleos // 2, 4))
+    hilos_post   = hilos_post or HILOS_POST
+
+    registrar_log_proceso(
+        f"🧵 Pipeline: raster={hilos_raster} | OCR={hilos_ocr} | post={hilos_post}"
+    )
+
+    cola_raster = queue.Queue()
+    cola_ocr    = queue.Queue(maxsize=hilos_ocr * 2)   # páginas rasterizadas esperando OCR
+    cola_post   = queue.Queue(maxsize=hilos_post * 4)
+    cola_fin    = queue.Queue()
+
+    def _post(doc):
+        _etapa_enrutar(doc)
+        if not doc.terminado:
+            _etapa_postproceso(doc)
+
+    etapas = [
+        # (función, n hilos, entrada, salida)
+        (_etapa_rasterizar, hilos_raster, cola_raster, cola_ocr),
+        (_etapa_ocr,        hilos_ocr,    cola_ocr,    cola_post),
+        (_post,             hilos_post,   cola_post,   cola_fin),
+    ]
+
+    hilos = []
+    for i, (fn, n, entrada, salida) in enumerate(etapas):
+        n_siguiente = etapas[i + 1][1] if i + 1 < len(etapas) else 1
+        restantes = {"n": n}
+        lock = threading.Lock()
+
+        def _bucle(fn=fn, entrada=entrada, salida=salida, n_siguiente=n_siguiente,
+                   restantes=restantes, lock=lock):
+            while True:
+                doc = entrada.get()
+                if doc is None:
+                    break
+                try:
+                    fn(doc)
+                except Exception as e:
+                    doc.error = e
+                    doc.terminar()
+                (cola_fin if doc.terminado else salida).put(doc)
+            # El último hilo de la etapa avisa a la siguiente que no vendrá más trabajo
+            with lock:
+                restantes["n"] -= 1
+                if restantes["n"] == 0:
+                    for _ in range(n_siguiente):
+                        salida.put(None)
+
+        for _ in range(n):
+            t = threading.Thread(target=_bucle, daemon=True)
+            t.start()
+            hilos.append(t)
+
+    # Igual que procesar_archivo: un PDF que ya se está procesando (vigilancia,
+    # escaneo) no entra; los tomados quedan en _en_curso hasta salir (ocupado())
+    claves = {}
+    try:
+        for ruta in rutas:
+            clave = os.path.normcase(os.path.abspath(ruta))
+            with _en_curso_lock:
+                repetido = clave in _en_curso or clave in claves.values()
+                if not repetido:
+                    _en_curso.add(clave)
+            if repetido:
+                registrar_log_proceso(f"⏭️ {os.path.basename(ruta)} ya se está procesando")
+                al_terminar(ruta, None, None)
+                continue
+            doc = _Documento(ruta)
+            claves[id(doc)] = clave
+            cola_raster.put(doc)
+        for _ in range(hilos_raster):
+            cola_raster.put(None)
+
+        while True:
+            doc = cola_fin.get()
+            if doc is None:
+                break
+            if doc.fuente is not None:
+                doc.fuente.cerrar()
+            with _en_curso_lock:
+                _en_curso.discard(claves.pop(id(doc), None))
+            al_terminar(doc.pdf_path, doc.resultado, doc.error)
+    finally:
+        with _en_curso_lock:
+            _en_curso.difference_update(claves.values())
+
+    for t in hilos:
+        t.join(timeout=1)
 
 # ===================== Procesamiento por carpeta (multi-hilo) =====================
 
+def _reportar_resultado(path, resultado, error=None, prefijo=""):
+    """Deja en log/UI el resultado de 1 PDF (`prefijo`: ej. '3/10 ')."""
+    nombre = os.path.basename(path)
+    if error is not None:
+        registrar_log_proceso(f"❌ Error procesando archivo {nombre}: {error}")
+        return
+    if resultado:
+        nombre_out = os.path.basename(resultado)
+
+        # 1) Guardar la ruta para poder abrirla desde el log de la UI
+        registrar_link_documento(nombre_out, resultado)
+
+        # 2) Log en archivo con ruta clickeable (para el .txt)
+        uri = "file:///" + resultado.replace("\\", "/")
+        registrar_log(f"✅ Procesado: {uri}")
+
+        # 3) Texto que se ve en el textbox de la app (solo nombre)
+        print(f"{prefijo}✅ Procesado: {nombre_out}")
+    else:
+        print(f"{prefijo}⚠️ Procesado con advertencias: {nombre}")
+
 def procesar_entrada_una_vez():
     """
     Procesa TODOS los PDFs de CARPETA_ENTRADA una sola vez con mejor tiempo de arranque:
       - Arranca ya con un burst inicial (sin ordenar) para dar feedback inmediato.
       - Ordena el resto por fecha de modificación (antiguos primero).
-      - Usa ThreadPoolExecutor con hasta 8 hilos (o núcleos de CPU, lo que sea menor).
+      - Usa ThreadPoolExecutor con hasta 8 hilos (o núcleos de CPU, lo que sea menor),
+        el pipeline por etapas (MOTOR_OCR = "pipeline") o el motor multi-proceso
+        (MOTOR_OCR = "procesos").
       - Muestra un messagebox al finalizar con el tiempo total.
     """
     import time, itertools, os, tkinter as tk
@@ -573,11 +1067,13 @@ def procesar_entrada_una_vez():
     inicio = time.perf_counter()
 
     # (Opcional pero útil) Asegura que el OCR esté cargado antes de lanzar hilos
-    try:
-        from ocr.ocr_utils import warmup_ocr
-        warmup_ocr()
-    except Exception:
-        pass
+    # (en modo "procesos" cada hijo carga el suyo)
+    if MOTOR_OCR != "procesos":
+        try:
+            from ocr.ocr_utils import warmup_ocr
+            warmup_ocr()
+        except Exception:
+            pass
 
 
     # Config de concurrencia
@@ -585,7 +1081,7 @@ def procesar_entrada_una_vez():
     max_hilos = min(nucleos, 8)
     burst = max_hilos * 2  # primeros N archivos "ya" sin ordenar
 
-    registrar_log_proceso(f"🧠 Núcleos detectados: {nucleos} | Hilos usados: {max_hilos}")
+    registrar_log_proceso(f"🧠 Núcleos detectados: {nucleos} | Hilos usados: {max_hilos} | Motor: {MOTOR_OCR}")
     print("🔍 Buscando documentos en la carpeta de entrada...")
 
     # Generador rápido con os.scandir (más veloz que listdir + joins)
@@ -616,58 +1112,63 @@ def procesar_entrada_una_vez():
             print("Sin documentos pendientes")
         return
 
-    # Pool de hilos para procesar en paralelo
     procesados = 0
-    with ThreadPoolExecutor(max_workers=max_hilos) as executor:
-        futures = {}
-
-        # ✅ Lanza inmediatamente el burst inicial (sin ordenar) para feedback rápido
-        for e in primeros:
-            futures[executor.submit(procesar_archivo, e.path)] = e.path
+    total = 0
 
-        # 🔁 Mientras los primeros ya se están procesando, ahora sí obtenemos el resto
-        resto = list(entries_iter)
+    def _reportar(path, resultado, error=None):
+        nonlocal procesados
+        procesados += 1
+        _reportar_resultado(path, resultado, error, prefijo=f"{procesados}/{total} ")
 
+    def _ordenar_resto(resto):
         # Ordena el resto por mtime (antiguos primero)
-        if resto:
-            try:
-                resto.sort(key=lambda de: (de.stat().st_mtime, de.name))
-            except Exception:
-                # Si stat falla para alguno, caemos a ordenar sólo por nombre
-                resto.sort(key=lambda de: de.name)
+        try:
+            resto.sort(key=lambda de: (de.stat().st_mtime, de.name))
+        except Exception:
+            # Si stat falla para alguno, caemos a ordenar sólo por nombre
+            resto.sort(key=lambda de: de.name)
+        return resto
+
+    if MOTOR_OCR == "procesos":
+        # Los hijos tardan unos segundos en cargar el modelo: se listan y ordenan todos antes
+        from core.motor_procesos import procesar_en_procesos
+        rutas = [e.path for e in primeros] + [e.path for e in _ordenar_resto(list(entries_iter))]
+        total = len(rutas)
+        print(f"🗂️ Encontrados: {total} documento(s) PDF.")
+        with _actividad():
+            procesar_en_procesos(rutas, variables, _reportar, n_procesos=PROCESOS_OCR)
+    elif MOTOR_OCR == "pipeline":
+        rutas = [e.path for e in primeros] + [e.path for e in _ordenar_resto(list(entries_iter))]
+        total = len(rutas)
+        print(f"🗂️ Encontrados: {total} documento(s) PDF.")
+        with _actividad():
+            procesar_en_pipeline(rutas, _reportar)
+    else:
+        # Pool de hilos para procesar en paralelo
+        with ThreadPoolExecutor(max_workers=max_hilos) as executor:
+            futures = {}
+
+            # ✅ Lanza inmediatamente el burst inicial (sin ordenar) para feedback rápido
+            for e in primeros:
+                futures[executor.submit(procesar_archivo, e.path)] = e.path
+
+            # 🔁 Mientras los primeros ya se están procesando, ahora sí obtenemos el resto
+            resto = _ordenar_resto(list(entries_iter))
 
             # Enviamos el resto al pool
             for e in resto:
                 futures[executor.submit(procesar_archivo, e.path)] = e.path
 
-        total = len(futures)
-        print(f"🗂️ Encontrados: {total} documento(s) PDF.")
-
-        # Consume a medida que terminen (no en orden de envío)
-        for fut in as_completed(futures):
-            path = futures[fut]
-            nombre = os.path.basename(path)
-            procesados += 1
-            try:
-                resultado = fut.result()
-                if resultado:
-                    nombre_out = os.path.basename(resultado)
-
-                    # 1) Guardar la ruta para poder abrirla desde el log de la UI
-                    registrar_link_documento(nombre_out, resultado)
-
-                    # 2) Log en archivo con ruta clickeable (para el .txt)
-                    uri = "file:///" + resultado.replace("\\", "/")
-                    registrar_log(f"✅ Procesado: {uri}")
-
-                    # 3) Texto que se ve en el textbox de la app (solo nombre)
-                    print(f"{procesados}/{total} ✅ Procesado: {nombre_out}")
-                else:
-                    print(f"{procesados}/{total} ⚠️ Procesado con advertencias: {nombre}")
-            except Exception as e:
-                registrar_log_proceso(f"❌ Error procesando archivo {nombre}: {e}")
-
+            total = len(futures)
+            print(f"🗂️ Encontrados: {total} documento(s) PDF.")
 
+            # Consume a medida que terminen (no en orden de envío)
+            for fut in as_completed(futures):
+                path = futures[fut]
+                try:
+                    _reportar(path, fut.result())
+                except Exception as e:
+                    _reportar(path, None, e)
 
     # Informe final de duración total
     duracion = time.perf_counter() - inicio
@@ -683,3 +1184,55 @@ def procesar_entrada_una_vez():
     except Exception:
         print(f"✅ Procesamiento completado en {minutos} min {segundos} seg.")
 
+
+# ===================== Modo vigilancia =====================
+def iniciar_vigilancia(pausado=None):
+    """
+    Procesa cada PDF que llega a CARPETA_ENTRADA apenas está estable, sin re-escanear
+    la carpeta (notificaciones del sistema de archivos; sondeo en carpetas de red).
+    Usa procesar_archivo en HILOS_VIGILANCIA hilos de este proceso, sea cual sea MOTOR_OCR.
+    `pausado()` → True retiene los nuevos mientras corre otra tarea.
+    Devuelve el Vigilante: .detener() para terminar.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from core.vigilancia import Vigilante
+
+    # El modelo se carga en segundo plano: el primer PDF no espera el arranque de la UI
+    def _precalentar():
+        try:
+            from ocr.ocr_utils import warmup_ocr
+            warmup_ocr()
+        except Exception:
+            pass
+    threading.Thread(target=_precalentar, daemon=True).start()
+
+    ejecutor = ThreadPoolExecutor(max_workers=max(1, HILOS_VIGILANCIA), thread_name_prefix="vigilancia")
+
+    en_cola = set()          # entregados y aún sin terminar (evita encolar dos veces)
+    en_cola_lock = threading.Lock()
+
+    def _al_archivo(ruta):
+        with en_cola_lock:
+            if ruta in en_cola:
+                return
+            en_cola.add(ruta)
+        registrar_log_proceso(f"👁️ Nuevo en entrada: {os.path.basename(ruta)}")
+        futuro = ejecutor.submit(procesar_archivo, ruta)
+
+        def _fin(f):
+            with en_cola_lock:
+                en_cola.discard(ruta)
+            try:
+                _reportar_resultado(ruta, f.result())
+            except Exception as e:
+                _reportar_resultado(ruta, None, e)
+        futuro.add_done_callback(_fin)
+
+    return Vigilante(
+        CARPETA_ENTRADA,
+        _al_archivo,
+        intervalo=INTERVALO,
+        espera_estable=INTERVALO,
+        pausado=pausado,
+        al_detener=lambda: ejecutor.shutdown(wait=False),
+    ).iniciar()
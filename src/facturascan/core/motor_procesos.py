@@ -0,0 +1,187 @@
+# Motor OCR multi-proceso para procesar_entrada_una_vez.
+#
+#  - N procesos hijo; cada uno carga su propio easyocr.Reader UNA vez y fija
+#    torch.set_num_threads para no pelear por los núcleos con los demás.
+#  - Los PDFs se reparten por una cola de trabajo (rutas) y cada hijo ejecuta
+#    procesar_archivo completo (rasterizado, OCR, clasificación, compresión).
+#  - Resultados, líneas de print() y métricas por etapa vuelven al proceso GUI
+#    por una cola única.
+#
+# Notas:
+#  - Se usa el contexto "spawn" (el único disponible en Windows): los hijos
+#    re-importan app.py como "__mp_main__", por eso app.py protege sus efectos
+#    de arranque con ES_PROCESO_PRINCIPAL.
+#  - La configuración (variables) y el modo debug se pasan explícitamente,
+#    porque los globals de monitor_core del proceso GUI no viajan al hijo.
+
+import os
+import sys
+import queue
+import contextlib
+import multiprocessing as mp
+
+from utils.log_utils import registrar_log_proceso, is_debug, cerrar_logs
+from utils import metricas
+
+
+def calcular_reparto(n_procesos: int = 0):
+    """
+    Devuelve (procesos, hilos_torch_por_proceso).
+    n_procesos <= 0 → automático: 1 proceso cada 4 núcleos, máximo 4
+    (cada hijo mantiene su propio modelo en RAM, ~0.5 GB).
+    """
+    nucleos = os.cpu_count() or 1
+    if n_procesos <= 0:
+        n_procesos = max(1, min(nucleos // 4, 4))
+    hilos_torch = max(1, nucleos // n_procesos)
+    return n_procesos, hilos_torch
+
+
+class _SalidaACola:
+    """Reemplaza stdout/stderr del hijo: cada write viaja al proceso GUI."""
+    def __init__(self, cola):
+        self.cola = cola
+
+    def write(self, text):
+        if text:
+            try:
+                self.cola.put(("log", text))
+            except Exception:
+                pass
+
+    def flush(self):
+        pass
+
+
+@contextlib.contextmanager
+def _limite_hilos_nativos(hilos):
+    """
+    OMP_NUM_THREADS / MKL_NUM_THREADS del proceso GUI mientras se lanzan los hijos.
+    Tienen que estar en el entorno heredado: con spawn el hijo re-importa app.py
+    (→ monitor_core → ocr_utils → torch) antes de llegar a _worker, y OpenMP/MKL
+    leen estas variables al cargar. Al salir se restauran los valores del GUI.
+    """
+    previos = {var: os.environ.get(var) for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+    for var in previos:
+        os.environ[var] = str(hilos)
+    try:
+        yield
+    finally:
+        for var, valor in previos.items():
+            if valor is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = valor
+
+
+def _worker(cola_trabajo, cola_resultados, config, debug, hilos_torch):
+    """Bucle del proceso hijo: carga OCR una vez y procesa rutas hasta recibir None."""
+    # OMP/MKL ya vienen fijados en el entorno heredado (_limite_hilos_nativos);
+    # torch ya está importado, así que aquí solo se ajustan sus pools propios
+    sys.stdout = _SalidaACola(cola_resultados)
+    sys.stderr = _SalidaACola(cola_resultados)
+
+    try:
+        import torch
+        torch.set_num_threads(hilos_torch)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+
+    try:
+        from utils.log_utils import set_debug
+        set_debug(debug)
+
+        # Las métricas del hijo viajan al proceso GUI, que es el único que exporta
+        metricas.EXPORTAR = False
+
+        from core import monitor_core
+        monitor_core.aplicar_nueva_config(config)
+
+        from ocr.ocr_utils import warmup_ocr
+        warmup_ocr()
+    except Exception as e:
+        cola_resultados.put(("fallo", os.getpid(), f"{e}"))
+        return
+
+    cola_resultados.put(("listo", os.getpid(), None))
+
+    while True:
+        ruta = cola_trabajo.get()
+        if ruta is None:
+            break
+        try:
+            resultado, error = monitor_core.procesar_archivo(ruta), None
+        except Exception as e:
+            resultado, error = None, f"{e}"
+        # Métricas antes del resultado: tras el último resultado el GUI deja de leer
+        cola_resultados.put(("metricas", metricas.tomar_estado(reiniciar=True)))
+        cola_resultados.put(("resultado", ruta, resultado, error))
+
+    # El proceso puede terminar en cuanto vuelve: deja escrito el log pendiente
+    cerrar_logs()
+
+
+def procesar_en_procesos(rutas, config, al_terminar, n_procesos: int = 0):
+    """
+    Procesa `rutas` (en el orden dado) con un pool de procesos OCR.
+    `al_terminar(ruta, resultado, error)` se llama en el proceso GUI por cada PDF,
+    en orden de finalización. Las líneas de print() de los hijos se re-imprimen aquí.
+    """
+    if not rutas:
+        return
+
+    n_procesos, hilos_torch = calcular_reparto(n_procesos)
+    n_procesos = min(n_procesos, len(rutas))
+    registrar_log_proceso(f"🧠 Motor multi-proceso: {n_procesos} proceso(s) x {hilos_torch} hilo(s) torch")
+
+    ctx = mp.get_context("spawn")
+    cola_trabajo = ctx.Queue()
+    cola_resultados = ctx.Queue()
+
+    for ruta in rutas:
+        cola_trabajo.put(ruta)
+    for _ in range(n_procesos):
+        cola_trabajo.put(None)
+
+    procesos = []
+    with _limite_hilos_nativos(hilos_torch):
+        for _ in range(n_procesos):
+            p = ctx.Process(
+                target=_worker,
+                args=(cola_trabajo, cola_resultados, dict(config or {}), is_debug(), hilos_torch),
+                daemon=True,
+            )
+            p.start()
+            procesos.append(p)
+
+    pendientes = len(rutas)
+    try:
+        while pendientes > 0:
+            try:
+                msg = cola_resultados.get(timeout=1.0)
+            except queue.Empty:
+                # Si todos los hijos murieron (crash/kill) no queda nadie que responda
+                if not any(p.is_alive() for p in procesos):
+                    registrar_log_proceso(f"❌ Procesos OCR terminados con {pendientes} PDF(s) sin procesar.")
+                    break
+                continue
+
+            tipo = msg[0]
+            if tipo == "log":
+                print(msg[1], end="")
+            elif tipo == "resultado":
+                _, ruta, resultado, error = msg
+                pendientes -= 1
+                al_terminar(ruta, resultado, error)
+            elif tipo == "metricas":
+                metricas.fusionar(msg[1])
+            elif tipo == "listo":
+                registrar_log_proceso(f"✅ Proceso OCR {msg[1]} listo")
+            elif tipo == "fallo":
+                registrar_log_proceso(f"❌ Proceso OCR {msg[1]} no pudo iniciar: {msg[2]}")
+    finally:
+        for p in procesos:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
@@ -0,0 +1,90 @@
+# Registro en memoria de nombres ocupados por carpeta de salida.
+#
+#  - La primera vez que se pide un nombre en una carpeta se lee con UN os.scandir
+#    y se guarda el conjunto de nombres (normcase: en Windows no distingue
+#    mayúsculas). Desde ahí, nombre / nombre_1 / nombre_2 ... se prueban en memoria.
+#  - Reservar es atómico por carpeta (un lock por carpeta, no uno global): dos
+#    hilos nunca reciben el mismo nombre aunque todavía no hayan movido el archivo,
+#    y una carpeta con mucho tráfico no frena a las demás.
+#  - Revalidación perezosa: el candidato elegido se confirma con un solo
+#    os.path.exists (lo pudo crear otro proceso u otro equipo en el share) y el
+#    conjunto se vuelve a leer pasado REGISTRO_NOMBRES_TTL_S.
+#  - liberar() devuelve un nombre reservado que al final no se usó (el movimiento
+#    falló); monitor_core._mover_a_nombre_libre la llama.
+#  - El registro es por proceso: con el motor OCR "procesos" dos hijos pueden
+#    reservar el mismo nombre. Por eso los movimientos nunca reemplazan un archivo
+#    existente (monitor_core._mover_sin_pisar) y, si el nombre ya está en disco,
+#    se reserva el siguiente.
+
+import os
+import time
+import threading
+
+REGISTRO_NOMBRES_TTL_S = 300     # segundos antes de releer una carpeta con scandir
+
+
+class _Carpeta:
+    __slots__ = ("lock", "ocupados", "leida")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ocupados = None     # set de nombres (normcase) o None = sin leer
+        self.leida = 0.0
+
+
+_carpetas = {}
+_carpetas_lock = threading.Lock()
+
+
+def _carpeta(ruta):
+    c = _carpetas.get(ruta)
+    if c is None:
+        with _carpetas_lock:
+            c = _carpetas.setdefault(ruta, _Carpeta())
+    return c
+
+
+def _leer(ruta):
+    ocupados = set()
+    try:
+        with os.scandir(ruta) as it:
+            for entrada in it:
+                ocupados.add(os.path.normcase(entrada.name))
+    except FileNotFoundError:
+        pass
+    return ocupados
+
+
+def reservar(ruta, nombre_base, extension):
+    """
+    Devuelve el primer nombre libre nombre_base + ( _1 | _2 | ... ) + extension
+    dentro de `ruta` y lo deja reservado.
+    """
+    c = _carpeta(ruta)
+    with c.lock:
+        ahora = time.monotonic()
+        if c.ocupados is None or ahora - c.leida > REGISTRO_NOMBRES_TTL_S:
+            c.ocupados, c.leida = _leer(ruta), ahora
+        contador = 0
+        while True:
+            nombre = f"{nombre_base}{extension}" if contador == 0 else f"{nombre_base}_{contador}{extension}"
+            clave = os.path.normcase(nombre)
+            contador += 1
+            if clave in c.ocupados:
+                continue
+            c.ocupados.add(clave)
+            # Confirmación contra el disco: solo el candidato, no toda la serie
+            if os.path.exists(os.path.join(ruta, nombre)):
+                continue
+            return nombre
+
+
+def liberar(ruta, nombre):
+    """Quita la reserva de `nombre` (p. ej. si el movimiento falló)."""
+    c = _carpetas.get(ruta)
+    if c is None:
+        return
+    with c.lock:
+        if c.ocupados is not None:
+            c.ocupados.discard(os.path.normcase(nombre))
+
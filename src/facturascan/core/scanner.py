@@ -201,6 +201,17 @@ def _tk_alert(titulo: str, mensaje: str, tipo: str = "warning"):
 
 
 # -----------------------------------------------------------
+# Origen del último escaneo ("escaner:<DeviceID>:adf|plano"): monitor_core lo usa
+# para la orientación habitual de cada escáner y bandeja (ocr/orientacion_origen.py)
+_ultimo_origen = {"origen": ""}
+
+def origen_ultimo_escaneo() -> str:
+    return _ultimo_origen["origen"]
+
+def _registrar_origen(device, adf: bool):
+    dev = _get_device_id(device) or _get_device_name(device) or "desconocido"
+    _ultimo_origen["origen"] = f"escaner:{dev}:{'adf' if adf else 'plano'}"
+
 def escanear_y_guardar_pdf(nombre_archivo_pdf, carpeta_entrada):
     """
     Escanea con WIA y guarda un PDF en `carpeta_entrada`.
@@ -476,6 +487,7 @@ def escanear_y_guardar_pdf(nombre_archivo_pdf, carpeta_entrada):
         _select_source(device, True)
         time.sleep(0.5)  # breve settling; algunos drivers lo necesitan
         rutas_mem, motivo = _transfer_mem(device, True, max_pages=1)
+        _registrar_origen(device, bool(rutas_mem))
 
         # Si ADF no entregó nada, cae a flatbed (1 hoja)
         if (motivo in ("ADF_EMPTY", "ADF_BUSY", "NO_IMAGE", "TRANSFER_ERROR")) and not rutas_mem:
@@ -499,6 +511,7 @@ def escanear_y_guardar_pdf(nombre_archivo_pdf, carpeta_entrada):
                 _select_source(device2, True)
                 time.sleep(0.5)
                 rutas_mem, motivo = _transfer_mem(device2, True, max_pages=1)
+                _registrar_origen(device2, bool(rutas_mem))
 
                 if (motivo in ("ADF_EMPTY", "ADF_BUSY", "NO_IMAGE", "TRANSFER_ERROR")) and not rutas_mem:
                     _select_source(device2, False)
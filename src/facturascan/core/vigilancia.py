@@ -0,0 +1,297 @@
+# Modo vigilancia de la carpeta de entrada.
+#
+#  - Notificaciones del sistema de archivos con una sola interfaz (esperar(timeout) →
+#    nombres que cambiaron):
+#      Windows: ReadDirectoryChangesW (pywin32, E/S overlapped para poder cortar)
+#      Linux:   inotify vía ctypes
+#      Red / sin soporte: sondeo con os.scandir cada `intervalo` segundos
+#    En carpetas de red (UNC, unidad mapeada, nfs/cifs) se usa siempre el sondeo:
+#    las notificaciones remotas no son confiables.
+#  - Cada PDF nuevo espera a estar estable (tamaño y mtime sin cambios durante
+#    `espera_estable` y que se pueda abrir) antes de entregarse a `al_archivo`.
+#  - Nunca se re-escanea la carpeta completa salvo una vez al activar (lo que ya
+#    estaba) y en el modo sondeo, que es justamente el de respaldo.
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import threading
+
+from utils.log_utils import registrar_log_proceso
+
+
+def _es_pdf(nombre: str) -> bool:
+    return nombre.lower().endswith(".pdf")
+
+
+def _es_carpeta_de_red(carpeta: str) -> bool:
+    carpeta = os.path.abspath(carpeta)
+    if sys.platform == "win32":
+        unidad, _ = os.path.splitdrive(carpeta)
+        if unidad.startswith("\\\\"):
+            return True   # UNC \\servidor\recurso
+        try:
+            import ctypes
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(unidad + "\\") == DRIVE_REMOTE
+        except Exception:
+            return False
+
+    # Linux: tipo de sistema de archivos del punto de montaje más largo que la contiene
+    try:
+        mejor, tipo = "", ""
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for linea in f:
+                partes = linea.split()
+                if len(partes) >= 3 and (carpeta == partes[1] or carpeta.startswith(partes[1].rstrip("/") + "/")):
+                    if len(partes[1]) > len(mejor):
+                        mejor, tipo = partes[1], partes[2]
+        return tipo.split(".")[-1] in {"nfs", "nfs4", "cifs", "smb3", "smbfs", "sshfs", "9p"}
+    except Exception:
+        return False
+
+
+# ===================== Fuentes de cambios =====================
+class _CambiosSondeo:
+    """Respaldo: compara (tamaño, mtime) de los PDFs entre pasadas."""
+    nombre = "sondeo"
+
+    def __init__(self, carpeta, intervalo):
+        self.carpeta = carpeta
+        self.intervalo = intervalo
+        self._anterior = self._foto()
+
+    def _foto(self):
+        foto = {}
+        try:
+            with os.scandir(self.carpeta) as it:
+                for e in it:
+                    if _es_pdf(e.name):
+                        try:
+                            st = e.stat()
+                            foto[e.name] = (st.st_size, st.st_mtime)
+                        except OSError:
+                            continue
+        except OSError:
+            pass
+        return foto
+
+    def esperar(self, timeout):
+        time.sleep(max(timeout, self.intervalo))
+        actual = self._foto()
+        cambios = [n for n, firma in actual.items() if self._anterior.get(n) != firma]
+        self._anterior = actual
+        return cambios
+
+    def cerrar(self):
+        pass
+
+
+class _CambiosInotify:
+    nombre = "inotify"
+    _IN_MODIFY, _IN_CLOSE_WRITE, _IN_MOVED_TO, _IN_CREATE = 0x2, 0x8, 0x80, 0x100
+    _CABECERA = struct.Struct("iIII")   # wd, mask, cookie, len
+
+    def __init__(self, carpeta):
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mascara = self._IN_MODIFY | self._IN_CLOSE_WRITE | self._IN_MOVED_TO | self._IN_CREATE
+        if libc.inotify_add_watch(self._fd, os.fsencode(carpeta), mascara) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, "inotify_add_watch")
+
+    def esperar(self, timeout):
+        listos, _, _ = select.select([self._fd], [], [], timeout)
+        if not listos:
+            return []
+        try:
+            datos = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        nombres, i = [], 0
+        while i + self._CABECERA.size <= len(datos):
+            _, _, _, largo = self._CABECERA.unpack_from(datos, i)
+            i += self._CABECERA.size
+            nombre = datos[i:i + largo].rstrip(b"\0")
+            i += largo
+            if nombre:
+                nombres.append(os.fsdecode(nombre))
+        return nombres
+
+    def cerrar(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+class _CambiosWindows:
+    nombre = "ReadDirectoryChangesW"
+
+    def __init__(self, carpeta):
+        import win32file, win32con, win32event, pywintypes
+        self._w32, self._ev = win32file, win32event
+        self._handle = win32file.CreateFile(
+            carpeta,
+            0x0001,   # FILE_LIST_DIRECTORY
+            win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE | win32con.FILE_SHARE_DELETE,
+            None,
+            win32con.OPEN_EXISTING,
+            win32con.FILE_FLAG_BACKUP_SEMANTICS | win32con.FILE_FLAG_OVERLAPPED,
+            None,
+        )
+        self._overlapped = pywintypes.OVERLAPPED()
+        self._overlapped.hEvent = win32event.CreateEvent(None, True, 0, None)
+        self._buffer = win32file.AllocateReadBuffer(64 * 1024)
+        self._filtro = (
+            win32con.FILE_NOTIFY_CHANGE_FILE_NAME
+            | win32con.FILE_NOTIFY_CHANGE_SIZE
+            | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE
+        )
+        self._armar()
+
+    def _armar(self):
+        self._w32.ReadDirectoryChangesW(self._handle, self._buffer, False, self._filtro, self._overlapped)
+
+    def esperar(self, timeout):
+        rc = self._ev.WaitForSingleObject(self._overlapped.hEvent, int(timeout * 1000))
+        if rc != self._ev.WAIT_OBJECT_0:
+            return []
+        n = self._w32.GetOverlappedResult(self._handle, self._overlapped, True)
+        self._ev.ResetEvent(self._overlapped.hEvent)
+        # n == 0: el buffer se desbordó; quien llama re-revisa lo pendiente igual
+        nombres = [nombre for _, nombre in self._w32.FILE_NOTIFY_INFORMATION(self._buffer, n)] if n else []
+        self._armar()
+        return nombres
+
+    def cerrar(self):
+        try:
+            self._w32.CancelIo(self._handle)
+            self._handle.Close()
+        except Exception:
+            pass
+
+
+def _crear_fuente(carpeta, intervalo):
+    if _es_carpeta_de_red(carpeta):
+        registrar_log_proceso(f"👁️ {carpeta} es carpeta de red: vigilancia por sondeo")
+        return _CambiosSondeo(carpeta, intervalo)
+    try:
+        if sys.platform == "win32":
+            return _CambiosWindows(carpeta)
+        if sys.platform.startswith("linux"):
+            return _CambiosInotify(carpeta)
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Notificaciones de archivos no disponibles ({e}); se usa sondeo")
+    return _CambiosSondeo(carpeta, intervalo)
+
+
+# ===================== Vigilante =====================
+class Vigilante:
+    """
+    Hilo que vigila `carpeta` y llama `al_archivo(ruta)` (en el hilo del vigilante)
+    por cada PDF nuevo una vez estable. `pausado()` → True retiene las entregas
+    (ej. mientras corre un escaneo o un "Procesar carpeta" manual).
+    """
+
+    def __init__(self, carpeta, al_archivo, intervalo=1.0, espera_estable=1.0, pausado=None, al_detener=None):
+        self.carpeta = carpeta
+        self.al_archivo = al_archivo
+        self.intervalo = max(0.2, float(intervalo))
+        self.espera_estable = espera_estable
+        self.pausado = pausado or (lambda: False)
+        self.al_detener = al_detener
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name="vigilancia-entrada", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self, timeout=3.0):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+        if self.al_detener:
+            self.al_detener()
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def _bucle(self):
+        fuente = _crear_fuente(self.carpeta, self.intervalo)
+        registrar_log_proceso(f"👁️ Vigilando {self.carpeta} ({fuente.nombre})")
+
+        # ruta -> (firma (tamaño, mtime) o None, instante desde el que la firma no cambia)
+        candidatos = {}
+        try:
+            # Lo que ya estaba al activar
+            with os.scandir(self.carpeta) as it:
+                for e in it:
+                    if _es_pdf(e.name):
+                        candidatos[e.path] = (None, time.monotonic())
+        except OSError as e:
+            registrar_log_proceso(f"⚠️ Vigilancia: no se pudo listar {self.carpeta}: {e}")
+
+        try:
+            while not self._parar.is_set():
+                # Con candidatos pendientes se despierta seguido para medir estabilidad
+                espera = 0.25 if candidatos else self.intervalo
+                try:
+                    nombres = fuente.esperar(espera)
+                except Exception as e:
+                    registrar_log_proceso(f"⚠️ Vigilancia: fallo de notificaciones ({e}); se pasa a sondeo")
+                    fuente.cerrar()
+                    fuente = _CambiosSondeo(self.carpeta, self.intervalo)
+                    continue
+
+                ahora = time.monotonic()
+                for nombre in nombres:
+                    if _es_pdf(nombre):
+                        # Cualquier cambio reinicia la espera de estabilidad
+                        candidatos[os.path.join(self.carpeta, nombre)] = (None, ahora)
+
+                if candidatos and not self.pausado():
+                    self._revisar(candidatos)
+        finally:
+            fuente.cerrar()
+            registrar_log_proceso("👁️ Vigilancia detenida")
+
+    def _revisar(self, candidatos):
+        ahora = time.monotonic()
+        for ruta, (firma, desde) in list(candidatos.items()):
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                candidatos.pop(ruta, None)   # ya no está (movido / procesado por otro)
+                continue
+
+            actual = (st.st_size, st.st_mtime)
+            if actual != firma:
+                candidatos[ruta] = (actual, ahora)
+                continue
+            if st.st_size == 0 or ahora - desde < self.espera_estable:
+                continue
+            try:
+                # En Windows falla si el escáner/copiador aún lo tiene abierto sin compartir
+                with open(ruta, "rb"):
+                    pass
+            except OSError:
+                continue
+
+            candidatos.pop(ruta, None)
+            try:
+                self.al_archivo(ruta)
+            except Exception as e:
+                registrar_log_proceso(f"❌ Vigilancia: error entregando {os.path.basename(ruta)}: {e}")
@@ -0,0 +1,379 @@
+# Micro-benchmark de los extractores de texto (capa posterior al OCR).
+#
+#  - Corpus versionado de cabeceras OCR anonimizadas: debug/corpus_cabeceras.jsonl
+#    (1ª línea = metadatos con "version"; luego {"id", "texto", "esperado"}).
+#    El corpus sintético usa RUTs inventados con DV válido y el ruido típico del
+#    OCR (O/0, I/1, rótulos "R.U.T", "N°", "FOLIO"...). Se pueden agregar a mano
+#    textos reales anonimizados con el mismo formato.
+#  - Por función: textos/s, latencia p50/p99 y aciertos contra "esperado"
+#    (solo se evalúan los textos que traen la clave de esa función).
+#  - --guardar base.json deja una línea base; --comparar base.json muestra los
+#    deltas y termina con código 1 si baja la precisión de alguna función.
+#  - --equivalencia compara extraer_rut / extraer_numero_factura, de punta a punta,
+#    contra las salidas guardadas en debug/referencia_extractores.jsonl: el corpus
+#    más variantes ruidosas de cada texto (una línea, minúsculas, confusiones
+#    O/0 I/1 B/8 S/5 Z/2 G/6, líneas desordenadas, rótulos distractores y claves de
+#    las tablas de normalización). Las salidas se generaron con los extractores
+#    anteriores a las tablas compiladas; cualquier diferencia es un cambio de
+#    comportamiento y termina con código 1. --fijar-referencia reescribe el archivo
+#    con los extractores actuales (solo tras un cambio de comportamiento buscado).
+#    tests/test_normalizacion.py exige cero diferencias.
+#
+# Uso (desde src/facturascan):
+#   python -m debug.bench_extractores                       # medir
+#   python -m debug.bench_extractores --guardar base.json   # guardar línea base
+#   python -m debug.bench_extractores --comparar base.json  # comparar contra ella
+#   python -m debug.bench_extractores --regenerar           # reescribir el corpus
+#   python -m debug.bench_extractores --equivalencia        # mismas salidas que la referencia
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import contextlib
+from datetime import datetime
+
+CORPUS_VERSION = 1
+CORPUS_SEMILLA = 2024
+CORPUS_TAMANO  = 400
+RUTA_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_cabeceras.jsonl")
+RUTA_REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "referencia_extractores.jsonl")
+VARIANTES_POR_TEXTO = 12
+
+
+# ===================== Corpus sintético =====================
+def _dv(cuerpo: str) -> str:
+    s = sum(int(d) * f for d, f in zip(reversed(cuerpo), [2, 3, 4, 5, 6, 7] * 2))
+    r = 11 - (s % 11)
+    return "0" if r == 11 else "K" if r == 10 else str(r)
+
+
+def _rut_con_puntos(cuerpo: str) -> str:
+    return f"{cuerpo[:-6]}.{cuerpo[-6:-3]}.{cuerpo[-3:]}"
+
+
+_ROTULOS_RUT    = ["R.U.T.:", "RUT:", "R.U.T", "RUT", "RUT :", "R.U.T.::", "RVT", "Rut:"]
+_ROTULOS_NUMERO = ["N°", "Nº", "N", "NO", "Nro.", "FOLIO", "Folio N°", "N :"]
+_TITULOS_FACTURA = ["FACTURA ELECTRONICA", "FACTURA ELECTRÓNICA", "Factura Electronica",
+                    "FACTURA ELECTRONICI", "FACTURA AFECTA ELECTRONICA", "FACTURA NO AFECTA O EXENTA ELECTRONICA"]
+_TITULOS_GUIA = ["GUIA DE DESPACHO ELECTRONICA", "GUIA DE DESPACHO", "GUÍA DE DESPACHO ELECTRÓNICA",
+                 "GUA DE DESPACHO ELECTRONICA", "GUIA DE DESPACHO ELECTRONICA SOLO TRASLADO"]
+_PIE_SII = ["S.I.I. - SANTIAGO CENTRO", "S.I.I. - SANTIAGO ORIENTE", "SII - TEMUCO", "S.I.I. - RANCAGUA", ""]
+
+
+def _ruido_ocr(rnd, texto: str, prob: float) -> str:
+    """Confusiones típicas del OCR en dígitos (las que los extractores deben tolerar)."""
+    cambios = {"0": "O", "1": "I", "8": "B", "5": "S"}
+    return "".join(cambios[c] if c in cambios and rnd.random() < prob else c for c in texto)
+
+
+def generar_corpus(n=CORPUS_TAMANO, semilla=CORPUS_SEMILLA):
+    rnd = random.Random(semilla)
+    corpus = []
+    for i in range(n):
+        tipo = rnd.choices(["factura", "guia", "nota", "chep"], weights=[70, 15, 8, 7])[0]
+        cuerpo = str(rnd.randint(1_000_000, 99_999_999))
+        dv = _dv(cuerpo)
+        folio = str(rnd.randint(100, 9_999_999))
+        rut_txt = _rut_con_puntos(cuerpo) if rnd.random() < 0.85 else cuerpo
+        dv_txt = dv if rnd.random() < 0.85 else rnd.choice("0123456789K")   # DV mal leído a veces
+        rotulo_rut = rnd.choice(_ROTULOS_RUT)
+        rotulo_num = rnd.choice(_ROTULOS_NUMERO)
+        pie = rnd.choice(_PIE_SII)
+
+        if tipo == "chep":
+            codigo = "B" + "".join(rnd.choice("0123456789") for _ in range(rnd.randint(10, 12)))
+            fecha = rnd.choice(["FECHA DE CARGA", "Fecha de envío", "FECHA DE ENVIO"])
+            texto = f"CHEP CHILE\n{codigo}\n{fecha}: {rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/2025"
+            esperado = {"guia": False, "chep": True}
+        else:
+            titulo = {
+                "factura": rnd.choice(_TITULOS_FACTURA),
+                "guia": rnd.choice(_TITULOS_GUIA),
+                "nota": "NOTA DE CREDITO ELECTRONICA",
+            }[tipo]
+            lineas = [
+                f"{rotulo_rut} {rut_txt}-{dv_txt}",
+                titulo,
+                f"{rotulo_num} {_ruido_ocr(rnd, folio, 0.08)}",
+                pie,
+            ]
+            texto = "\n".join(l for l in lineas if l)
+            esperado = {"rut": f"{cuerpo}-{dv}", "numero": folio, "guia": tipo == "guia", "chep": False}
+
+        corpus.append({"id": f"s{i:04d}", "tipo": tipo, "texto": texto, "esperado": esperado})
+    return corpus
+
+
+def guardar_corpus(corpus, ruta=RUTA_CORPUS):
+    with open(ruta, "w", encoding="utf-8", newline="\n") as f:
+        meta = {"version": CORPUS_VERSION, "semilla": CORPUS_SEMILLA, "textos": len(corpus)}
+        f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        for item in corpus:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def cargar_corpus(ruta=RUTA_CORPUS):
+    """Devuelve (version, items). Si el archivo no existe se genera el sintético."""
+    if not os.path.exists(ruta):
+        corpus = generar_corpus()
+        guardar_corpus(corpus, ruta)
+        return CORPUS_VERSION, corpus
+    with open(ruta, encoding="utf-8") as f:
+        meta = json.loads(f.readline())
+        items = [json.loads(l) for l in f if l.strip()]
+    return meta.get("version"), items
+
+
+# ===================== Equivalencia contra referencia =====================
+_CONFUSIONES = {"0": "O", "O": "0", "1": "I", "I": "1", "8": "B", "B": "8", "5": "S", "S": "5",
+                "2": "Z", "6": "G", "L": "1", "T": "7", ".": ",", "-": " "}
+_DISTRACTORES = ["FONO 22 345 6789", "CASILLA 1234", "N° DE VENTA 556677", "ORDEN DE COMPRA 4500012345",
+                 "GUIA N° 12345", "DOC INTERNO 998877", "Nro. 44556", "R.U.T. RECEPTOR 11.111.111-1",
+                 "FECHA EMISION 12/03/2025", "KP/G.D 7788", "CODIGO 0012345", "SUCURSAL 12"]
+
+
+def _claves_tablas():
+    """Claves de las tablas de normalización, para sembrarlas en las variantes."""
+    from ocr import ocr_utils
+    claves = []
+    for nombre in ("_REEMPLAZOS_RUT", "_REEMPLAZOS_NUMERO", "_REEMPLAZOS_FACTURA_ELECTRONICA"):
+        tabla = getattr(ocr_utils, nombre)
+        claves += [k for k, _ in (tabla.items() if isinstance(tabla, dict) else tabla)]
+    return claves
+
+
+def variantes(item, claves, n=VARIANTES_POR_TEXTO):
+    """El texto del corpus y n-1 deformaciones deterministas (semilla = id del texto)."""
+    rnd = random.Random(f"{CORPUS_SEMILLA}:{item['id']}")
+    texto = item["texto"]
+    lineas = texto.splitlines()
+    salida = [texto, " ".join(lineas), texto.lower()]
+    while len(salida) < n:
+        prob = rnd.choice([0.03, 0.08, 0.15])
+        v = ["".join(_CONFUSIONES[c] if c in _CONFUSIONES and rnd.random() < prob else c for c in l)
+             for l in lineas]
+        if rnd.random() < 0.3:
+            rnd.shuffle(v)
+        if rnd.random() < 0.5:
+            v.insert(rnd.randrange(len(v) + 1), rnd.choice(_DISTRACTORES))
+        for _ in range(rnd.randint(0, 3)):
+            i = rnd.randrange(len(v))
+            corte = rnd.randint(0, len(v[i]))
+            v[i] = v[i][:corte] + rnd.choice(claves) + v[i][corte:]
+        if rnd.random() < 0.2:
+            v = [l.lower() if rnd.random() < 0.5 else l for l in v]
+        salida.append((" " if rnd.random() < 0.3 else "\n").join(v))
+    return salida
+
+
+def fijar_referencia(items, ruta=RUTA_REFERENCIA, extraer_rut=None, extraer_numero_factura=None, origen=""):
+    """Escribe las salidas de los extractores (por defecto los actuales) sobre el corpus y sus variantes."""
+    if extraer_rut is None or extraer_numero_factura is None:
+        from ocr.ocr_utils import extraer_rut, extraer_numero_factura
+    claves = _claves_tablas()
+    filas = []
+    with _sin_logs():
+        for item in items:
+            for j, texto in enumerate(variantes(item, claves)):
+                filas.append({"id": f"{item['id']}/{j}", "texto": texto,
+                              "rut": extraer_rut(texto), "numero": extraer_numero_factura(texto)})
+    with open(ruta, "w", encoding="utf-8", newline="\n") as f:
+        meta = {"corpus_version": CORPUS_VERSION, "variantes": VARIANTES_POR_TEXTO,
+                "textos": len(filas), "origen": origen or "extractores actuales"}
+        f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        for fila in filas:
+            f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+    return len(filas)
+
+
+def equivalencia(ruta=RUTA_REFERENCIA):
+    """(meta, textos, diferencias) de los extractores actuales contra las salidas guardadas."""
+    from ocr.ocr_utils import extraer_rut, extraer_numero_factura
+    with open(ruta, encoding="utf-8") as f:
+        meta = json.loads(f.readline())
+        filas = [json.loads(l) for l in f if l.strip()]
+    difs = []
+    with _sin_logs():
+        for fila in filas:
+            rut, numero = extraer_rut(fila["texto"]), extraer_numero_factura(fila["texto"])
+            if rut != fila["rut"]:
+                difs.append((fila, "extraer_rut", fila["rut"], rut))
+            if numero != fila["numero"]:
+                difs.append((fila, "extraer_numero_factura", fila["numero"], numero))
+    return meta, len(filas), difs
+
+
+# ===================== Medición =====================
+def _funciones():
+    """(nombre, función, clave en "esperado", comparación)."""
+    from ocr.ocr_utils import extraer_rut, extraer_numero_factura, looks_like_chep
+    from core.monitor_core import _es_guia_despacho
+    return [
+        ("extraer_rut", extraer_rut, "rut", lambda r, e: r == e),
+        ("extraer_numero_factura", extraer_numero_factura, "numero", lambda r, e: r == e),
+        ("_es_guia_despacho", _es_guia_despacho, "guia", lambda r, e: bool(r) == e),
+        ("looks_like_chep", looks_like_chep, "chep", lambda r, e: bool(r) == e),
+    ]
+
+
+@contextlib.contextmanager
+def _sin_logs():
+    """Los extractores escriben al log en cada acierto: se mide la extracción, no el disco."""
+    import ocr.ocr_utils as ocr_utils
+    originales = (ocr_utils.registrar_log, ocr_utils.registrar_log_proceso)
+    nada = lambda *a, **k: None
+    ocr_utils.registrar_log = ocr_utils.registrar_log_proceso = nada
+    try:
+        yield
+    finally:
+        ocr_utils.registrar_log, ocr_utils.registrar_log_proceso = originales
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    i = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[i]
+
+
+def medir(items, repeticiones=5):
+    resultados = {}
+    with _sin_logs():
+        for nombre, fn, clave, ok in _funciones():
+            textos = [it["texto"] for it in items]
+            for t in textos[:20]:          # calentamiento (caches de re, imports perezosos)
+                fn(t)
+
+            latencias = []
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                for t in textos:
+                    t0 = time.perf_counter_ns()
+                    fn(t)
+                    latencias.append(time.perf_counter_ns() - t0)
+            total = time.perf_counter() - inicio
+            latencias.sort()
+
+            evaluados = [it for it in items if clave in it.get("esperado", {})]
+            fallos = [it["id"] for it in evaluados if not ok(fn(it["texto"]), it["esperado"][clave])]
+
+            resultados[nombre] = {
+                "textos_s": round(len(latencias) / total, 1) if total else 0.0,
+                "p50_us": round(_percentil(latencias, 50) / 1000, 2),
+                "p99_us": round(_percentil(latencias, 99) / 1000, 2),
+                "evaluados": len(evaluados),
+                "aciertos": len(evaluados) - len(fallos),
+                "precision": round((len(evaluados) - len(fallos)) / len(evaluados), 4) if evaluados else None,
+                "fallos": fallos,
+            }
+    return resultados
+
+
+def informe(version, items, resultados, repeticiones):
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "corpus_version": version,
+        "textos": len(items),
+        "repeticiones": repeticiones,
+        "funciones": resultados,
+    }
+
+
+# ===================== Salida =====================
+def imprimir(inf):
+    print(f"Corpus v{inf['corpus_version']}: {inf['textos']} textos x {inf['repeticiones']} repeticiones")
+    print(f"{'función':<24}{'textos/s':>12}{'p50 µs':>10}{'p99 µs':>10}{'precisión':>12}")
+    for nombre, r in inf["funciones"].items():
+        prec = f"{r['precision'] * 100:.1f}%" if r["precision"] is not None else "-"
+        print(f"{nombre:<24}{r['textos_s']:>12,.0f}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}{prec:>12}")
+
+
+def comparar(inf, base) -> bool:
+    """Imprime deltas contra `base`. Devuelve False si alguna precisión bajó."""
+    if base.get("corpus_version") != inf["corpus_version"]:
+        print(f"⚠️ Línea base con corpus v{base.get('corpus_version')}; actual v{inf['corpus_version']}: "
+              "los aciertos no son comparables.")
+    print(f"\nContra línea base del {base.get('fecha', '?')}:")
+    print(f"{'función':<24}{'Δ textos/s':>12}{'Δ p50':>10}{'Δ p99':>10}{'Δ precisión':>14}")
+    sin_regresion = True
+    for nombre, r in inf["funciones"].items():
+        b = base.get("funciones", {}).get(nombre)
+        if not b:
+            print(f"{nombre:<24}{'(nuevo)':>12}")
+            continue
+        d_tps = (r["textos_s"] / b["textos_s"] - 1) * 100 if b["textos_s"] else 0.0
+        d_p50 = (r["p50_us"] / b["p50_us"] - 1) * 100 if b["p50_us"] else 0.0
+        d_p99 = (r["p99_us"] / b["p99_us"] - 1) * 100 if b["p99_us"] else 0.0
+        d_prec = ((r["precision"] or 0) - (b["precision"] or 0)) * 100
+        marca = ""
+        if d_prec < 0:
+            sin_regresion = False
+            marca = "  ❌"
+        print(f"{nombre:<24}{d_tps:>+11.1f}%{d_p50:>+9.1f}%{d_p99:>+9.1f}%{d_prec:>+12.2f}pp{marca}")
+        nuevos = sorted(set(r["fallos"]) - set(b.get("fallos", [])))
+        arreglados = sorted(set(b.get("fallos", [])) - set(r["fallos"]))
+        if nuevos:
+            print(f"    nuevos fallos: {', '.join(nuevos[:15])}{' ...' if len(nuevos) > 15 else ''}")
+        if arreglados:
+            print(f"    arreglados:    {', '.join(arreglados[:15])}{' ...' if len(arreglados) > 15 else ''}")
+    return sin_regresion
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de extractores de cabecera (RUT, folio, guía, CHEP)")
+    ap.add_argument("--corpus", default=RUTA_CORPUS)
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--guardar", metavar="JSON", help="guardar el resultado como línea base")
+    ap.add_argument("--comparar", metavar="JSON", help="comparar contra una línea base guardada")
+    ap.add_argument("--regenerar", action="store_true", help="reescribir el corpus sintético y salir")
+    ap.add_argument("--equivalencia", action="store_true",
+                    help="comparar extraer_rut / extraer_numero_factura contra las salidas de referencia")
+    ap.add_argument("--fijar-referencia", action="store_true",
+                    help="reescribir las salidas de referencia con los extractores actuales")
+    ap.add_argument("--referencia", default=RUTA_REFERENCIA)
+    args = ap.parse_args(argv)
+
+    if args.regenerar:
+        guardar_corpus(generar_corpus(), args.corpus)
+        print(f"Corpus v{CORPUS_VERSION} escrito en {args.corpus}")
+        return 0
+
+    if args.fijar_referencia:
+        _, items = cargar_corpus(args.corpus)
+        n = fijar_referencia(items, args.referencia)
+        print(f"Referencia escrita en {args.referencia}: {n} textos")
+        return 0
+
+    if args.equivalencia:
+        meta, textos, difs = equivalencia(args.referencia)
+        print(f"Referencia ({meta.get('origen', '?')}): {textos} textos, {len(difs)} diferencias")
+        for fila, nombre, esperado, obtenido in difs[:20]:
+            print(f"   {fila['id']} {nombre}: {fila['texto']!r}\n"
+                  f"     referencia: {esperado!r}\n     actual:     {obtenido!r}")
+        return 1 if difs else 0
+
+    version, items = cargar_corpus(args.corpus)
+    inf = informe(version, items, medir(items, args.repeticiones), args.repeticiones)
+    imprimir(inf)
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(inf, f, ensure_ascii=False, indent=2)
+        print(f"\nLínea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        return 0 if comparar(inf, base) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
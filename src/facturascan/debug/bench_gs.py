@@ -0,0 +1,140 @@
+# Benchmark de compresión Ghostscript por documento: ejecutable vs API C (gsapi).
+#
+#  - Comprime copias de los PDFs indicados con cada motor de comprimir_pdf
+#    ("proceso" = gswin64c/gs por documento, "gsapi" = pdf/gs_api.py) y reporta
+#    latencia por documento (p50/p95/media) y la del primer documento aparte
+#    (arranque de los procesos Ghostscript y carga de la DLL).
+#  - Los originales no se tocan: cada medición trabaja sobre una copia temporal.
+#
+# Uso (desde src/facturascan):
+#   python -m debug.bench_gs C:\muestras\*.pdf
+#   python -m debug.bench_gs C:\muestras --repeticiones 5 --motores proceso,gsapi
+#   python -m debug.bench_gs C:\muestras --guardar bench_gs.json
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+
+def _pdfs(entradas):
+    rutas = []
+    for e in entradas:
+        if os.path.isdir(e):
+            rutas += sorted(glob.glob(os.path.join(e, "*.pdf")))
+        else:
+            rutas += sorted(glob.glob(e))
+    return [r for r in rutas if r.lower().endswith(".pdf")]
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    i = min(len(ordenados) - 1, max(0, int(round(p / 100 * (len(ordenados) - 1)))))
+    return ordenados[i]
+
+
+def medir(gs_path, pdfs, motor, repeticiones=3, calidad="default", dpi=200):
+    from pdf.pdf_tools import comprimir_pdf
+
+    tiempos, primero = [], None
+    bytes_antes = bytes_despues = 0
+    with tempfile.TemporaryDirectory(prefix="bench_gs_") as tmp:
+        for rep in range(repeticiones):
+            for i, pdf in enumerate(pdfs):
+                copia = os.path.join(tmp, f"{rep}_{i}.pdf")
+                shutil.copyfile(pdf, copia)
+                t0 = time.perf_counter()
+                comprimir_pdf(gs_path, copia, calidad=calidad, dpi=dpi, tamano_pagina="a4", motor=motor)
+                dt = time.perf_counter() - t0
+                if primero is None:
+                    primero = dt
+                else:
+                    tiempos.append(dt)
+                if rep == 0:
+                    bytes_antes += os.path.getsize(pdf)
+                    bytes_despues += os.path.getsize(copia)
+                os.remove(copia)
+    tiempos.sort()
+    return {
+        "motor": motor,
+        "documentos": len(tiempos) + 1,
+        "primero_ms": round((primero or 0) * 1000, 1),
+        "p50_ms": round(_percentil(tiempos, 50) * 1000, 1),
+        "p95_ms": round(_percentil(tiempos, 95) * 1000, 1),
+        "media_ms": round(sum(tiempos) / len(tiempos) * 1000, 1) if tiempos else 0.0,
+        "kb_antes": round(bytes_antes / 1024, 1),
+        "kb_despues": round(bytes_despues / 1024, 1),
+    }
+
+
+def imprimir(resultados):
+    print(f"{'motor':<10}{'docs':>6}{'1º ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'media ms':>10}{'KB antes':>10}{'KB desp.':>10}")
+    for r in resultados:
+        print(f"{r['motor']:<10}{r['documentos']:>6}{r['primero_ms']:>9}{r['p50_ms']:>9}"
+              f"{r['p95_ms']:>9}{r['media_ms']:>10}{r['kb_antes']:>10}{r['kb_despues']:>10}")
+    por_motor = {r["motor"]: r for r in resultados}
+    if "proceso" in por_motor and "gsapi" in por_motor and por_motor["gsapi"]["p50_ms"]:
+        print(f"\ngsapi vs proceso (p50): x{por_motor['proceso']['p50_ms'] / por_motor['gsapi']['p50_ms']:.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de compresión Ghostscript (ejecutable vs gsapi)")
+    ap.add_argument("pdfs", nargs="+", help="PDFs, comodines o carpetas")
+    ap.add_argument("--gs", help="ruta del ejecutable de Ghostscript (por defecto la que detecta la app)")
+    ap.add_argument("--motores", default="proceso,gsapi")
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--calidad", default="default")
+    ap.add_argument("--dpi", type=int, default=200)
+    ap.add_argument("--guardar", metavar="JSON", help="guardar el resultado")
+    args = ap.parse_args(argv)
+
+    from core import monitor_core
+    from pdf import gs_api
+    from utils.log_utils import set_debug
+    set_debug(True)              # para ver en log_procesos si algún motor cayó al ejecutable
+
+    gs_path = args.gs or monitor_core.GS_PATH or shutil.which("gs")
+    if not gs_path:
+        print("No se encontró Ghostscript (use --gs).")
+        return 2
+    pdfs = _pdfs(args.pdfs)
+    if not pdfs:
+        print("No hay PDFs para medir.")
+        return 2
+    motores = [m.strip() for m in args.motores.split(",") if m.strip()]
+    if "gsapi" in motores and not gs_api.disponible(gs_path):
+        print(f"⚠️ DLL de Ghostscript no encontrada junto a {gs_path}: se omite gsapi.")
+        motores.remove("gsapi")
+
+    print(f"{len(pdfs)} PDFs × {args.repeticiones} repeticiones | GS: {gs_path}\n")
+    resultados = []
+    try:
+        for motor in motores:
+            resultados.append(medir(gs_path, pdfs, motor, args.repeticiones, args.calidad, args.dpi))
+    finally:
+        gs_api.cerrar()
+    imprimir(resultados)
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "equipo": platform.node(),
+                "python": platform.python_version(),
+                "gs": gs_path,
+                "pdfs": len(pdfs),
+                "repeticiones": args.repeticiones,
+                "resultados": resultados,
+            }, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
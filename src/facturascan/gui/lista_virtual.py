@@ -0,0 +1,221 @@
+# gui/lista_virtual.py
+# Lista "virtualizada" para CustomTkinter: solo existen los widgets de las filas
+# visibles (un pool fijo que se recicla al hacer scroll). Mostrar 10 o 10.000
+# filas cuesta lo mismo en widgets; lo único proporcional al total es la lista
+# de Python con los datos.
+#
+# Filas:
+#  - registro: dict con las claves de las columnas (ej. fecha, rut, numero, archivo).
+#  - grupo:    dict con "_grupo" (texto) y "_nivel" (0 = año, 1 = mes); se pinta
+#              como encabezado a lo ancho de la fila.
+# Un click en cualquier fila llama a `al_activar(fila)`.
+# Un click en un encabezado de columna ordena: si se pasa `al_ordenar(clave, desc)`
+# lo resuelve el llamador (ej. ordenar dentro de cada mes); si no, se ordena aquí.
+# Los valores numéricos (ej. folio) se ordenan como números: clave_orden(valor).
+import customtkinter as ctk
+
+
+_ESTILO_REGISTRO = {"fg_color": "#f3f4f6", "hover_color": "#e5e7eb", "text_color": "#111827"}
+_ESTILO_GRUPO = {
+    0: {"fg_color": "#e5e7eb", "hover_color": "#d1d5db", "text_color": "#111827"},
+    1: {"fg_color": "#eef2ff", "hover_color": "#e0e7ff", "text_color": "#111827"},
+}
+
+
+def clave_orden(valor):
+    """Clave de orden de una celda: números ("99" < "100") antes que texto; vacío al final."""
+    if valor is None or valor == "":
+        return (2, 0, "")
+    texto = str(valor)
+    if texto.isdigit():
+        return (0, int(texto), "")
+    return (1, 0, texto)
+
+
+class ListaVirtual(ctk.CTkFrame):
+    """
+    columnas: lista de dicts {"clave", "titulo", "ancho" (caracteres),
+              "formato" (opcional, valor -> str), "alinear" ("<" o ">")}.
+    """
+
+    def __init__(self, master, columnas, al_activar=None, al_ordenar=None,
+                 alto_fila=30, font=None, orden=(None, False), **kwargs):
+        kwargs.setdefault("fg_color", "#f9fafb")
+        super().__init__(master, **kwargs)
+
+        self.columnas = list(columnas)
+        self.al_activar = al_activar
+        self.al_ordenar = al_ordenar
+        self.alto_fila = alto_fila
+        self.font = font or ctk.CTkFont(family="Consolas", size=12)
+        self.font_grupo = {
+            0: ctk.CTkFont(size=14, weight="bold"),
+            1: ctk.CTkFont(size=13, weight="bold"),
+        }
+
+        self.filas = []
+        self.primera = 0              # índice de la primera fila visible
+        self.orden = orden            # (clave, descendente) que indica la cabecera
+        self._pool = []
+        self._pintado_pendiente = False
+
+        # ---- Encabezados de columna (click = ordenar) ----
+        self.cabecera = ctk.CTkFrame(self, fg_color="transparent")
+        self.cabecera.pack(fill="x", padx=8, pady=(6, 2))
+        self._botones_col = {}
+        ancho_car = self.font.measure("0")
+        for col in self.columnas:
+            b = ctk.CTkButton(
+                self.cabecera,
+                text=col["titulo"],
+                anchor="w",
+                width=ancho_car * col["ancho"] + 24,
+                height=26,
+                fg_color="transparent",
+                hover_color="#e5e7eb",
+                text_color="#374151",
+                font=ctk.CTkFont(size=12, weight="bold"),
+                command=lambda c=col["clave"]: self._click_columna(c),
+            )
+            b.pack(side="left", padx=(0, 2))
+            self._botones_col[col["clave"]] = b
+        self._marcar_orden()
+
+        # ---- Cuerpo: pool de filas posicionadas con place() + scrollbar ----
+        cuerpo = ctk.CTkFrame(self, fg_color="transparent")
+        cuerpo.pack(fill="both", expand=True, padx=(8, 0), pady=(0, 6))
+
+        self.scrollbar = ctk.CTkScrollbar(cuerpo, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.area = ctk.CTkFrame(cuerpo, fg_color="transparent")
+        self.area.pack(side="left", fill="both", expand=True)
+        self.area.bind("<Configure>", lambda e: self._ajustar_pool())
+
+        self.lbl_mensaje = ctk.CTkLabel(self.area, text="", text_color="#6b7280")
+
+        for w in (self.area, self.lbl_mensaje):
+            self._bind_rueda(w)
+
+    # ---------------- API ----------------
+    def mostrar(self, filas, conservar_posicion=False):
+        """Reemplaza las filas. Con conservar_posicion=True no vuelve al inicio (ej. al expandir un grupo)."""
+        self.filas = list(filas)
+        if not conservar_posicion:
+            self.primera = 0
+        self.lbl_mensaje.place_forget()
+        self._programar_pintado()
+
+    def mostrar_mensaje(self, texto, color="#6b7280"):
+        """Vacía la lista y muestra un aviso centrado (placeholder, 'sin resultados', ...)."""
+        self.filas = []
+        self.primera = 0
+        self._pintar()
+        self.lbl_mensaje.configure(text=texto, text_color=color)
+        self.lbl_mensaje.place(relx=0.5, y=24, anchor="n")
+
+    def ordenar(self, clave, descendente=False):
+        """Ordena los registros por `clave` (solo listas planas, sin filas de grupo)."""
+        self.orden = (clave, descendente)
+        self._marcar_orden()
+        self.filas.sort(key=lambda f: clave_orden(f.get(clave)), reverse=descendente)
+        self.primera = 0
+        self._programar_pintado()
+
+    # ---------------- columnas / orden ----------------
+    def _click_columna(self, clave):
+        actual, desc = self.orden
+        desc = (not desc) if actual == clave else False
+        if self.al_ordenar:
+            self.orden = (clave, desc)
+            self._marcar_orden()
+            self.al_ordenar(clave, desc)
+        else:
+            self.ordenar(clave, desc)
+
+    def _marcar_orden(self):
+        clave, desc = self.orden
+        for col in self.columnas:
+            flecha = (" ▼" if desc else " ▲") if col["clave"] == clave else ""
+            self._botones_col[col["clave"]].configure(text=col["titulo"] + flecha)
+
+    # ---------------- pool de filas ----------------
+    def _visibles(self):
+        return max(1, self.area.winfo_height() // self.alto_fila)
+
+    def _ajustar_pool(self):
+        necesarias = self._visibles() + 1
+        while len(self._pool) < necesarias:
+            idx = len(self._pool)
+            b = ctk.CTkButton(
+                self.area, text="", anchor="w", height=self.alto_fila - 4,
+                font=self.font, command=lambda i=idx: self._click_fila(i),
+            )
+            self._bind_rueda(b)
+            self._pool.append(b)
+        while len(self._pool) > necesarias:
+            self._pool.pop().destroy()
+        self._programar_pintado()
+
+    def _programar_pintado(self):
+        # Varios eventos de scroll seguidos = un solo repintado
+        if not self._pintado_pendiente:
+            self._pintado_pendiente = True
+            self.after_idle(self._pintar)
+
+    def _pintar(self):
+        self._pintado_pendiente = False
+        total = len(self.filas)
+        visibles = self._visibles()
+        self.primera = max(0, min(self.primera, total - visibles))
+
+        for i, b in enumerate(self._pool):
+            idx = self.primera + i
+            if idx >= total:
+                b.place_forget()
+                continue
+            fila = self.filas[idx]
+            if "_grupo" in fila:
+                nivel = fila.get("_nivel", 0)
+                texto = ("    " * nivel) + fila["_grupo"]
+                b.configure(text=texto, font=self.font_grupo.get(nivel, self.font), **_ESTILO_GRUPO.get(nivel, _ESTILO_GRUPO[1]))
+            else:
+                b.configure(text=self._texto_registro(fila), font=self.font, **_ESTILO_REGISTRO)
+            b.place(x=0, y=i * self.alto_fila, relwidth=1.0)   # alto fijado en el constructor (CTk no acepta height en place)
+
+        if total:
+            self.scrollbar.set(self.primera / total, min(1.0, (self.primera + visibles) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _texto_registro(self, fila):
+        partes = []
+        for col in self.columnas:
+            valor = fila.get(col["clave"])
+            fmt = col.get("formato")
+            txt = fmt(valor) if fmt else (str(valor) if valor not in (None, "") else "-")
+            partes.append(f"{txt:{col.get('alinear', '<')}{col['ancho']}}")
+        return "   ".join(partes)
+
+    def _click_fila(self, i):
+        idx = self.primera + i
+        if self.al_activar and 0 <= idx < len(self.filas):
+            self.al_activar(self.filas[idx])
+
+    # ---------------- scroll ----------------
+    def _desplazar(self, filas):
+        self.primera += filas
+        self._programar_pintado()
+
+    def _on_scrollbar(self, accion, valor, unidad=None):
+        if accion == "moveto":
+            self.primera = int(float(valor) * len(self.filas))
+            self._programar_pintado()
+        elif accion == "scroll":
+            paso = self._visibles() if unidad == "pages" else 1
+            self._desplazar(int(float(valor)) * paso)
+
+    def _bind_rueda(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self._desplazar(-3 if e.delta > 0 else 3), add="+")
+        widget.bind("<Button-4>", lambda e: self._desplazar(-3), add="+")   # X11
+        widget.bind("<Button-5>", lambda e: self._desplazar(3), add="+")
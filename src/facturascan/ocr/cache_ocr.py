@@ -0,0 +1,98 @@
+# Caché persistente de resultados de OCR de cabecera.
+#
+#  - Clave: SHA-256 de los bytes del PDF + parámetros de OCR (DPI, caja, allowlist,
+#    política de ángulos...). Si cambia cualquiera, la clave cambia sola.
+#  - Valor: texto de cabecera y ángulo elegido por ocr_zona_factura_desde_png, y los
+#    datos del timbre SII si se leyó (así un acierto de caché no pierde RUT/folio/TD
+#    exactos; un documento solo con timbre se guarda con texto vacío) y el RUT que
+#    fijó la escalada cuando el texto viene de la región amplia (ver _escalar).
+#  - ocr_cache.sqlite (utils/sqlite_utils), compartida entre hilos y procesos.
+#  - Tamaño acotado: al superar CACHE_OCR_MAX_MB se descartan las entradas usadas
+#    hace más tiempo (LRU) hasta bajar al 90%.
+#
+# Sirve para re-ejecuciones tras un corte, PDFs que el escáner deja duplicados y
+# archivos devueltos desde No_Reconocidos para reprocesar.
+# Cualquier error de la caché se registra y se ignora: nunca frena el procesamiento.
+
+import json
+import time
+import hashlib
+
+from utils.log_utils import registrar_log_proceso
+from utils.sqlite_utils import abrir_sqlite
+
+CACHE_OCR_VERSION = 3            # súbelo si cambia el formato o la semántica del texto
+CACHE_OCR_MAX_MB  = 32           # tope del texto almacenado
+
+_conexion = abrir_sqlite(
+    "ocr_cache.sqlite",
+    "CREATE TABLE IF NOT EXISTS ocr ("
+    " clave TEXT PRIMARY KEY, texto TEXT NOT NULL, angulo INTEGER NOT NULL,"
+    " tamano INTEGER NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL);"
+    "CREATE INDEX IF NOT EXISTS idx_ocr_usado ON ocr(usado);",
+    migraciones=("ALTER TABLE ocr ADD COLUMN timbre TEXT",       # cachés de la versión 1
+                 "ALTER TABLE ocr ADD COLUMN rut TEXT"),         # cachés de la versión 2
+)
+
+
+def hash_archivo(ruta, bloque=1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for trozo in iter(lambda: f.read(bloque), b""):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+def clave_ocr(pdf_path, parametros: dict) -> str:
+    """SHA-256 del PDF combinado con los parámetros de OCR (serializados de forma estable)."""
+    params = json.dumps(parametros, sort_keys=True, default=str)
+    base = f"v{CACHE_OCR_VERSION}|{hash_archivo(pdf_path)}|{params}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def obtener(clave):
+    """(texto, angulo, timbre, rut) si la clave está en caché; None si no (o si la caché falla)."""
+    try:
+        con = _conexion()
+        fila = con.execute("SELECT texto, angulo, timbre, rut FROM ocr WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            return None
+        con.execute("UPDATE ocr SET usado = ? WHERE clave = ?", (time.time(), clave))
+        con.commit()
+        return fila[0], int(fila[1]), (json.loads(fila[2]) if fila[2] else None), fila[3] or ""
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Caché OCR no disponible (lectura): {e}")
+        return None
+
+
+def guardar(clave, texto, angulo, timbre=None, rut=""):
+    try:
+        con = _conexion()
+        ahora = time.time()
+        datos_timbre = json.dumps(timbre, ensure_ascii=False) if timbre else None
+        con.execute(
+            "INSERT OR REPLACE INTO ocr (clave, texto, angulo, timbre, rut, tamano, creado, usado)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (clave, texto, int(angulo), datos_timbre, rut or None, len(texto.encode("utf-8")), ahora, ahora),
+        )
+        _recortar(con)
+        con.commit()
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Caché OCR no disponible (escritura): {e}")
+
+
+def _recortar(con):
+    """LRU: si el total supera el tope, borra las menos usadas hasta quedar en el 90%."""
+    tope = CACHE_OCR_MAX_MB * 1024 * 1024
+    total = con.execute("SELECT COALESCE(SUM(tamano), 0) FROM ocr").fetchone()[0]
+    if total <= tope:
+        return
+    objetivo = int(tope * 0.9)
+    borrar = []
+    for clave, tamano in con.execute("SELECT clave, tamano FROM ocr ORDER BY usado ASC"):
+        if total <= objetivo:
+            break
+        borrar.append((clave,))
+        total -= tamano
+    con.executemany("DELETE FROM ocr WHERE clave = ?", borrar)
+    registrar_log_proceso(f"🧹 Caché OCR: {len(borrar)} entrada(s) descartadas (LRU)")
@@ -0,0 +1,157 @@
+# Motor de normalización de texto OCR (tablas de reemplazos de extraer_rut /
+# extraer_numero_factura).
+#
+#  - Las tablas se escriben igual que siempre: pares (buscar, reemplazo) en orden,
+#    aplicados uno tras otro con str.replace. Ese es el comportamiento de referencia
+#    (aplicar_secuencial) y el compilado debe dar EXACTAMENTE el mismo texto.
+#  - compilar_reemplazos() hace el trabajo una sola vez, al importar:
+#      1) descarta claves inalcanzables: si el texto llega en mayúsculas, una clave
+#         con minúsculas ("Nro.", "RuT;") nunca coincide;
+#      2) agrupa las claves en tramos consecutivos que no interactúan entre sí
+#         (ninguna clave se solapa con otra clave ni con un reemplazo previo del
+#         tramo) y cada tramo se aplica en UNA pasada con una alternancia regex.
+#    Dentro de un tramo el orden no importa (nunca compiten dos claves por las
+#    mismas letras ni una crea coincidencias de otra), así que la pasada única
+#    equivale a los str.replace en orden. Entre tramos se respeta el orden.
+#  - verificar_equivalencia() compara ambas rutas sobre un corpus; ejecutar este
+#    módulo la corre con un corpus sintético armado desde las propias tablas.
+#    Eso cubre solo las tablas: la equivalencia de extraer_rut / extraer_numero_factura
+#    completos (patrones precompilados incluidos) la revisa
+#    `python -m debug.bench_extractores --equivalencia` contra salidas guardadas.
+#    Ambas comprobaciones corren también en tests/test_normalizacion.py.
+
+import re
+import random
+
+
+def _pares(tabla):
+    """dict {buscar: reemplazo} o secuencia de pares → tupla de pares en orden."""
+    return tuple((str(k), str(v)) for k, v in (tabla.items() if isinstance(tabla, dict) else tabla))
+
+
+def aplicar_secuencial(pares, texto: str) -> str:
+    """Referencia: cada par con str.replace, en el orden de la tabla."""
+    for buscar, reemplazo in _pares(pares):
+        texto = texto.replace(buscar, reemplazo)
+    return texto
+
+
+def _solapan(a: str, b: str) -> bool:
+    """True si una coincidencia de `a` puede compartir letras con una de `b`."""
+    if a in b or b in a:
+        return True
+    for i in range(1, min(len(a), len(b))):
+        if a[-i:] == b[:i] or b[-i:] == a[:i]:
+            return True
+    return False
+
+
+class Reemplazador:
+    """
+    Tabla de reemplazos compilada. Se usa como función: `normalizar(texto)`.
+    `mayusculas=True` indica que el texto llega ya en mayúsculas (permite
+    descartar las claves con minúsculas).
+    """
+
+    def __init__(self, pares, mayusculas=True):
+        self.pares = _pares(pares)
+        self.descartadas = []
+        self.tramos = []      # [(regex o None, {clave: reemplazo})]
+
+        en_mayusculas = mayusculas
+        vivas = []
+        for k, v in self.pares:
+            if not k:
+                raise ValueError("clave vacía en tabla de reemplazos")
+            if en_mayusculas and k != k.upper():
+                self.descartadas.append(k)
+                continue
+            vivas.append((k, v))
+            # Un reemplazo con minúsculas vuelve alcanzables las claves siguientes
+            if v != v.upper():
+                en_mayusculas = False
+
+        tramo = []
+        for k, v in vivas:
+            if tramo and any(_solapan(k, kj) or (vj and _solapan(k, vj)) for kj, vj in tramo):
+                self._cerrar(tramo)
+                tramo = []
+            tramo.append((k, v))
+            # Un reemplazo vacío junta lo que tenía a los lados: puede crear
+            # coincidencias de cualquier clave posterior → cierra el tramo
+            if not v:
+                self._cerrar(tramo)
+                tramo = []
+        if tramo:
+            self._cerrar(tramo)
+
+    def _cerrar(self, tramo):
+        mapa = dict(tramo)
+        if len(tramo) == 1:
+            self.tramos.append((None, mapa))
+            return
+        claves = sorted(mapa, key=len, reverse=True)
+        self.tramos.append((re.compile("|".join(map(re.escape, claves))), mapa))
+
+    def __call__(self, texto: str) -> str:
+        for patron, mapa in self.tramos:
+            if patron is None:
+                (k, v), = mapa.items()
+                texto = texto.replace(k, v)
+            else:
+                texto = patron.sub(lambda m, mapa=mapa: mapa[m.group(0)], texto)
+        return texto
+
+    def secuencial(self, texto: str) -> str:
+        return aplicar_secuencial(self.pares, texto)
+
+
+def compilar_reemplazos(pares, mayusculas=True) -> Reemplazador:
+    return Reemplazador(pares, mayusculas=mayusculas)
+
+
+def verificar_equivalencia(reemplazador: Reemplazador, textos, preparar=str.upper):
+    """
+    Corre la tabla compilada y la secuencial sobre `textos` (preparados como los
+    prepara el extractor, por defecto .upper()). Devuelve la lista de diferencias
+    [(texto, esperado, obtenido)]; vacía = equivalentes.
+    """
+    diferencias = []
+    for t in textos:
+        t = preparar(t)
+        esperado, obtenido = reemplazador.secuencial(t), reemplazador(t)
+        if esperado != obtenido:
+            diferencias.append((t, esperado, obtenido))
+    return diferencias
+
+
+def corpus_sintetico(pares, n=5000, semilla=0):
+    """Textos armados con claves y reemplazos de la tabla pegados entre ruido OCR."""
+    pares = _pares(pares)
+    rnd = random.Random(semilla)
+    piezas = [k for k, _ in pares] + [v for _, v in pares if v]
+    ruido = list("0123456789 .:-/NROFUTI°º'\"\n") + ["FACTURA", "ELECTRONICA", "RUT", "FOLIO", " "]
+    corpus = []
+    for _ in range(n):
+        partes = []
+        for _ in range(rnd.randint(1, 12)):
+            partes.append(rnd.choice(piezas) if rnd.random() < 0.6 else rnd.choice(ruido))
+        corpus.append("".join(partes))
+    return corpus
+
+
+if __name__ == "__main__":
+    import sys, os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from ocr import ocr_utils
+
+    total = 0
+    for nombre in ("_NORMALIZAR_RUT", "_NORMALIZAR_NUMERO", "_NORMALIZAR_FACTURA_ELECTRONICA"):
+        r = getattr(ocr_utils, nombre)
+        difs = verificar_equivalencia(r, corpus_sintetico(r.pares))
+        total += len(difs)
+        print(f"{nombre}: {len(r.pares)} claves, {len(r.descartadas)} inalcanzables, "
+              f"{len(r.tramos)} tramos, {len(difs)} diferencias")
+        for t, esperado, obtenido in difs[:5]:
+            print(f"   {t!r}\n     secuencial: {esperado!r}\n     compilado:  {obtenido!r}")
+    sys.exit(1 if total else 0)
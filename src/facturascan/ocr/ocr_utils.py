@@ -1,7 +1,9 @@
-import os, sys, io, re, logging, contextlib, itertools
+import os, sys, io, re, time, logging, contextlib, itertools
 from datetime import datetime
 from utils.log_utils import registrar_log
 from debug.debugapp import DEBUG, debug_print_rut, debug_print_factura
+from ocr.normalizacion import compilar_reemplazos
+from utils import metricas
 # ---- Popup simple (sin txt) ----
 def _popup_error(msg: str, title="Error en OCR"):
     try:
@@ -26,7 +28,7 @@ _missing = []
 
 # Pillow (crítico)
 try:
-    from PIL import Image, ImageOps
+    from PIL import Image, ImageOps, ImageFilter
 except Exception as e:
     _missing.append(f"- Pillow (PIL): {e}")
 
@@ -150,23 +152,458 @@ def warmup_ocr():
     except Exception:
         pass
 
-def ocr_zona_factura_desde_png(imagen_entrada, ruta_debug=None, early_threshold=3, probar_todos_angulos=False):
+# ================== PRE-CLASIFICADOR DE ORIENTACIÓN (barato, sin OCR) ==================
+# Se analiza la página reducida con perfiles de proyección:
+#  - Eje: las líneas de texto horizontales producen un perfil por filas con transiciones
+#    bruscas (línea/espacio) y un perfil por columnas mucho más suave.
+#  - Sentido: en cada línea hay más tinta en la zona de ascendentes/mayúsculas que en la de
+#    descendentes, así que la asimetría arriba/abajo distingue 0° de 180° (y 90° de 270°).
+
+_ORIENTACION_LADO_MAX  = 1000   # px del lado mayor de la página reducida
+_ORIENTACION_CONFIANZA = 0.35   # bajo esto se usa el orden fijo de ángulos
+_ORDEN_PROBABLE_CONFIANZA = 0.8 # historia del origen (orden_probable) desde la que basta 1 palabra clave
+
+def _energia_transiciones(perfil) -> float:
+    """Energía de la derivada del perfil normalizada por su energía total."""
+    p = perfil.astype(np.float64)
+    total = float((p * p).sum())
+    if total <= 0:
+        return 0.0
+    d = np.diff(p)
+    return float((d * d).sum()) / total
+
+def _asimetria_ascendentes(tinta) -> float:
+    """
+    Fracción de tinta por encima del núcleo (altura-x) de cada línea respecto a la suma
+    de tinta fuera del núcleo. > 0.5 sugiere texto derecho.
+    """
+    perfil = tinta.sum(axis=1).astype(np.float64)
+    hay = perfil > max(1.0, 0.01 * tinta.shape[1])
+    bordes = np.flatnonzero(np.diff(np.concatenate(([0], hay.astype(np.int8), [0]))))
+    arriba = abajo = 0.0
+    for y0, y1 in zip(bordes[0::2], bordes[1::2]):
+        if y1 - y0 < 4:          # filetes de tabla / ruido
+            continue
+        banda = perfil[y0:y1]
+        nucleo = np.flatnonzero(banda >= 0.5 * banda.max())
+        arriba += float(banda[:nucleo[0]].sum())
+        abajo  += float(banda[nucleo[-1] + 1:].sum())
+    total = arriba + abajo
+    return 0.5 if total <= 0 else arriba / total
+
+def estimar_orientacion(imagen):
+    """
+    Estima la orientación de una página sin OCR.
+    Devuelve (angulos_ordenados, confianza 0..1); el primer ángulo es el más probable.
+    """
+    img = ImageOps.grayscale(imagen)
+    factor = max(1, max(img.size) // _ORIENTACION_LADO_MAX)
+    if factor > 1:
+        img = img.reduce(factor)
+    img = ImageOps.autocontrast(img, cutoff=1)
+    tinta = np.asarray(img, dtype=np.uint8) < 128
+    if not tinta.any():
+        return (0, 180, 90, 270), 0.0
+
+    # Eje de las líneas de texto
+    e_filas = _energia_transiciones(tinta.sum(axis=1))
+    e_cols  = _energia_transiciones(tinta.sum(axis=0))
+    if e_filas <= 0 or e_cols <= 0:
+        return (0, 180, 90, 270), 0.0
+    razon = e_filas / e_cols
+    horizontal = razon >= 1.0
+    conf_eje = min(1.0, abs(float(np.log(razon))) / float(np.log(4.0)))
+
+    # Sentido (sobre la página llevada al eje horizontal)
+    if horizontal:
+        par = (0, 180)
+        asim = _asimetria_ascendentes(tinta)
+    else:
+        par = (90, 270)
+        asim = _asimetria_ascendentes(np.rot90(tinta))   # rot90 = ROTATE_90 (antihorario)
+    conf_sentido = min(1.0, abs(asim - 0.5) / 0.15)
+
+    probable, opuesto = par if asim >= 0.5 else par[::-1]
+    resto = (90, 270) if horizontal else (0, 180)
+    return (probable, opuesto) + resto, min(conf_eje, conf_sentido)
+
+# Parámetros de readtext para la cabecera (compartidos por el modo secuencial y el modo en lote)
+_ALLOWLIST_CABECERA = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-./#:() "
+_READTEXT_CABECERA = dict(
+    detail=0,
+    allowlist=_ALLOWLIST_CABECERA,
+    mag_ratio=1.0,
+    width_ths=0.6,
+    slope_ths=0.999,
+)
+
+# ================== FUENTES DE LA PÁGINA ==================
+# El OCR de cabecera pide "la región R de la página vista con rotación A, a X DPI".
+# Una fuente sabe entregarla:
+#  - FuenteImagen: desde una página ya rasterizada (recorte + reescalado con PIL).
+#  - FuentePdf: directamente desde el PDF; Poppler rasteriza SOLO esa ventana
+#    (pdftoppm -x/-y/-W/-H), sin generar la página completa a 280 DPI.
+# `dpi` de la fuente es la resolución "nominal" de la página; la cabecera se
+# lee a la mitad (igual que antes: página a OCR_DPI y recorte reducido a 1/2).
+
+CAJA_CABECERA = (0.61, 0.01, 1.00, 0.30)   # x0, y0, x1, y1 (fracción de la página derecha)
+_DPI_ORIENTACION = 100                      # página completa en baja para estimar_orientacion
+
+def _caja_en_original(caja, angulo):
+    """Convierte una caja normalizada del marco ya rotado `angulo` al marco de la página original."""
+    x0, y0, x1, y1 = caja
+    if angulo == 90:
+        return (1 - y1, x0, 1 - y0, x1)
+    if angulo == 180:
+        return (1 - x1, 1 - y1, 1 - x0, 1 - y0)
+    if angulo == 270:
+        return (y0, 1 - x1, y1, 1 - x0)
+    return (x0, y0, x1, y1)
+
+def _rotar(img, angulo):
+    tr_op = _TRANSPOSE_POR_ANGULO[angulo]
+    return img if tr_op is None else img.transpose(tr_op)
+
+
+class FuenteImagen:
+    """Fuente sobre una página ya rasterizada (PIL.Image) a `dpi` nominal."""
+
+    def __init__(self, imagen, dpi=280):
+        self.imagen = imagen
+        self.dpi = dpi
+        self._orientacion = None
+
+    def region(self, angulo, caja, dpi):
+        ancho, alto = self.imagen.size
+        x0, y0, x1, y1 = _caja_en_original(caja, angulo)
+        recorte = self.imagen.crop((int(ancho * x0), int(alto * y0), int(ancho * x1), int(alto * y1)))
+        recorte = ImageOps.grayscale(recorte)
+        escala = dpi / float(self.dpi)
+        if escala != 1 and recorte.width > 2 and recorte.height > 2:
+            recorte = recorte.resize((max(1, int(recorte.width * escala)), max(1, int(recorte.height * escala))),
+                                     Image.LANCZOS)
+        return _rotar(recorte, angulo)
+
+    def orientacion(self):
+        if self._orientacion is None:
+            self._orientacion = estimar_orientacion(self.imagen)
+        return self._orientacion
+
+    def cerrar(self):
+        try:
+            self.imagen.close()
+        except Exception:
+            pass
+
+
+class FuentePdf:
+    """
+    Fuente perezosa sobre la página 1 de un PDF. Cada región se rasteriza aparte con
+    Poppler y queda en caché (un reintento del mismo ángulo no vuelve a llamar a pdftoppm).
+    """
+
+    def __init__(self, pdf_path, dpi=280):
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self._tamano = None
+        self._cache = {}
+        self._orientacion = None
+
+    def tamano_pts(self):
+        """(ancho, alto) en puntos de la página 1 (con /Rotate aplicado)."""
+        if self._tamano is None:
+            from pdf.pdf_tools import info_pdf, tamano_pagina_pts
+            self._tamano = tamano_pagina_pts(info_pdf(self.pdf_path))
+        return self._tamano
+
+    def region(self, angulo, caja, dpi):
+        clave = (angulo, tuple(caja), dpi)
+        if clave in self._cache:
+            return self._cache[clave]
+
+        from pdf.pdf_tools import rasterizar_region
+        ancho_pts, alto_pts = self.tamano_pts()
+        ancho, alto = ancho_pts * dpi / 72.0, alto_pts * dpi / 72.0
+        x0, y0, x1, y1 = _caja_en_original(caja, angulo)
+        x, y = int(ancho * x0), int(alto * y0)
+        w, h = max(1, int(ancho * x1) - x), max(1, int(alto * y1) - y)
+
+        recorte = _rotar(rasterizar_region(self.pdf_path, dpi, x, y, w, h), angulo)
+        self._cache[clave] = recorte
+        return recorte
+
+    def orientacion(self):
+        if self._orientacion is None:
+            from pdf.pdf_tools import rasterizar_region
+            pagina = rasterizar_region(self.pdf_path, _DPI_ORIENTACION)
+            try:
+                self._orientacion = estimar_orientacion(pagina)
+            finally:
+                pagina.close()
+        return self._orientacion
+
+    def precargar(self, preclasificar=True, orden_probable=None):
+        """Adelanta (p.ej. en la etapa de rasterizado) la orientación y la cabecera del ángulo más probable."""
+        angulo = orden_probable[0][0] if orden_probable else 0
+        if preclasificar:
+            orden, confianza = self.orientacion()
+            if confianza >= _ORIENTACION_CONFIANZA:
+                angulo = orden[0]
+        self.region(angulo, CAJA_CABECERA, self.dpi / 2)
+
+    def cerrar(self):
+        for img in self._cache.values():
+            try:
+                img.close()
+            except Exception:
+                pass
+        self._cache.clear()
+
+
+def _recorte_cabecera(fuente, angulo):
+    """Cabecera superior derecha de la página vista con rotación `angulo`, con el preprocesado ligero."""
+    recorte = fuente.region(angulo, CAJA_CABECERA, fuente.dpi / 2)
+    return ImageOps.autocontrast(recorte, cutoff=1)
+
+# ================== RECUADRO SII ==================
+# Los DTE impresos llevan RUT emisor, tipo de documento y folio dentro de un recuadro
+# con borde (rojo en el original, gris oscuro tras escanear en escala de grises).
+# Si aparece completo dentro de la cabecera, solo ese rectángulo va al OCR: menos
+# píxeles para detector y reconocedor, y sin logo/dirección/giro que confundan a
+# extraer_rut / extraer_numero_factura. Sin recuadro se lee el recorte completo.
+# Ojo: con recuadro, las reglas que miran el resto de la cabecera (CHEP, USO ATM)
+# solo ven su contenido; esos documentos no suelen traer recuadro SII.
+RECUADRO_SII = True
+_RECUADRO_LADO_MAX  = 400     # la búsqueda trabaja sobre el recorte reducido a este lado
+_RECUADRO_TINTA     = 160     # gris bajo esto = trazo (el rojo SII queda ~80 en gris)
+_RECUADRO_MIN_ANCHO = 0.30    # fracción del recorte
+_RECUADRO_MIN_ALTO  = 0.15
+_RECUADRO_TOLERANCIA = 0.03   # desajuste permitido entre esquinas (fracción del recorte)
+_RECUADRO_MARGEN    = 0.02    # margen que se agrega alrededor (fracción del recorte)
+
+def _tramos(tinta, largo_min):
+    """[(fila, inicio, fin)] de los tramos horizontales de trazo con largo >= largo_min."""
+    borde = np.zeros((tinta.shape[0], 1), dtype=np.int8)
+    d = np.diff(np.hstack([borde, tinta.astype(np.int8), borde]), axis=1)
+    inicios, fines = np.argwhere(d == 1), np.argwhere(d == -1)   # mismo orden (fila, columna)
+    largos = fines[:, 1] - inicios[:, 1]
+    sel = largos >= largo_min
+    return [(int(f), int(a), int(b)) for (f, a), (_, b) in zip(inicios[sel], fines[sel])]
+
+def _lineas(tramos, tol):
+    """Une tramos de filas contiguas (un trazo grueso) en líneas (posición, inicio, fin)."""
+    lineas = []
+    for fila, a, b in tramos:
+        for i, (f0, f1, a0, b0) in enumerate(lineas):
+            if fila - f1 <= 1 and abs(a - a0) <= tol and abs(b - b0) <= tol:
+                lineas[i] = (f0, fila, min(a, a0), max(b, b0))
+                break
+        else:
+            lineas.append((fila, fila, a, b))
+    return [((f0 + f1) / 2, a, b) for f0, f1, a, b in lineas]
+
+def localizar_recuadro_sii(recorte):
+    """
+    Caja (x0, y0, x1, y1) en píxeles de `recorte` del rectángulo con borde más grande
+    (el recuadro SII), o None. Proyecciones de trazos largos sobre el recorte reducido:
+    dos líneas horizontales unidas por dos verticales en sus extremos.
+    """
+    gris = ImageOps.grayscale(recorte)
+    factor = max(1, max(gris.size) // _RECUADRO_LADO_MAX)
+    if factor > 1:
+        gris = gris.reduce(factor)
+    gris = gris.filter(ImageFilter.MinFilter(3))      # engrosa trazos: cierra cortes del escaneo
+    tinta = np.asarray(gris, dtype=np.uint8) < _RECUADRO_TINTA
+    alto, ancho = tinta.shape
+    tol_x, tol_y = ancho * _RECUADRO_TOLERANCIA + 2, alto * _RECUADRO_TOLERANCIA + 2
+
+    horizontales = _lineas(_tramos(tinta, ancho * _RECUADRO_MIN_ANCHO), tol_x)
+    verticales = _lineas(_tramos(tinta.T, alto * _RECUADRO_MIN_ALTO), tol_y)
+    if len(horizontales) < 2 or len(verticales) < 2:
+        return None
+
+    def _lado(x, ya, yb):
+        return any(abs(xv - x) <= tol_x and v0 <= ya + tol_y and v1 >= yb - tol_y for xv, v0, v1 in verticales)
+
+    mejor, mejor_area = None, 0
+    for i, (ya, a0, a1) in enumerate(horizontales):
+        for yb, b0, b1 in horizontales[i + 1:]:
+            x0, x1 = max(a0, b0), min(a1, b1)
+            if yb - ya < alto * _RECUADRO_MIN_ALTO or x1 - x0 < ancho * _RECUADRO_MIN_ANCHO:
+                continue
+            if abs(a0 - b0) > tol_x or abs(a1 - b1) > tol_x:
+                continue
+            area = (x1 - x0) * (yb - ya)
+            if area > mejor_area and _lado(x0, ya, yb) and _lado(x1, ya, yb):
+                mejor, mejor_area = (x0, ya, x1, yb), area
+    if mejor is None:
+        return None
+
+    w, h = recorte.size
+    mx, my = w * _RECUADRO_MARGEN, h * _RECUADRO_MARGEN
+    x0, y0, x1, y1 = (v * factor for v in mejor)
+    return (max(0, int(x0 - mx)), max(0, int(y0 - my)), min(w, int(x1 + mx)), min(h, int(y1 + my)))
+
+def _recorte_a_leer(fuente, angulo):
+    """
+    (imagen, caja) que va al OCR para `angulo`: el recuadro SII si se encuentra en la
+    cabecera, si no la cabecera completa. `caja` en fracciones de página (marco rotado).
+    """
+    recorte = _recorte_cabecera(fuente, angulo)
+    if not RECUADRO_SII:
+        return recorte, CAJA_CABECERA
+    t0 = time.perf_counter()
+    try:
+        recuadro = localizar_recuadro_sii(recorte)
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Localizador de recuadro SII falló: {e}")
+        recuadro = None
+    metricas.registrar("OCR recuadro SII", time.perf_counter() - t0)
+    if recuadro is None:
+        return recorte, CAJA_CABECERA
+    w, h = recorte.size
+    cx0, cy0, cx1, cy1 = CAJA_CABECERA
+    x0, y0, x1, y1 = recuadro
+    caja = (cx0 + x0 / w * (cx1 - cx0), cy0 + y0 / h * (cy1 - cy0),
+            cx0 + x1 / w * (cx1 - cx0), cy0 + y1 / h * (cy1 - cy0))
+    return recorte.crop(recuadro), caja
+
+# ================== CAPA DE TEXTO (DTE nativos) ==================
+# Las facturas emitidas por software de facturación traen capa de texto: la misma
+# ventana de cabecera se lee con pdftotext en milisegundos, sin rasterizar ni OCR.
+TEXTO_PDF_MIN_CLAVES = 2   # palabras clave mínimas para confiar en la capa de texto
+
+def cabecera_desde_capa_texto(pdf_path, tamano_pts=None, min_claves=TEXTO_PDF_MIN_CLAVES) -> str:
+    """
+    Devuelve el texto de la cabecera (misma caja que el OCR, página derecha) desde la capa
+    de texto del PDF, en una sola línea y sin acentos (como lo entrega el OCR).
+    "" si no hay capa de texto, no alcanza `min_claves` palabras clave o no trae un RUT
+    válido: en ese caso el llamador sigue con el OCR de siempre.
+    """
+    from pdf.pdf_tools import info_pdf, tamano_pagina_pts, extraer_texto_region
+
+    if tamano_pts is None:
+        tamano_pts = tamano_pagina_pts(info_pdf(pdf_path))
+    ancho, alto = tamano_pts
+    x0, y0, x1, y1 = CAJA_CABECERA
+    x, y = int(ancho * x0), int(alto * y0)
+    crudo = extraer_texto_region(pdf_path, x, y, int(ancho * x1) - x + 1, int(alto * y1) - y + 1)
+
+    texto = _norm(" ".join(l.strip() for l in crudo.splitlines() if l.strip())).strip()
+    if _puntaje_cabecera(texto) < min_claves:
+        return ""
+    if extraer_rut(texto) == "desconocido":
+        return ""
+    return texto
+
+def _puntaje_cabecera(texto_completo: str) -> int:
+    """Puntaje por presencia de palabras clave (más robusto que split por si viene pegado / con ruido)."""
+    tu = texto_completo.upper()
+    return sum(1 for kw in _PALABRAS_CLAVE if kw in tu) if tu else 0
+
+# detail=1 entrega además la caja de cada texto (el texto unido es el mismo que con
+# detail=0); las cajas alimentan la memoria de plantillas por proveedor (ocr/plantillas.py)
+_READTEXT_CON_CAJAS = dict(_READTEXT_CABECERA, detail=1)
+
+def _texto_items(items) -> str:
+    return " ".join(t for _, t, _ in items).strip()
+
+def _ocr_items(recorte) -> list:
+    """OCR de un único recorte (un pase de detector + reconocedor): [(caja, texto, confianza)]."""
+    zona_np = np.array(recorte, dtype=np.uint8)
+    return get_reader().readtext(zona_np, batch_size=1, **_READTEXT_CON_CAJAS)
+
+def _ocr_recorte(recorte) -> str:
+    return _texto_items(_ocr_items(recorte))
+
+def cajas_en_pagina(items, tamano_recorte, caja=CAJA_CABECERA) -> list:
+    """
+    [(x0, y0, x1, y1), texto] de cada item OCR, en fracciones de la página (marco ya
+    rotado), a partir de sus cajas en píxeles dentro de un recorte de `caja`.
+    """
+    ancho, alto = tamano_recorte
+    cx0, cy0, cx1, cy1 = caja
+    salida = []
+    for puntos, texto, _ in items:
+        xs = [float(p[0]) for p in puntos]
+        ys = [float(p[1]) for p in puntos]
+        salida.append(((cx0 + min(xs) / ancho * (cx1 - cx0), cy0 + min(ys) / alto * (cy1 - cy0),
+                        cx0 + max(xs) / ancho * (cx1 - cx0), cy0 + max(ys) / alto * (cy1 - cy0)), texto))
+    return salida
+
+def _ocr_recortes_en_lote(recortes) -> list:
+    """
+    OCR de varios recortes con un solo pase batched del detector de EasyOCR
+    (una lista de items [(caja, texto, confianza)] por recorte).
+    readtext_batched exige imágenes del mismo tamaño: los recortes de 90/270 tienen
+    otra proporción que los de 0/180, así que se rellenan con blanco (abajo/derecha)
+    hasta el lienzo común en vez de reescalarlos (reescalar deformaría el texto).
+    """
+    if not recortes:
+        return []
+    if len(recortes) == 1:
+        return [_ocr_items(recortes[0])]
+
+    ancho = max(r.width for r in recortes)
+    alto  = max(r.height for r in recortes)
+    lote = []
+    for r in recortes:
+        if r.size != (ancho, alto):
+            lienzo = Image.new("L", (ancho, alto), 255)
+            lienzo.paste(r, (0, 0))
+            r = lienzo
+        lote.append(np.array(r, dtype=np.uint8))
+
+    return get_reader().readtext_batched(lote, batch_size=len(lote), **_READTEXT_CON_CAJAS)
+
+def parametros_ocr_cabecera() -> dict:
+    """Parámetros que determinan el resultado del OCR de cabecera (para claves de caché)."""
+    return {
+        "caja": CAJA_CABECERA,
+        "allowlist": _ALLOWLIST_CABECERA,
+        "readtext": sorted((k, v) for k, v in _READTEXT_CABECERA.items() if k != "allowlist"),
+        "orientacion": (_DPI_ORIENTACION, _ORIENTACION_CONFIANZA),
+        "angulos": (0, 180, 90, 270),
+        "recuadro_sii": RECUADRO_SII,
+    }
+
+def ocr_zona_factura_desde_png(imagen_entrada, ruta_debug=None, early_threshold=3, probar_todos_angulos=False,
+                               en_lote=False, preclasificar=True, devolver_angulo=False, detalle=None,
+                               orden_probable=None):
     """
     Detecta orientación (0/90/180/270) y realiza OCR en cabecera superior derecha.
     Si probar_todos_angulos=False: puede cortar temprano cuando alcanza early_threshold.
     Si probar_todos_angulos=True: evalúa todos los ángulos y elige el mejor (más robusto).
+    Si en_lote=True: los recortes candidatos se preparan de una vez y pasan juntos por el
+    detector (readtext_batched). Con probar_todos_angulos=False el primer ángulo se sigue
+    probando solo (la mayoría de las páginas vienen derechas) y el resto va en un único lote.
+    Si preclasificar=True (y no se prueban todos): estimar_orientacion() elige el primer ángulo.
+    Con confianza alta basta una palabra clave en ese ángulo para aceptarlo; con confianza baja
+    se usa el orden fijo de siempre.
+    imagen_entrada: ruta de imagen, PIL.Image (se asume a 280 DPI) o una fuente
+    (FuenteImagen / FuentePdf) que entrega solo las regiones pedidas.
+    Si devolver_angulo=True retorna (texto, angulo_elegido) en vez de solo el texto.
+    Si se pasa un dict en `detalle`, se completa con "cajas": cajas_en_pagina() del
+    recorte elegido (para aprender la plantilla del proveedor).
+    orden_probable: (angulos, confianza) aprendido del origen del documento
+    (ocr/orientacion_origen.py); reemplaza al orden fijo cuando el pre-clasificador
+    no está seguro.
     """
-    # --- Carga imagen desde ruta o PIL.Image
+    # --- Carga imagen desde ruta, PIL.Image o fuente
     cerrar_al_final = False
     if isinstance(imagen_entrada, str):
-        imagen_original = Image.open(imagen_entrada)
+        fuente = FuenteImagen(Image.open(imagen_entrada))
         cerrar_al_final = True
         nombre_base = os.path.splitext(os.path.basename(imagen_entrada))[0]
+    elif hasattr(imagen_entrada, "region"):
+        fuente = imagen_entrada
+        ruta_fuente = getattr(fuente, "pdf_path", None)
+        nombre_base = os.path.splitext(os.path.basename(ruta_fuente))[0] if ruta_fuente else "imagen_en_memoria"
     elif hasattr(imagen_entrada, "crop"):
-        imagen_original = imagen_entrada
+        fuente = FuenteImagen(imagen_entrada)
         nombre_base = "imagen_en_memoria"
     else:
-        raise ValueError("imagen_entrada debe ser una ruta o un objeto PIL.Image")
+        raise ValueError("imagen_entrada debe ser una ruta, un objeto PIL.Image o una fuente de página")
 
     try:
         # --- Configuración de debug (carpeta ./debug/ + nombre único)
@@ -193,49 +630,78 @@ def ocr_zona_factura_desde_png(imagen_entrada, ruta_debug=None, early_threshold=
 
         # --- Orden de ángulos: suele ser más común 0/180; 90/270 cuando viene “acostado”
         angulos = (0, 180, 90, 270)
+        umbral_primero = early_threshold
+        if orden_probable and not probar_todos_angulos:
+            angulos = tuple(orden_probable[0])
+            if orden_probable[1] >= _ORDEN_PROBABLE_CONFIANZA:
+                umbral_primero = 1
+
+        if preclasificar and not probar_todos_angulos:
+            try:
+                t0 = time.perf_counter()
+                orden, confianza = fuente.orientacion()
+                metricas.registrar("OCR orientación", time.perf_counter() - t0)
+                if confianza >= _ORIENTACION_CONFIANZA:
+                    angulos = orden
+                    umbral_primero = 1
+                registrar_log_proceso(f"🧭 Orientación estimada {orden[0]}° (confianza {confianza:0.2f})")
+            except Exception as e:
+                registrar_log_proceso(f"⚠️ Pre-clasificador de orientación falló: {e}")
+
+        mejor = {"texto": "", "puntaje": -1, "recorte": None, "angulo": 0, "items": [], "caja": CAJA_CABECERA}
 
-        mejor_texto, mejor_puntaje = "", -1
-        mejor_recorte, mejor_angulo = None, 0
-
-        for angulo in angulos:
-            tr_op = _TRANSPOSE_POR_ANGULO[angulo]
-            img = imagen_original if tr_op is None else imagen_original.transpose(tr_op)
-
-            # Recorte superior derecho (61%→100% ancho, 1%→30% alto)
-            ancho, alto = img.size
-            x0, y0, x1, y1 = int(ancho * 0.61), int(alto * 0.01), int(ancho * 1.00), int(alto * 0.30)
-            recorte = img.crop((x0, y0, x1, y1))
-
-            # Preprocesado ligero
-            recorte = ImageOps.grayscale(recorte)
-            if recorte.width > 2 and recorte.height > 2:
-                recorte = recorte.resize((recorte.width // 2, recorte.height // 2), Image.LANCZOS)
-            recorte = ImageOps.autocontrast(recorte, cutoff=1)
-
-            zona_np = np.array(recorte, dtype=np.uint8)
-            texto = get_reader().readtext(
-                zona_np,
-                detail=0,
-                batch_size=1,
-                allowlist="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-./#:() ",
-                mag_ratio=1.0,
-                width_ths=0.6,
-                slope_ths=0.999
-            )
-            texto_completo = " ".join(texto).strip()
-            tu = texto_completo.upper()
-
-            # Puntaje por presencia (más robusto que split por si viene pegado / con ruido)
-            puntaje = sum(1 for kw in _PALABRAS_CLAVE if kw in tu) if tu else 0
+        def _leer(angulo):
+            """Recorte (rasterizado perezoso en FuentePdf) + OCR de un ángulo, medidos."""
+            t0 = time.perf_counter()
+            recorte, caja = _recorte_a_leer(fuente, angulo)
+            t1 = time.perf_counter()
+            items = _ocr_items(recorte)
+            metricas.registrar("OCR recorte", t1 - t0)
+            metricas.registrar(f"OCR {angulo}°", time.perf_counter() - t1)
+            return recorte, caja, items
+
+        def _considerar(angulo, recorte, caja, items, umbral=early_threshold):
+            """Actualiza el mejor candidato; True si ya se puede cortar temprano."""
+            texto_completo = _texto_items(items)
+            puntaje = _puntaje_cabecera(texto_completo)
 
             # Tie-break: si empatan, preferimos el que tenga más texto
-            if (puntaje > mejor_puntaje) or (puntaje == mejor_puntaje and len(texto_completo) > len(mejor_texto)):
-                mejor_puntaje, mejor_texto = puntaje, texto_completo
-                mejor_recorte, mejor_angulo = recorte, angulo
+            if (puntaje > mejor["puntaje"]) or (puntaje == mejor["puntaje"] and len(texto_completo) > len(mejor["texto"])):
+                mejor.update(texto=texto_completo, puntaje=puntaje, recorte=recorte, angulo=angulo, items=items,
+                             caja=caja)
 
             # ✅ salida temprana SOLO si NO queremos probar todos
-            if (not probar_todos_angulos) and (mejor_puntaje >= early_threshold):
-                break
+            return (not probar_todos_angulos) and (mejor["puntaje"] >= umbral)
+
+        if en_lote:
+            pendientes = list(angulos)
+            cortar = False
+            if not probar_todos_angulos:
+                primero = pendientes.pop(0)
+                recorte, caja, items = _leer(primero)
+                cortar = _considerar(primero, recorte, caja, items, umbral_primero)
+
+            if pendientes and not cortar:
+                t0 = time.perf_counter()
+                recortes, cajas = zip(*(_recorte_a_leer(fuente, a) for a in pendientes))
+                t1 = time.perf_counter()
+                resultados = _ocr_recortes_en_lote(list(recortes))
+                metricas.registrar("OCR recorte", t1 - t0)
+                metricas.registrar(f"OCR lote {len(pendientes)} ángulos", time.perf_counter() - t1)
+                # Se evalúan en el mismo orden que el modo secuencial (mismo resultado)
+                for angulo, recorte, caja, items in zip(pendientes, recortes, cajas, resultados):
+                    if _considerar(angulo, recorte, caja, items):
+                        break
+        else:
+            for i, angulo in enumerate(angulos):
+                recorte, caja, items = _leer(angulo)
+                umbral = umbral_primero if i == 0 else early_threshold
+                if _considerar(angulo, recorte, caja, items, umbral):
+                    break
+
+        mejor_texto, mejor_recorte, mejor_angulo = mejor["texto"], mejor["recorte"], mejor["angulo"]
+        if detalle is not None and mejor_recorte is not None:
+            detalle["cajas"] = cajas_en_pagina(mejor["items"], mejor_recorte.size, mejor["caja"])
 
         # --- Guardados debug
         if debug_activo:
@@ -246,9 +712,7 @@ def ocr_zona_factura_desde_png(imagen_entrada, ruta_debug=None, early_threshold=
                         root, ext = os.path.splitext(ruta_debug_final)
                         ruta_rotada_base = f"{root.rsplit('_recorte', 1)[0]}_rotada{mejor_angulo}{ext}"
                         ruta_rotada = _unique_path(ruta_rotada_base)
-                        tr_op = _TRANSPOSE_POR_ANGULO[mejor_angulo]
-                        img_rotada = imagen_original if tr_op is None else imagen_original.transpose(tr_op)
-                        img_rotada.save(ruta_rotada)
+                        fuente.region(mejor_angulo, (0.0, 0.0, 1.0, 1.0), fuente.dpi / 2).save(ruta_rotada)
 
                 if ruta_debug_final and mejor_recorte is not None:
                     mejor_recorte.save(ruta_debug_final)
@@ -256,17 +720,138 @@ def ocr_zona_factura_desde_png(imagen_entrada, ruta_debug=None, early_threshold=
             except Exception as e:
                 registrar_log_proceso(f"⚠️ Error guardando recortes de debug: {e}")
 
-        return mejor_texto
+        return (mejor_texto, mejor_angulo) if devolver_angulo else mejor_texto
     finally:
         # evita fuga si imagen_entrada fue ruta (Image.open)
         if cerrar_al_final:
-            try:
-                imagen_original.close()
-            except Exception:
-                pass
+            fuente.cerrar()
+
+
+# ================== ESCALADA DE ESFUERZO ==================
+# El primer intento (ocr_zona_factura_desde_png) es el barato: recuadro SII o
+# cabecera a DPI/2 y el ángulo probable primero. Si con su texto no salen RUT y
+# folio, monitor_core sube por estos niveles: más DPI, región más amplia, todos los
+# ángulos y variantes de contraste. Cada nivel corta apenas tiene RUT + folio o al
+# agotar su presupuesto de tiempo. El presupuesto se revisa antes de rasterizar cada
+# ángulo y antes de cada lectura; una lectura ya empezada no se interrumpe, así que
+# un nivel puede pasarse de presupuesto_s en lo que dure una lectura.
+# Los candidatos se puntúan con los núcleos sin log de los extractores: solo el texto
+# elegido deja "Rut detectado" / "Núm. factura detectado" (al enrutar).
+NIVELES_ESCALADA = (
+    {"nombre": "cabecera a más DPI", "caja": CAJA_CABECERA, "escala_dpi": 0.75,
+     "variantes": ("autocontraste",), "presupuesto_s": 4.0},
+    # Esta caja ya alcanza el bloque del receptor ("Señor(es) / RUT"): su RUT no se
+    # toma como emisor sin confirmarlo (ver _escalar en core/monitor_core.py)
+    {"nombre": "región amplia con variantes de contraste", "caja": (0.40, 0.00, 1.00, 0.40), "escala_dpi": 1.0,
+     "variantes": ("autocontraste", "binarizada", "nitidez"), "presupuesto_s": 8.0, "incluye_receptor": True},
+)
+
+def datos_clave(texto: str):
+    """(rut, folio) como extraer_rut / extraer_numero_factura, sin log; "" en lo que falte."""
+    if not texto:
+        return "", ""
+    rut = _extraer_rut(texto)
+    return ("" if rut in (None, "desconocido") else rut), (_extraer_numero_factura(texto)[0] or "")
+
+def _puntaje_escalada(texto: str, datos=datos_clave):
+    """Para comparar intentos: datos clave encontrados y, a igualdad, palabras clave."""
+    rut, folio = datos(texto)
+    return (bool(rut) + bool(folio), _puntaje_cabecera(texto))
+
+def _variante(recorte, variante):
+    img = ImageOps.autocontrast(recorte, cutoff=1)
+    if variante == "binarizada":
+        return img.point(lambda v: 0 if v < 128 else 255)
+    if variante == "nitidez":
+        return img.filter(ImageFilter.UnsharpMask(radius=2, percent=150, threshold=3))
+    return img
+
+def ocr_escalado(fuente, nivel, angulos, mejor=("", 0), datos=datos_clave):
+    """
+    Un nivel de NIVELES_ESCALADA sobre `fuente`: (texto, angulo, completo).
+    `mejor` = (texto, angulo) del intento anterior; se conserva si ningún texto lo supera.
+    `datos(texto)` → (rut, folio) con que se puntúa cada lectura (por defecto datos_clave).
+    El presupuesto se revisa antes de cada ángulo y cada lectura (no durante una lectura).
+    """
+    t0 = time.perf_counter()
+    mejor_texto, mejor_angulo = mejor
+    mejor_puntaje = _puntaje_escalada(mejor_texto, datos)
+    dpi = fuente.dpi * nivel["escala_dpi"]
+    def _agotado():
+        if time.perf_counter() - t0 > nivel["presupuesto_s"]:
+            registrar_log_proceso(f"⏳ Escalada '{nivel['nombre']}': presupuesto agotado")
+            return True
+        return False
 
+    for angulo in angulos:
+        if _agotado():
+            return mejor_texto, mejor_angulo, False
+        recorte = fuente.region(angulo, nivel["caja"], dpi)
+        for variante in nivel["variantes"]:
+            if _agotado():
+                return mejor_texto, mejor_angulo, False
+            texto = _ocr_recorte(_variante(recorte, variante))
+            puntaje = _puntaje_escalada(texto, datos)
+            if puntaje > mejor_puntaje:
+                mejor_texto, mejor_angulo, mejor_puntaje = texto, angulo, puntaje
+            if mejor_puntaje[0] == 2:
+                return mejor_texto, mejor_angulo, True
+    return mejor_texto, mejor_angulo, False
+
+
+# ===================== Tablas de normalización (compiladas al importar) =====================
+# Se editan como siempre: pares en orden, equivalentes a str.replace uno tras otro.
+# ocr/normalizacion.py las compila una vez (descarta claves con minúsculas, que no
+# pueden coincidir con texto ya en mayúsculas, y aplica cada tramo en una sola
+# pasada). Tras tocar una tabla: `python -m ocr.normalizacion` verifica que la
+# versión compilada siga dando lo mismo que los str.replace en orden.
+_RE_RUT_VARIANTE = re.compile(r'\bR\s*[UUV]\s*[T7]{1,3}\s*[:\.\-;]?\b', re.IGNORECASE)
+
+# Reemplazos OCR útiles (se mantienen; quitamos los peligrosos)
+_REEMPLAZOS_RUT = {
+    "RUT :": "RUT:",
+    "RUT.": "RUT", "R.U.T.": "RUT", "R-U-T": "RUT",
+    "RUT ;": "RUT",
+    "RUT=": "RUT", "RU.T": "RUT", "RU:T": "RUT", "R:UT": "RUT", "RU.T.": "RUT",
+    "RUI": "RUT", "RU1": "RUT", "R.UT.": "RUT", "RuT;": "RUT", "RUTTT;": "RUT",
+    "Ru:,n.": "RUT", "Ru.t:": "RUT", "RVT ;": "RUT", "RVT ": "RUT", "RVT": "RUT",
+    "RUT.:": "RUT", "R.UT.:": "RUT", "R.UI.": "RUT", "R.U.T ": "RUT", "U.T.": "RUT",
+    "RU. ": "RUT",
+    "R.U.T.::": "RUT", "R.UT": "RUT", "RU.T.::": "RUT",
+    "R U.T": "RUT", "R.U.": "RUT",
+    # "RU:": "RUT",
+    "R.Ut": "RUT",
+    "R U.I": "RUT", "RuT:":"RUT", "RUt":"RUT", "R.U.1":"RUT", "R  U. T ":"RUT",
+    "R U. T":"RUT", "RuT.:":"RUT", "KUT":"RUT", "R.UT:: ":"RUT",
+    "Ru.T.::":"RUT ", "RUT.::":"RUT ", "FUT :":"RUT ",
+    # ¡NO usar "RU":"RUT " ni "RUT":"RUT "!
+    "U.T:":"RUT ", "J.T:":"RUT ", "r.u.t":"RUT ", "Nre":"RUT ", "Rut:":"RUT "
+}
+_NORMALIZAR_RUT = compilar_reemplazos(_REEMPLAZOS_RUT)
+
+# Limpiezas generales de extraer_rut: carácter a carácter, en una sola pasada
+_TRADUCCION_RUT = str.maketrans({
+    ',': '.',
+    'O': '0', 'o': '0', 'I': '1', 'l': '1', 'B': '8', 'Z': '2', 'G': '6',
+    '–': '-', '—': '-', '‐': '-', '+': '-',
+})
+
+# Patrones de RUT: cuerpo con o sin puntos + DV opcional
+_RUT_CUERPO     = r'(\d{1,2}(?:\s*\.?\s*\d{3}){2})'
+_RUT_DV_OPT     = r'(?:\s*[-‐–—]\s*([\dkK]))?'
+_RE_RUT_LINEA   = re.compile(rf'RUT\b[^\dKk]{{0,15}}{_RUT_CUERPO}{_RUT_DV_OPT}')
+_RE_RUT_CLIENTE = re.compile(rf'RUT\s*CLIENTE\b[^\dKk]{{0,20}}{_RUT_CUERPO}{_RUT_DV_OPT}')
+_RE_RUT_GLOBAL  = re.compile(rf'{_RUT_CUERPO}{_RUT_DV_OPT}')
+_RE_NO_DIGITO   = re.compile(r'\D')
 
 def extraer_rut(texto: str) -> str:
+    """RUT desde texto OCR (ver _extraer_rut); deja el RUT detectado en el log."""
+    rut = _extraer_rut(texto)
+    if rut != "desconocido":
+        registrar_log(f'🪪 Rut detectado: {rut}')
+    return rut
+
+def _extraer_rut(texto: str) -> str:
     """
     Extrae un RUT válido (proveedor o cliente) desde texto OCR.
     - Normaliza variantes de 'RUT' y errores comunes (O→0, I/l→1, B→8, Z→2, G→6).
@@ -280,39 +865,13 @@ def extraer_rut(texto: str) -> str:
     texto = texto_original.strip().upper()
 
     # ---- Normalización segura de "RUT" (evita "RUT T:") ----
-    texto = re.sub(r'\bR\s*[UUV]\s*[T7]{1,3}\s*[:\.\-;]?\b', 'RUT:', texto, flags=re.IGNORECASE)
-    texto = texto.replace('RUT :', 'RUT:')
-
-    # ---- Reemplazos OCR útiles (se mantienen; quitamos los peligrosos) ----
-    reemplazos = {
-        "RUT.": "RUT", "R.U.T.": "RUT", "R-U-T": "RUT",
-        "RUT ;": "RUT",
-        "RUT=": "RUT", "RU.T": "RUT", "RU:T": "RUT", "R:UT": "RUT", "RU.T.": "RUT",
-        "RUI": "RUT", "RU1": "RUT", "R.UT.": "RUT", "RuT;": "RUT", "RUTTT;": "RUT",
-        "Ru:,n.": "RUT", "Ru.t:": "RUT", "RVT ;": "RUT", "RVT ": "RUT", "RVT": "RUT",
-        "RUT.:": "RUT", "R.UT.:": "RUT", "R.UI.": "RUT", "R.U.T ": "RUT", "U.T.": "RUT",
-        "RU. ": "RUT",
-        "R.U.T.::": "RUT", "R.UT": "RUT", "RU.T.::": "RUT",
-        "R U.T": "RUT", "R.U.": "RUT", 
-        # "RU:": "RUT",
-          "R.Ut": "RUT",
-        "R U.I": "RUT", "RuT:":"RUT", "RUt":"RUT", "R.U.1":"RUT", "R  U. T ":"RUT",
-        "R U. T":"RUT", "RuT.:":"RUT", "KUT":"RUT", "R.UT:: ":"RUT",
-        "Ru.T.::":"RUT ", "RUT.::":"RUT ", "FUT :":"RUT ",
-        # ¡NO usar "RU":"RUT " ni "RUT":"RUT "!
-        "U.T:":"RUT ", "J.T:":"RUT ", "r.u.t":"RUT ", "Nre":"RUT ", "Rut:":"RUT "
-    }
-    for k, v in reemplazos.items():
-        texto = texto.replace(k, v)
+    texto = _RE_RUT_VARIANTE.sub('RUT:', texto)
+
+    # ---- Reemplazos OCR útiles (tabla compilada, ver _REEMPLAZOS_RUT) ----
+    texto = _NORMALIZAR_RUT(texto)
 
     # ---- Limpiezas OCR generales (sin 'u'->'0') ----
-    texto = texto.replace(',', '.')
-    texto = (texto
-             .replace('O', '0').replace('o', '0')
-             .replace('I', '1').replace('l', '1')
-             .replace('B', '8').replace('Z', '2').replace('G', '6'))
-    texto = texto.replace('–', '-').replace('—', '-').replace('‐', '-')
-    texto = texto.replace('+', '-')
+    texto = texto.translate(_TRADUCCION_RUT)
 
     debug_print_rut(texto_original, texto)
 
@@ -332,17 +891,11 @@ def extraer_rut(texto: str) -> str:
         if resto == 10: return "K"
         return str(resto)
 
-    # ---- Patrones ----
-    RUT_CUERPO   = r'(\d{1,2}(?:\s*\.?\s*\d{3}){2})'
-    RUT_DV_OPT   = r'(?:\s*[-‐–—]\s*([\dkK]))?'           # DV opcional
-    PATRON_RUT   = rf'RUT\b[^\dKk]{{0,15}}{RUT_CUERPO}{RUT_DV_OPT}'
-    PATRON_GLOBAL= rf'{RUT_CUERPO}{RUT_DV_OPT}'
-
     candidatos_proveedor, candidatos_cliente = [], []
 
     def procesa_match(m, es_cliente: bool):
         cuerpo, dv = m.group(1), (m.group(2) or "").upper()
-        rut_sin = re.sub(r'\D', '', cuerpo)
+        rut_sin = _RE_NO_DIGITO.sub('', cuerpo)
         if 7 <= len(rut_sin) <= 8:
             dv_calc = calcular_dv(rut_sin)
             if not dv:
@@ -364,26 +917,26 @@ def extraer_rut(texto: str) -> str:
         u = linea.upper()
 
         if "RUT" in u and "CLIENTE" in u:
-            m = re.search(PATRON_RUT, u)
+            m = _RE_RUT_LINEA.search(u)
             if m:
                 procesa_match(m, es_cliente=True)
             # Variante "RUT CLIENTE ... número"
-            m2 = re.search(rf'RUT\s*CLIENTE\b[^\dKk]{{0,20}}{RUT_CUERPO}{RUT_DV_OPT}', u)
+            m2 = _RE_RUT_CLIENTE.search(u)
             if m2:
                 procesa_match(m2, es_cliente=True)
             continue
 
         if "RUT" in u and "CLIENTE" not in u:
-            m = re.search(PATRON_RUT, u)
+            m = _RE_RUT_LINEA.search(u)
             if m:
                 procesa_match(m, es_cliente=False)
             continue
 
     # ---- Rescate global si no hubo nada ----
     if not candidatos_proveedor and not candidatos_cliente:
-        for m in re.finditer(PATRON_GLOBAL, texto.upper()):
+        for m in _RE_RUT_GLOBAL.finditer(texto.upper()):
             cuerpo, dv = m.group(1), (m.group(2) or "").upper()
-            rut_sin = re.sub(r'\D', '', cuerpo)
+            rut_sin = _RE_NO_DIGITO.sub('', cuerpo)
             if 7 <= len(rut_sin) <= 8:
                 dv_calc = calcular_dv(rut_sin)
                 rut = f"{rut_sin}-{dv if dv and dv == dv_calc else dv_calc}"
@@ -393,13 +946,9 @@ def extraer_rut(texto: str) -> str:
 
     # ---- Selección final ----
     if candidatos_proveedor:
-        rut = candidatos_proveedor[0]
-        registrar_log(f'🪪 Rut detectado: {rut}')
-        return rut
+        return candidatos_proveedor[0]
     if candidatos_cliente:
-        rut = candidatos_cliente[0]
-        registrar_log(f'🪪 Rut detectado: {rut}')
-        return rut
+        return candidatos_cliente[0]
 
     registrar_log_proceso("⚠️ RUT no detectado.")
     return "desconocido"
@@ -664,20 +1213,123 @@ def extraer_rut(texto: str) -> str:
 #     return numero_crudo
 
 
+# ---- Tablas y patrones de extraer_numero_factura (compilados al importar) ----
+_TRADUCCION_NUMERO = str.maketrans({
+    'O': '0', 'Q': '0', 'B': '8', 'I': '1', 'L': '1', 'S': '5',
+    'Z': '2', 'D': '0', 'E': '8', 'A': '4', 'U': '0', '/': '1',
+    '.': None, ' ': None,
+})
+
+def _corregir_ocr_numero(numero: str) -> str:
+    """Dígitos con confusiones típicas de OCR → dígitos; quita puntos y espacios."""
+    return numero.translate(_TRADUCCION_NUMERO)
+
+# Normalizaciones de prefijos → 'NRO'
+_REEMPLAZOS_NUMERO = {
+    "NP Folio:": "NRO","NI Folio:": "NRO",
+    "N°": "NRO ", "N'": "NRO ", 'N"': "NRO ", "N :": "NRO ", "N.": "NRO ",
+    "Nº": "NRO ", "N:": "NRO ", "NE": "NRO ", "N?": "NRO ", "FNLC": "NRO ",
+    "FNL": "NRO ", "FNLD": "NRO ", "FULD": "NRO ", "FOLIO": "NRO ",
+    "NC:": "NRO:", "NC ": "NRO ", "N C": "NRO ", '"NC': "NRO ", "'NC": "NRO ",
+    "NP ": "NRO ", "N°P": "NRO ", "N P": "NRO ", '"NP': "NRO ", "'NP": "NRO ",
+    "NP:": "NRO:", "Nro.:": "NRO:", "Nro. :": "NRO:", "Nro :": "NRO :",
+    "Nro.": "NRO", "NF": "NRO", "NiP": "NRO", "MP": "NRO", "NO": "NRO",
+    "Nro.  :": "NRO:", "N9": "NRO", "Ne": "NRO", "nE": "NRO", "Nro": "NRO",
+    "Nro ": "NRO", "Nro  ": "NRO", "Folio N?": "NRO", "FOLION?": "NRO ",
+    "FOLIO N°": "NRO ", "FCLIO": "NRO ", "NUMERO": "NRO ",
+    "NUMERO .": "NRO ", "No": "NRO ", "Nra": "NRO ",
+    "Folio /": "NRO ", "RUMERO :": "NRO ", "Né": "NRO ", "N '": "NRO ",
+    "NT ": "NRO ", "Nt": "NRO ", "eg.6n N": "NRO ", "ND": "NRO ", "Folio H": "NRO ",
+    "N 0": "NRO ", "Nm": "NRO ", "Ni": "NRO ", "KUMERO": "NRO ", "HUMERO": "NRO ",
+    "NUHERO": "NRO ", "XUMERO": "NRO ", "Nro: ": "NRO", "NP": "NRO", "NM": "NRO",
+    "MUMEn": "NRO","Munern": "NRO","Nr0": "NRO","Ng": "NRO","Np": "NRO","2N#": "NRO",
+    "Nw": "NRO","N  Folio:": "NRO","NP  Folio:": "NRO"," N  Folio:": "NRO",
+    "No Folio:": "NRO","NP Folio:": "NRO","Nv Folio:": "NRO","MC": "NRO","Nf Folio:": "NRO",
+    "JILICURA  JFI Region": "NRO","ucion. N": "NRO",
+}
+_NORMALIZAR_NUMERO = compilar_reemplazos(_REEMPLAZOS_NUMERO)
+
+# Variantes de "FACTURA ELECTRONICA" y ruido de cabeceras conocidas
+_REEMPLAZOS_FACTURA_ELECTRONICA = (
+    ("FACTURA ELECTRONICI", "FACTURA ELECTRONICA"),
+    ("FACTURA ELECTRONIC cion 233", "FACTURA ELECTRONICA"),
+    ("FACTURA ELECTRONIC ciWn", "FACTURA ELECTRONICA"),
+    ("FACTURA ELECFRONICA ASF LOGISTICT SFA", "FACTURA ELECTRONICA"),
+    ("Factura Electroni PUDAHUEL .   Reglon", "FACTURA ELECTRONICA"),
+    ("101. QUILICURA . PUDAHUEL .  Region", ""),
+    ("Factura Electronice", "FACTURA ELECTRONICA"),
+    ("fcys 50 Sottys", ""),
+    ("01.760-1", ""),
+    ("FACTURA ELECTRONICA NC", "FACTURA ELECTRONICA"),
+    ("FACTURA AFECTA ELECTRONICA", "FACTURA ELECTRONICA"),
+)
+_NORMALIZAR_FACTURA_ELECTRONICA = compilar_reemplazos(_REEMPLAZOS_FACTURA_ELECTRONICA)
+
+_OCR_DIGITO = r'[0-9OQBILSZDEUA]'   # dígito o letra que el OCR confunde con uno
+_RE_FACTURA_TOP = re.compile(
+    r'FACTURA\s+ELECTRONICA\b.{0,120}?'
+    r'\b(?:NO|N0|NRO|N[°º]|Nº|N°|N)\b'
+    rf'\s*[:=\-°º\.]*\s*({_OCR_DIGITO}{{3,12}})',
+    re.IGNORECASE
+)
+_RE_CONTEXTO_NO_FOLIO = re.compile(r'\b(VENTA|ORDEN|GUIA|DESPACHO|PEDIDO)\b')
+_RE_FOLIO_DERECHA     = re.compile(rf'\bN[\s°ºcC]?\s*FOLIO\b\s*[:=\-]?\s*({_OCR_DIGITO}{{6,12}})')
+_RE_FOLIO_IZQUIERDA   = re.compile(rf'\bFOLIO\b\s*(?:N[\s°ºcC]?|NO\.?)\s*[:=\-]?\s*({_OCR_DIGITO}{{6,12}})')
+# (B) Reemplazos "seguros": SOLO si es un token y viene antes de dígitos
+_RE_PREFIJOS_SEGUROS = tuple(
+    re.compile(rf'\b{prefijo}\b(?=\s*[:=\-]?\s*[0-9])', re.IGNORECASE)
+    for prefijo in (r'N[O0]\.?', 'NP', 'NM', 'NF')
+)
+_RE_NRO_NUMERO        = re.compile(rf'(NRO|NUMERO)[\s:=\.\-]+({_OCR_DIGITO}{{3,20}})', re.IGNORECASE)
+_RE_NRO_PARTIDO       = re.compile(rf'(NRO)[\s]{{1,5}}({_OCR_DIGITO}{{1,5}})[\s\.]{{1,2}}({_OCR_DIGITO}{{1,5}})')
+_RE_TELEFONO_CL       = re.compile(r'^\+?56\s?\d{2}\s?\d{4,}$')
+_RE_FACTURA_N         = re.compile(rf'FACTURA\s+ELECTRONICA(?:[^\d]{{0,40}})\bN[\s\.:=\-]*({_OCR_DIGITO}{{6,12}})')
+_RE_FACTURA_DIRECTA   = re.compile(rf'FACTURA\s+ELECTRONICA[^\d]{{0,10}}({_OCR_DIGITO}{{6,12}})')
+_RE_LINEA_NRO         = re.compile(rf'NRO[\s:=\.\-]*({_OCR_DIGITO}{{3,20}})')
+_RE_LINEA_TOLERANTE   = re.compile(rf'\bN[\s°ºOo0]?R?O?[\.:=\- ]{{0,10}}({_OCR_DIGITO}{{3,20}})\b')
+_RE_LINEA_FACTURA     = re.compile(r'FACTURA\s+(?:F\s*1\s+)?ELECTRONICA[^0-9A-Z]{0,10}([0-9OQBILSZDEUA\.]{3,20})\b')
+_RE_LINEA_NO_PEGADO   = re.compile(rf'\bNO({_OCR_DIGITO}{{3,20}})\b')
+_RE_NUMERO_OCR        = re.compile(rf'\b({_OCR_DIGITO}{{3,20}})\b')
+_RE_LINEA_SOLO_NUMERO = re.compile(rf'\s*({_OCR_DIGITO}{{3,20}})\s*')
+
+# Palabras que suelen aparecer junto a números que NO son folios (evitar falsos positivos)
+_DISTRACTORES_FOLIO = {"CONTROL", "DOC", "INTERNO", "DOC INTERNO", "ORDEN", "KP/G.D", "GUIA", "GD", "VEND", "CLIENTE"}
+
+# Priorización por contexto + longitud
+_PRIORIDAD_FOLIO = {
+    "NP_strict": 7,
+    "FacturaE_strict": 6,
+    "FacturaN": 5,
+    "NRO: exacto": 4,
+    "Factura + número en línea": 4,
+    "Prefijo tolerante": 3,
+    "Número en línea inferior": 2,
+    "Línea numérica pura": 2,
+    "NO+Número sin espacio": 2,
+    "Respaldo: número general": 1,
+    "NRO: exacto (cerca RUT)": 2,
+    "Factura + número en línea (cerca RUT)": 2,
+    "Prefijo tolerante (cerca RUT)": 1,
+    "Línea numérica pura (distractor)": 1,
+}
+
 # version 2
 # Extraer el Número de Factura
 def extraer_numero_factura(texto: str) -> str:
+    """Folio desde texto OCR ("" si no hay); deja el folio detectado en el log."""
+    numero, detalle = _extraer_numero_factura(texto)
+    if detalle is not None:
+        registrar_log(f'#️⃣  Núm. factura detectado: {numero}{detalle}')
+    return numero
+
+def _extraer_numero_factura(texto: str):
+    """Núcleo sin log de extraer_numero_factura: (folio, detalle para el log o None si no se anota)."""
 
     #Debug cntrolado por el panel
     texto_original = texto
     texto = (texto or "").strip().upper()
 
-    def corregir_ocr_numero(numero: str) -> str:
-        traduccion = str.maketrans({
-            'O': '0', 'Q': '0', 'B': '8', 'I': '1', 'L': '1', 'S': '5',
-            'Z': '2', 'D': '0', 'E': '8', 'A': '4', 'U': '0', '/': '1'
-        })
-        return numero.translate(traduccion).replace('.', '').replace(' ', '')
+    corregir_ocr_numero = _corregir_ocr_numero
 
     texto_up = texto
 
@@ -693,14 +1345,7 @@ def extraer_numero_factura(texto: str) -> str:
     #         return cand
 
     # (A) PRIORIDAD MÁXIMA: "FACTURA ELECTRONICA NO/N0/NRO/N°/Nº/N <num>" evitando "N DE VENTA N <num>"
-    patron_top = re.compile(
-        r'FACTURA\s+ELECTRONICA\b.{0,120}?'
-        r'\b(?:NO|N0|NRO|N[°º]|Nº|N°|N)\b'
-        r'\s*[:=\-°º\.]*\s*([0-9OQBILSZDEUA]{3,12})',
-        re.IGNORECASE
-    )
-
-    for m in patron_top.finditer(texto_up):
+    for m in _RE_FACTURA_TOP.finditer(texto_up):
         cand = corregir_ocr_numero(m.group(1))
         if not (cand.isdigit() and 3 <= len(cand) <= 12):
             continue
@@ -708,91 +1353,36 @@ def extraer_numero_factura(texto: str) -> str:
         # Si el número viene precedido por contexto tipo "VENTA", lo descartamos (evita tomar N de Venta)
         rel = m.start(1) - m.start(0)  # posición del grupo numérico dentro del match
         pre = m.group(0)[max(0, rel - 30):rel]  # ventana antes del número
-        if re.search(r'\b(VENTA|ORDEN|GUIA|DESPACHO|PEDIDO)\b', pre):
+        if _RE_CONTEXTO_NO_FOLIO.search(pre):
             continue
 
-            
-        registrar_log(f'#️⃣  Núm. factura detectado: {cand} (FacturaElectronica+NO/NRO)')
-        return cand
+        return cand, " (FacturaElectronica+NO/NRO)"
 
 
     # --- PRIORIDAD ALTA: FOLIO (tu código igual) ---
-    m_folio_right = re.search(
-        r'\bN[\s°ºcC]?\s*FOLIO\b\s*[:=\-]?\s*([0-9OQBILSZDEUA]{6,12})',
-        texto_up
-    )
+    m_folio_right = _RE_FOLIO_DERECHA.search(texto_up)
     if m_folio_right:
         cand = corregir_ocr_numero(m_folio_right.group(1))
         if cand.isdigit() and 6 <= len(cand) <= 12:
-            return cand
+            return cand, None
 
-    m_folio_left = re.search(
-        r'\bFOLIO\b\s*(?:N[\s°ºcC]?|NO\.?)\s*[:=\-]?\s*([0-9OQBILSZDEUA]{6,12})',
-        texto_up
-    )
+    m_folio_left = _RE_FOLIO_IZQUIERDA.search(texto_up)
     if m_folio_left:
         cand = corregir_ocr_numero(m_folio_left.group(1))
         if cand.isdigit() and 6 <= len(cand) <= 12:
-            return cand
-
-    # ---- Normalizaciones de prefijos ----
-    reemplazos = {
-        "NP Folio:": "NRO","NI Folio:": "NRO",
-        "N°": "NRO ", "N'": "NRO ", 'N"': "NRO ", "N :": "NRO ", "N.": "NRO ",
-        "Nº": "NRO ", "N:": "NRO ", "NE": "NRO ", "N?": "NRO ", "FNLC": "NRO ",
-        "FNL": "NRO ", "FNLD": "NRO ", "FULD": "NRO ", "FOLIO": "NRO ",
-        "NC:": "NRO:", "NC ": "NRO ", "N C": "NRO ", '"NC': "NRO ", "'NC": "NRO ",
-        "NP ": "NRO ", "N°P": "NRO ", "N P": "NRO ", '"NP': "NRO ", "'NP": "NRO ",
-        "NP:": "NRO:", "Nro.:": "NRO:", "Nro. :": "NRO:", "Nro :": "NRO :",
-        "Nro.": "NRO", "NF": "NRO", "NiP": "NRO", "MP": "NRO", "NO": "NRO",
-        "Nro.  :": "NRO:", "N9": "NRO", "Ne": "NRO", "nE": "NRO", "Nro": "NRO",
-        "Nro ": "NRO", "Nro  ": "NRO", "Folio N?": "NRO", "FOLION?": "NRO ",
-        "FOLIO N°": "NRO ", "FCLIO": "NRO ", "NUMERO": "NRO ",
-        "NUMERO .": "NRO ", "No": "NRO ", "Nra": "NRO ",
-        "Folio /": "NRO ", "RUMERO :": "NRO ", "Né": "NRO ", "N '": "NRO ",
-        "NT ": "NRO ", "Nt": "NRO ", "eg.6n N": "NRO ", "ND": "NRO ", "Folio H": "NRO ",
-        "N 0": "NRO ", "Nm": "NRO ", "Ni": "NRO ", "KUMERO": "NRO ", "HUMERO": "NRO ",
-        "NUHERO": "NRO ", "XUMERO": "NRO ", "Nro: ": "NRO", "NP": "NRO", "NM": "NRO",
-        "MUMEn": "NRO","Munern": "NRO","Nr0": "NRO","Ng": "NRO","Np": "NRO","2N#": "NRO",
-        "Nw": "NRO","N  Folio:": "NRO","NP  Folio:": "NRO"," N  Folio:": "NRO",
-        "No Folio:": "NRO","NP Folio:": "NRO","Nv Folio:": "NRO","MC": "NRO","Nf Folio:": "NRO",
-        "JILICURA  JFI Region": "NRO","ucion. N": "NRO",
-
-    }
+            return cand, None
 
-    for k, v in reemplazos.items():
-        texto = texto.replace(k, v)
+    # ---- Normalizaciones de prefijos (tabla compilada, ver _REEMPLAZOS_NUMERO) ----
+    texto = _NORMALIZAR_NUMERO(texto)
 
     # (B) Reemplazos "seguros": SOLO si es un token y viene antes de dígitos
-    texto = re.sub(r'\bN[O0]\.?\b(?=\s*[:=\-]?\s*[0-9])', 'NRO', texto, flags=re.IGNORECASE)
-    texto = re.sub(r'\bNP\b(?=\s*[:=\-]?\s*[0-9])', 'NRO', texto, flags=re.IGNORECASE)
-    texto = re.sub(r'\bNM\b(?=\s*[:=\-]?\s*[0-9])', 'NRO', texto, flags=re.IGNORECASE)
-    texto = re.sub(r'\bNF\b(?=\s*[:=\-]?\s*[0-9])', 'NRO', texto, flags=re.IGNORECASE)
-    texto = (texto.replace("FACTURA ELECTRONICI", "FACTURA ELECTRONICA")
-             .replace("FACTURA ELECTRONIC cion 233", "FACTURA ELECTRONICA")
-             .replace("FACTURA ELECTRONIC ciWn", "FACTURA ELECTRONICA")
-             .replace("FACTURA ELECFRONICA ASF LOGISTICT SFA", "FACTURA ELECTRONICA")
-             .replace("Factura Electroni PUDAHUEL .   Reglon", "FACTURA ELECTRONICA")
-             .replace("101. QUILICURA . PUDAHUEL .  Region", "")
-             .replace("Factura Electronice", "FACTURA ELECTRONICA")
-             .replace("fcys 50 Sottys", "")
-             .replace("01.760-1", "")
-             .replace("FACTURA ELECTRONICA NC", "FACTURA ELECTRONICA")
-             .replace("FACTURA AFECTA ELECTRONICA", "FACTURA ELECTRONICA")
-             
-             )
-    
+    for patron in _RE_PREFIJOS_SEGUROS:
+        texto = patron.sub('NRO', texto)
+    texto = _NORMALIZAR_FACTURA_ELECTRONICA(texto)
+
     # Unifica "NRO: <num>" para facilitar extracción posterior
-    texto = re.sub(
-        r'(NRO|NUMERO)[\s:=\.\-]+([0-9OQBILSZDEUA]{3,20})',
-        lambda m: f"NRO:{corregir_ocr_numero(m.group(2).upper())}",
-        texto, flags=re.IGNORECASE
-    )
-    texto = re.sub(
-        r'(NRO)[\s]{1,5}([0-9OQBILSZDEUA]{1,5})[\s\.]{1,2}([0-9OQBILSZDEUA]{1,5})',
-        lambda m: f"NRO:{corregir_ocr_numero(m.group(2) + m.group(3))}",
-        texto
-    )
+    texto = _RE_NRO_NUMERO.sub(lambda m: f"NRO:{corregir_ocr_numero(m.group(2).upper())}", texto)
+    texto = _RE_NRO_PARTIDO.sub(lambda m: f"NRO:{corregir_ocr_numero(m.group(2) + m.group(3))}", texto)
     
     debug_print_factura(texto_original, texto)
 
@@ -800,19 +1390,19 @@ def extraer_numero_factura(texto: str) -> str:
     candidatos = []
 
     # Palabras que suelen aparecer junto a números que NO son folios (evitar falsos positivos)
-    distractores = {"CONTROL", "DOC", "INTERNO", "DOC INTERNO", "ORDEN", "KP/G.D", "GUIA", "GD", "VEND", "CLIENTE"}
+    distractores = _DISTRACTORES_FOLIO
 
     def es_posible_numero_factura(num: str) -> bool:
         """Filtra teléfonos/códigos: 3..12 dígitos, todo numérico."""
         num = corregir_ocr_numero(num)
-        if re.match(r'^\+?56\s?\d{2}\s?\d{4,}$', num):  # teléfono CL
+        if _RE_TELEFONO_CL.match(num):  # teléfono CL
             return False
         if len(num) < 3 or len(num) > 12:
             return False
         return num.isdigit()
 
     # Prioridad fuerte: "FACTURA ELECTRONICA ... N <num>"
-    m_factura_n = re.search(r'FACTURA\s+ELECTRONICA(?:[^\d]{0,40})\bN[\s\.:=\-]*([0-9OQBILSZDEUA]{6,12})', texto)
+    m_factura_n = _RE_FACTURA_N.search(texto)
     if m_factura_n:
         raw = m_factura_n.group(1)
         cand = corregir_ocr_numero(raw)
@@ -820,7 +1410,7 @@ def extraer_numero_factura(texto: str) -> str:
             candidatos.append((cand, "FacturaN"))
 
     # === NUEVO: "FACTURA ELECTRONICA <num>" directo, sin 'N' intermedio ===
-    m_factura_directa = re.search(r'FACTURA\s+ELECTRONICA[^\d]{0,10}([0-9OQBILSZDEUA]{6,12})', texto)
+    m_factura_directa = _RE_FACTURA_DIRECTA.search(texto)
     if m_factura_directa:
         raw = m_factura_directa.group(1)
         cand = corregir_ocr_numero(raw)
@@ -833,7 +1423,7 @@ def extraer_numero_factura(texto: str) -> str:
         cerca_de_rut = ("RUT" in linea_upper)
 
         # NRO:12345
-        match_exacto = re.search(r'NRO[\s:=\.\-]*([0-9OQBILSZDEUA]{3,20})', linea_upper)
+        match_exacto = _RE_LINEA_NRO.search(linea_upper)
         if match_exacto:
             candidato = corregir_ocr_numero(match_exacto.group(1))
             if es_posible_numero_factura(candidato):
@@ -842,7 +1432,7 @@ def extraer_numero_factura(texto: str) -> str:
             continue
 
         # N  R O ... 12345 (tolerante a ruido)
-        match_tolerante = re.search(r'\bN[\s°ºOo0]?R?O?[\.:=\- ]{0,10}([0-9OQBILSZDEUA]{3,20})\b', linea_upper)
+        match_tolerante = _RE_LINEA_TOLERANTE.search(linea_upper)
         if match_tolerante:
             candidato = corregir_ocr_numero(match_tolerante.group(1))
             if es_posible_numero_factura(candidato):
@@ -851,7 +1441,7 @@ def extraer_numero_factura(texto: str) -> str:
             continue
 
         # "FACTURA ELECTRONICA <num>" en la misma línea
-        match_factura = re.search(r'FACTURA\s+(?:F\s*1\s+)?ELECTRONICA[^0-9A-Z]{0,10}([0-9OQBILSZDEUA\.]{3,20})\b', linea_upper)
+        match_factura = _RE_LINEA_FACTURA.search(linea_upper)
         if match_factura:
             raw = match_factura.group(1).split()[0]
             candidato = corregir_ocr_numero(raw)
@@ -861,7 +1451,7 @@ def extraer_numero_factura(texto: str) -> str:
             continue
 
         # "NO12345" pegado
-        match_nopegado = re.search(r'\bNO([0-9OQBILSZDEUA]{3,20})\b', linea_upper)
+        match_nopegado = _RE_LINEA_NO_PEGADO.search(linea_upper)
         if match_nopegado:
             candidato = corregir_ocr_numero(match_nopegado.group(1))
             if es_posible_numero_factura(candidato):
@@ -871,7 +1461,7 @@ def extraer_numero_factura(texto: str) -> str:
         # "FACTURA" en una línea y número en la siguiente
         if "FACTURA" in linea_upper and i + 1 < len(lineas):
             siguiente = lineas[i + 1].upper()
-            match_sig = re.search(r'\b([0-9OQBILSZDEUA]{3,20})\b', siguiente)
+            match_sig = _RE_NUMERO_OCR.search(siguiente)
             if match_sig:
                 candidato = corregir_ocr_numero(match_sig.group(1))
                 if es_posible_numero_factura(candidato):
@@ -879,7 +1469,7 @@ def extraer_numero_factura(texto: str) -> str:
             continue
 
         # Línea compuesta solo por números (posible folio). Penaliza si hay palabras distractoras.
-        match_solo = re.fullmatch(r'\s*([0-9OQBILSZDEUA]{3,20})\s*', linea_upper)
+        match_solo = _RE_LINEA_SOLO_NUMERO.fullmatch(linea_upper)
         if match_solo:
             candidato = corregir_ocr_numero(match_solo.group(1))
             if es_posible_numero_factura(candidato):
@@ -891,45 +1481,29 @@ def extraer_numero_factura(texto: str) -> str:
 
     # Respaldo: cualquier número plausible
     if not candidatos:
-        for m in re.findall(r'\b([0-9OQBILSZDEUA]{3,20})\b', texto):
+        for m in _RE_NUMERO_OCR.findall(texto):
             candidato = corregir_ocr_numero(m)
             if es_posible_numero_factura(candidato):
                 candidatos.append((candidato, "Respaldo: número general"))
 
     if not candidatos:
-        return ""
+        return "", None
 
     # Si hay alguno de 6+ dígitos, descarta candidatos cortos (evita IDs/códigos incidentales)
     if any(len(c[0]) >= 6 for c in candidatos):
         candidatos = [c for c in candidatos if len(c[0]) >= 6]
 
     # Priorización por contexto + longitud
-    prioridad = {
-        "NP_strict": 7,                 
-        "FacturaE_strict": 6,
-        "FacturaN": 5,
-        "NRO: exacto": 4,
-        "Factura + número en línea": 4,
-        "Prefijo tolerante": 3,
-        "Número en línea inferior": 2,
-        "Línea numérica pura": 2,
-        "NO+Número sin espacio": 2,
-        "Respaldo: número general": 1,
-        "NRO: exacto (cerca RUT)": 2,
-        "Factura + número en línea (cerca RUT)": 2,
-        "Prefijo tolerante (cerca RUT)": 1,
-        "Línea numérica pura (distractor)": 1,
-    }
+    prioridad = _PRIORIDAD_FOLIO
 
     # Si ninguna etiqueta mapea, usa el más largo como heurística
     if not any(etq in prioridad for _, etq in candidatos):
         numero_crudo, _ = max(candidatos, key=lambda x: len(x[0]))
-        return numero_crudo
+        return numero_crudo, None
 
     # Selección final: prioridad -> largo
     numero_crudo, _ = max(candidatos, key=lambda x: (prioridad.get(x[1], 0), len(x[0])))
-    registrar_log(f'#️⃣  Núm. factura detectado: {numero_crudo}')
-    return numero_crudo
+    return numero_crudo, ""
 
 
 # --- CHEP detection -----------------------------------------------------------
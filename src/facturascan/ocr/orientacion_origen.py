@@ -0,0 +1,74 @@
+# Orientación habitual por origen: qué ángulo traen los documentos de cada fuente.
+#
+#  - Origen = escáner (DeviceID + bandeja ADF/plana, ver core/scanner.py) o la
+#    carpeta de donde se tomó el PDF. Un mismo ADF suele entregar todo igual de
+#    rotado (p. ej. 180°), y el orden fijo 0/180/90/270 paga un OCR de más en
+#    cada documento.
+#  - Por origen se guarda un peso por ángulo con decaimiento exponencial: cada
+#    documento confirmado (RUT leído) multiplica los pesos por
+#    ORIENTACION_DECAIMIENTO y suma 1 al ángulo elegido. Si los operadores cambian
+#    de costumbre, la historia vieja se olvida en unas decenas de documentos.
+#  - orden() entrega los ángulos de más a menos probable y la participación del
+#    primero (confianza), con la misma forma que FuentePdf.orientacion().
+#  - Los hijos del motor OCR escriben en la misma base; cada actualización es una
+#    sola sentencia UPDATE (atómica).
+
+import os
+import time
+
+from utils.log_utils import registrar_log_proceso
+from utils.sqlite_utils import abrir_sqlite
+
+ORIENTACION_DECAIMIENTO = 0.9   # ~7 documentos de vida media
+ORIENTACION_MIN_PESO    = 2.0   # con menos historia se usa el orden fijo
+
+ANGULOS = (0, 180, 90, 270)     # orden fijo (desempate)
+
+_conexion = abrir_sqlite(
+    "orientacion_origen.sqlite",
+    "CREATE TABLE IF NOT EXISTS orientacion ("
+    " origen TEXT PRIMARY KEY,"
+    " p0 REAL NOT NULL DEFAULT 0, p90 REAL NOT NULL DEFAULT 0,"
+    " p180 REAL NOT NULL DEFAULT 0, p270 REAL NOT NULL DEFAULT 0,"
+    " actualizado REAL NOT NULL)",
+)
+
+
+def origen_carpeta(pdf_path) -> str:
+    return "carpeta:" + os.path.normcase(os.path.dirname(os.path.abspath(pdf_path)))
+
+
+def orden(origen):
+    """(angulos_ordenados, confianza 0..1) según la historia de `origen`, o None sin historia suficiente."""
+    if not origen:
+        return None
+    try:
+        fila = _conexion().execute(
+            "SELECT p0, p180, p90, p270 FROM orientacion WHERE origen = ?", (origen,)
+        ).fetchone()
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Historia de orientación no disponible: {e}")
+        return None
+    if not fila or sum(fila) < ORIENTACION_MIN_PESO:
+        return None
+    pesos = dict(zip(ANGULOS, fila))
+    angulos = tuple(sorted(ANGULOS, key=lambda a: -pesos[a]))    # sorted es estable: desempata ANGULOS
+    return angulos, pesos[angulos[0]] / sum(fila)
+
+
+def registrar(origen, angulo):
+    """Suma un documento leído en `angulo` a la historia de `origen` (con decaimiento)."""
+    if not origen or angulo not in ANGULOS:
+        return
+    d = ORIENTACION_DECAIMIENTO
+    try:
+        con = _conexion()
+        con.execute("INSERT OR IGNORE INTO orientacion (origen, actualizado) VALUES (?, ?)", (origen, time.time()))
+        con.execute(
+            "UPDATE orientacion SET p0 = p0 * ? + ?, p90 = p90 * ? + ?, p180 = p180 * ? + ?,"
+            " p270 = p270 * ? + ?, actualizado = ? WHERE origen = ?",
+            (d, angulo == 0, d, angulo == 90, d, angulo == 180, d, angulo == 270, time.time(), origen),
+        )
+        con.commit()
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ No se pudo registrar la orientación de {origen}: {e}")
@@ -0,0 +1,183 @@
+# Memoria de plantillas por proveedor: RUT emisor → ángulo y caja de su recuadro SII.
+#
+#  - Un mismo proveedor imprime el recuadro rojo (RUT, tipo de documento, folio)
+#    siempre en el mismo lugar, y sus documentos suelen llegar igual de orientados.
+#  - aprender(): tras una extracción exitosa por el recorte fijo (CAJA_CABECERA),
+#    se guarda el ángulo ganador y la caja ajustada de los textos del recuadro
+#    (RUT, folio, "FACTURA/GUIA ... ELECTRONICA", "S.I.I.") más un margen.
+#  - sondear(): antes del recorte fijo se prueban las PLANTILLAS_SONDEOS zonas más
+#    usadas (y la del RUT leído, si un sondeo encuentra un proveedor conocido pero
+#    no el folio). Cada sondeo es una ventana chica en un solo ángulo; se acepta si
+#    sale un RUT conocido y un folio. Si ninguno sirve, sigue el flujo de siempre.
+#  - Base plantillas_proveedor.sqlite, la misma para todos los procesos; cada uno
+#    guarda una copia en memoria y la relee cada PLANTILLAS_RECARGAR_S.
+
+import re
+import time
+import threading
+
+from PIL import ImageOps
+
+from ocr.ocr_utils import _ocr_recorte, _extraer_rut, _extraer_numero_factura
+from utils.log_utils import registrar_log_proceso
+from utils.sqlite_utils import abrir_sqlite
+from utils import metricas
+
+PLANTILLAS_SONDEOS    = 3       # zonas conocidas que se prueban antes del recorte fijo
+PLANTILLAS_MARGEN     = 0.02    # margen (fracción de página) alrededor de la caja aprendida
+PLANTILLAS_DPI_FACTOR = 0.7     # DPI de los sondeos = DPI nominal × esto (el recorte fijo usa 0.5)
+PLANTILLAS_AREA_MAX   = 0.6     # caja aprendida mayor que esto × recorte fijo: no se guarda
+PLANTILLAS_RECARGAR_S = 60
+
+_CLAVES_RECUADRO = ("RUT", "R.U.T", "FACTURA", "GUIA", "ELECTRONIC", "FOLIO", "S.I.I", "SII")
+_RE_NO_DIGITO = re.compile(r"\D")
+
+_conexion = abrir_sqlite(
+    "plantillas_proveedor.sqlite",
+    "CREATE TABLE IF NOT EXISTS plantillas ("
+    " rut TEXT PRIMARY KEY, angulo INTEGER NOT NULL,"
+    " x0 REAL NOT NULL, y0 REAL NOT NULL, x1 REAL NOT NULL, y1 REAL NOT NULL,"
+    " usos INTEGER NOT NULL, aciertos INTEGER NOT NULL DEFAULT 0, actualizado REAL NOT NULL)",
+)
+_memoria = {"plantillas": {}, "leido": 0.0}
+_memoria_lock = threading.Lock()
+
+
+def _plantillas():
+    """{rut: (angulo, caja, usos, aciertos)} (releída cada PLANTILLAS_RECARGAR_S)."""
+    with _memoria_lock:
+        if time.monotonic() - _memoria["leido"] < PLANTILLAS_RECARGAR_S:
+            return _memoria["plantillas"]
+    try:
+        filas = _conexion().execute(
+            "SELECT rut, angulo, x0, y0, x1, y1, usos, aciertos FROM plantillas"
+        ).fetchall()
+        plantillas = {r: (a, (x0, y0, x1, y1), u, ac) for r, a, x0, y0, x1, y1, u, ac in filas}
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ Plantillas de proveedor no disponibles: {e}")
+        plantillas = {}
+    with _memoria_lock:
+        _memoria["plantillas"], _memoria["leido"] = plantillas, time.monotonic()
+    return plantillas
+
+
+def conocido(rut) -> bool:
+    """True si `rut` ya tiene plantilla (proveedor visto antes)."""
+    return bool(rut) and rut in _plantillas()
+
+
+def zonas(n=None):
+    """Las `n` zonas (angulo, caja) más usadas; proveedores con la misma caja cuentan juntos."""
+    n = PLANTILLAS_SONDEOS if n is None else n
+    por_zona = {}
+    for angulo, caja, usos, aciertos in _plantillas().values():
+        clave = (angulo, tuple(round(v * 20) for v in caja))     # grilla de 5%
+        total, _, mejor = por_zona.get(clave, (0, None, -1))
+        if usos > mejor:
+            por_zona[clave] = (total + usos + aciertos, (angulo, caja), usos)
+        else:
+            por_zona[clave] = (total + usos + aciertos, por_zona[clave][1], mejor)
+    orden = sorted(por_zona.values(), key=lambda z: z[0], reverse=True)
+    return [z[1] for z in orden[:n]]
+
+
+def _region(fuente, angulo, caja):
+    return fuente.region(angulo, caja, fuente.dpi * PLANTILLAS_DPI_FACTOR)
+
+
+def precargar(fuente):
+    """Rasteriza por adelantado las ventanas que sondear() va a leer."""
+    for angulo, caja in zonas():
+        _region(fuente, angulo, caja)
+
+
+def sondear(fuente):
+    """(texto, angulo) si alguna plantilla conocida entrega RUT conocido + folio; si no, None."""
+    plantillas = _plantillas()
+    pendientes = zonas()
+    if not pendientes:
+        return None
+    probadas = set()
+    t0 = time.perf_counter()
+    while pendientes and len(probadas) < PLANTILLAS_SONDEOS + 1:
+        angulo, caja = pendientes.pop(0)
+        if (angulo, caja) in probadas:
+            continue
+        probadas.add((angulo, caja))
+        texto = _ocr_recorte(ImageOps.autocontrast(_region(fuente, angulo, caja), cutoff=1))
+        rut = _extraer_rut(texto)        # núcleos sin log: el texto elegido se anota al enrutar
+        if rut not in plantillas:
+            continue
+        if _extraer_numero_factura(texto)[0]:
+            metricas.registrar("OCR plantilla", time.perf_counter() - t0)
+            registrar_log_proceso(f"🧩 Plantilla de {rut} ({angulo}°) tras {len(probadas)} sondeo(s)")
+            _acierto(rut)
+            return texto, angulo
+        # Proveedor reconocido pero sin folio en esta ventana: probar la suya
+        propia = plantillas[rut][:2]
+        if propia not in probadas:
+            pendientes.insert(0, propia)
+    metricas.registrar("OCR plantilla fallida", time.perf_counter() - t0)
+    return None
+
+
+def _acierto(rut):
+    try:
+        con = _conexion()
+        con.execute("UPDATE plantillas SET aciertos = aciertos + 1 WHERE rut = ?", (rut,))
+        con.commit()
+    except Exception:
+        pass
+
+
+def _solapan(a, b) -> bool:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    area = lambda c: (c[2] - c[0]) * (c[3] - c[1])
+    return inter > 0 and inter / (area(a) + area(b) - inter) >= 0.3
+
+
+def aprender(rut, folio, angulo, cajas, caja_fija):
+    """
+    Guarda/actualiza la plantilla de `rut` con las cajas OCR (cajas_en_pagina) del
+    recorte elegido. Solo cuentan los textos del recuadro SII (RUT, folio, rótulos).
+    """
+    if not (rut and folio and cajas):
+        return
+    cuerpo = _RE_NO_DIGITO.sub("", rut.split("-")[0])
+    seleccion = []
+    for caja, texto in cajas:
+        t = (texto or "").upper()
+        digitos = _RE_NO_DIGITO.sub("", t)
+        if any(k in t for k in _CLAVES_RECUADRO) or (
+            len(digitos) >= 4 and (digitos in cuerpo or cuerpo in digitos or folio in digitos)
+        ):
+            seleccion.append(caja)
+    if not seleccion:
+        return
+    m = PLANTILLAS_MARGEN
+    nueva = (max(0.0, min(c[0] for c in seleccion) - m), max(0.0, min(c[1] for c in seleccion) - m),
+             min(1.0, max(c[2] for c in seleccion) + m), min(1.0, max(c[3] for c in seleccion) + m))
+    area_fija = (caja_fija[2] - caja_fija[0]) * (caja_fija[3] - caja_fija[1])
+
+    try:
+        con = _conexion()
+        fila = con.execute("SELECT angulo, x0, y0, x1, y1, usos FROM plantillas WHERE rut = ?", (rut,)).fetchone()
+        usos = 1
+        if fila and fila[0] == angulo and _solapan(fila[1:5], nueva):
+            # Misma plantilla: la caja crece para cubrir ambas lecturas
+            nueva = (min(fila[1], nueva[0]), min(fila[2], nueva[1]), max(fila[3], nueva[2]), max(fila[4], nueva[3]))
+            usos = fila[5] + 1
+        if (nueva[2] - nueva[0]) * (nueva[3] - nueva[1]) > PLANTILLAS_AREA_MAX * area_fija:
+            return
+        con.execute(
+            "INSERT OR REPLACE INTO plantillas (rut, angulo, x0, y0, x1, y1, usos, aciertos, actualizado)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE((SELECT aciertos FROM plantillas WHERE rut = ?), 0), ?)",
+            (rut, angulo, *nueva, usos, rut, time.time()),
+        )
+        con.commit()
+        if usos == 1:
+            registrar_log_proceso(f"🧩 Plantilla aprendida para {rut} ({angulo}°): {tuple(round(v, 3) for v in nueva)}")
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ No se pudo guardar la plantilla de {rut}: {e}")
@@ -0,0 +1,117 @@
+# Lectura del Timbre Electrónico SII (TED): código PDF417 al pie de todo DTE.
+#
+#  - El TED trae, exactos, el RUT emisor (<RE>), el tipo de DTE (<TD>: 33 factura,
+#    34 exenta, 52 guía de despacho, 56/61 notas...) y el folio (<F>). Si se lee,
+#    monitor_core usa esos datos en vez de extraer_rut / extraer_numero_factura /
+#    _es_guia_despacho (y, con TIMBRE_OMITE_OCR, ni siquiera pasa por EasyOCR).
+#  - Solo se rasteriza la franja inferior de la pág.1 (TIMBRE_FRANJA) a TIMBRE_DPI;
+#    si ahí no aparece se prueba la franja superior (página escaneada al revés).
+#    El PDF417 se decodifica en cualquier orientación.
+#  - El folio es el número SII (<F> no lleva ceros a la izquierda): normalizar_folio
+#    deja igual el que sale del texto ("N° 000123" → "123") para que un mismo
+#    documento reciba el mismo nombre por cualquiera de los dos caminos.
+#  - Decodificador: zxing-cpp (pip install zxing-cpp), opcional. Sin él esta etapa
+#    no hace nada y todo sigue por OCR como antes.
+
+import re
+
+try:
+    import zxingcpp
+except Exception:
+    zxingcpp = None
+
+TIMBRE_DPI    = 300
+TIMBRE_FRANJA = 0.45       # fracción de la altura de la página que se rasteriza
+TIMBRE_PROBAR_ARRIBA = True
+
+_RE_CAMPO = {
+    "rut":   re.compile(r"<RE>\s*([0-9.]{7,10}-[0-9Kk])\s*</RE>"),
+    "tipo":  re.compile(r"<TD>\s*(\d{2,3})\s*</TD>"),
+    "folio": re.compile(r"<F>\s*(\d{1,10})\s*</F>"),
+}
+_RE_FECHA = re.compile(r"<FE>\s*(\d{4}-\d{2}-\d{2})\s*</FE>")
+
+TIPOS_DTE = {
+    33: "factura electrónica", 34: "factura exenta", 46: "factura de compra",
+    52: "guía de despacho", 56: "nota de débito", 61: "nota de crédito",
+}
+
+
+def disponible() -> bool:
+    return zxingcpp is not None
+
+
+def _dv(cuerpo: str) -> str:
+    s = sum(int(d) * f for d, f in zip(reversed(cuerpo), [2, 3, 4, 5, 6, 7] * 2))
+    r = 11 - (s % 11)
+    return "0" if r == 11 else "K" if r == 10 else str(r)
+
+
+def parsear_ted(texto: str):
+    """
+    {'rut', 'tipo', 'folio', 'fecha'} desde el XML del TED, o None si no es un TED
+    o el RUT no pasa el dígito verificador.
+    """
+    if not texto or "<TED" not in texto:
+        return None
+    datos = {}
+    for campo, patron in _RE_CAMPO.items():
+        m = patron.search(texto)
+        if not m:
+            return None
+        datos[campo] = m.group(1)
+    cuerpo, dv = datos["rut"].replace(".", "").upper().split("-")
+    if _dv(cuerpo) != dv:
+        return None
+    m = _RE_FECHA.search(texto)
+    return {
+        "rut": f"{cuerpo}-{dv}",
+        "tipo": int(datos["tipo"]),
+        "folio": normalizar_folio(datos["folio"]),
+        "fecha": m.group(1) if m else "",
+    }
+
+
+def normalizar_folio(folio: str) -> str:
+    """Folio sin ceros a la izquierda ("000123" → "123"); lo que no son dígitos queda igual."""
+    folio = (folio or "").strip()
+    return str(int(folio)) if folio.isdigit() else folio
+
+
+def leer_timbre(imagen):
+    """Busca un PDF417 con TED en la imagen (PIL). Devuelve parsear_ted(...) o None."""
+    if zxingcpp is None:
+        return None
+    for codigo in zxingcpp.read_barcodes(imagen, formats=zxingcpp.BarcodeFormat.PDF417):
+        datos = parsear_ted(codigo.text)
+        if datos:
+            return datos
+    return None
+
+
+def timbre_desde_pdf(pdf_path, tamano_pts, dpi=TIMBRE_DPI):
+    """
+    Rasteriza la franja inferior de la pág.1 (y la superior si TIMBRE_PROBAR_ARRIBA)
+    y decodifica el timbre. `tamano_pts` = (ancho, alto) de la página en puntos.
+    """
+    if zxingcpp is None:
+        return None
+    from pdf.pdf_tools import rasterizar_region
+
+    ancho, alto = tamano_pts[0] * dpi / 72.0, tamano_pts[1] * dpi / 72.0
+    franja = int(alto * TIMBRE_FRANJA)
+    ys = [int(alto) - franja] + ([0] if TIMBRE_PROBAR_ARRIBA else [])
+    for y in ys:
+        imagen = rasterizar_region(pdf_path, dpi, 0, y, int(ancho), franja)
+        try:
+            datos = leer_timbre(imagen)
+        finally:
+            imagen.close()
+        if datos:
+            return datos
+    return None
+
+
+def describir(datos) -> str:
+    tipo = TIPOS_DTE.get(datos["tipo"], f"DTE {datos['tipo']}")
+    return f"{tipo} | RUT {datos['rut']} | folio {datos['folio']}"
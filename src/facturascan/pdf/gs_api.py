@@ -0,0 +1,252 @@
+# Motor Ghostscript en proceso (API C "gsapi" vía ctypes) para comprimir_pdf.
+#
+#  - En vez de lanzar gswin64c.exe por documento, se carga gsdll64.dll (Windows,
+#    junto al .exe de GS_PATH) o libgs (Linux/macOS) UNA vez por proceso y cada
+#    compresión es gsapi_new_instance → init_with_args → exit → delete_instance
+#    con los mismos argumentos de la línea de comandos.
+#  - Proceso GUI / hilos: los trabajos van a hasta GS_PROCESOS procesos
+#    pdf/gs_worker.py que viven toda la sesión (la DLL se carga al iniciar cada
+#    uno). Son subprocesos con su propio punto de entrada, no hijos de
+#    multiprocessing: no re-importan app.py (GUI, torch, EasyOCR). Ghostscript
+#    admite una sola instancia a la vez por proceso, así que cada uno hace un
+#    trabajo por vez; si la DLL se cae solo muere ese proceso (se lanza otro en la
+#    próxima llamada y el documento va por el .exe).
+#  - Procesos hijo del motor OCR (daemon, no pueden tener hijos): la DLL se
+#    carga en el mismo proceso y las llamadas se serializan con un lock.
+#  - Si la DLL no está disponible, ejecutar() lanza GsApiNoDisponible y el
+#    llamador vuelve al .exe.
+
+import os
+import sys
+import json
+import ctypes
+import ctypes.util
+import threading
+import subprocess
+import multiprocessing as mp
+
+from utils.log_utils import registrar_log_proceso
+
+GS_PROCESOS = 2                  # procesos Ghostscript (proceso GUI)
+ARG_WORKER  = "--gs-worker"      # app congelada: el .exe hace de pdf/gs_worker.py
+
+_GS_ARG_ENCODING_UTF8 = 1
+_GS_ERROR_QUIT = -101            # "quit" normal de -dBATCH, no es error
+
+
+class GsApiNoDisponible(RuntimeError):
+    pass
+
+
+# ===================== Carga de la DLL (por proceso) =====================
+def ruta_libreria(gs_path=None):
+    """gsdll64.dll / gsdll32.dll junto al ejecutable en Windows; libgs en otros SO."""
+    if os.name == "nt":
+        carpeta = os.path.dirname(gs_path) if gs_path else ""
+        for nombre in ("gsdll64.dll", "gsdll32.dll"):
+            cand = os.path.join(carpeta, nombre)
+            if carpeta and os.path.exists(cand):
+                return cand
+        return None
+    return ctypes.util.find_library("gs")
+
+
+_lib = None
+_lib_lock = threading.Lock()
+_salida_nula = None
+
+
+def _cargar(gs_path=None):
+    global _lib, _salida_nula
+    if _lib is not None:
+        return _lib
+    ruta = ruta_libreria(gs_path)
+    if not ruta:
+        raise GsApiNoDisponible("no se encontró la DLL de Ghostscript")
+    try:
+        lib = ctypes.WinDLL(ruta) if os.name == "nt" else ctypes.CDLL(ruta)
+    except OSError as e:
+        raise GsApiNoDisponible(f"no se pudo cargar {ruta}: {e}")
+
+    lib.gsapi_new_instance.argtypes = [ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p]
+    lib.gsapi_new_instance.restype = ctypes.c_int
+    lib.gsapi_set_arg_encoding.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    lib.gsapi_set_arg_encoding.restype = ctypes.c_int
+    lib.gsapi_init_with_args.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+    lib.gsapi_init_with_args.restype = ctypes.c_int
+    lib.gsapi_exit.argtypes = [ctypes.c_void_p]
+    lib.gsapi_exit.restype = ctypes.c_int
+    lib.gsapi_delete_instance.argtypes = [ctypes.c_void_p]
+    lib.gsapi_delete_instance.restype = None
+
+    # stdout/stderr de GS descartados (equivale a stdout=DEVNULL del .exe)
+    tipo = ctypes.WINFUNCTYPE if os.name == "nt" else ctypes.CFUNCTYPE
+    callback = tipo(ctypes.c_int, ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int)
+    lib.gsapi_set_stdio.argtypes = [ctypes.c_void_p, callback, callback, callback]
+    lib.gsapi_set_stdio.restype = ctypes.c_int
+    _salida_nula = callback(lambda _h, _s, n: n)   # referencia viva mientras exista la DLL
+
+    _lib = lib
+    return lib
+
+
+def _ejecutar_local(gs_path, argumentos):
+    """Corre Ghostscript con `argumentos` (sin el ejecutable) en este proceso. Devuelve el código."""
+    with _lib_lock:
+        lib = _cargar(gs_path)
+        instancia = ctypes.c_void_p()
+        codigo = lib.gsapi_new_instance(ctypes.byref(instancia), None)
+        if codigo < 0:
+            raise RuntimeError(f"gsapi_new_instance devolvió {codigo}")
+        try:
+            lib.gsapi_set_stdio(instancia, _salida_nula, _salida_nula, _salida_nula)
+            lib.gsapi_set_arg_encoding(instancia, _GS_ARG_ENCODING_UTF8)
+            args = ["gs"] + list(argumentos)
+            argv = (ctypes.c_char_p * len(args))(*[a.encode("utf-8") for a in args])
+            codigo = lib.gsapi_init_with_args(instancia, len(args), argv)
+            codigo_salida = lib.gsapi_exit(instancia)
+            if codigo in (0, _GS_ERROR_QUIT):
+                codigo = codigo_salida
+        finally:
+            lib.gsapi_delete_instance(instancia)
+    return codigo
+
+
+# ===================== Procesos Ghostscript (proceso GUI) =====================
+def _comando(gs_path):
+    if getattr(sys, "frozen", False):
+        return [sys.executable, ARG_WORKER, gs_path or ""]
+    return [sys.executable, "-m", "pdf.gs_worker", gs_path or ""]
+
+
+class _ProcesoGs:
+    """Un pdf/gs_worker.py vivo; lo usa un hilo a la vez (ver _tomar/_devolver)."""
+
+    def __init__(self, gs_path):
+        self.gs_path = gs_path
+        env = dict(os.environ)
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (raiz, env.get("PYTHONPATH")) if p)
+        try:
+            self.proc = subprocess.Popen(
+                _comando(gs_path),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                text=True,
+                encoding="utf-8",
+            )
+        except OSError as e:
+            raise GsApiNoDisponible(f"no se pudo lanzar el proceso de Ghostscript: {e}")
+
+    def ejecutar(self, argumentos):
+        try:
+            self.proc.stdin.write(json.dumps({"args": list(argumentos)}) + "\n")
+            self.proc.stdin.flush()
+            linea = self.proc.stdout.readline()
+        except (OSError, ValueError) as e:
+            raise GsApiNoDisponible(f"proceso de Ghostscript caído: {e}")
+        if not linea:
+            raise GsApiNoDisponible(f"proceso de Ghostscript caído (código {self.proc.poll()})")
+        respuesta = json.loads(linea)
+        if "error" in respuesta:
+            if respuesta.get("no_disponible"):
+                raise GsApiNoDisponible(respuesta["error"])
+            raise RuntimeError(respuesta["error"])
+        return respuesta["codigo"]
+
+    def cerrar(self):
+        try:
+            self.proc.stdin.close()          # el proceso termina al ver EOF
+            self.proc.wait(timeout=2)
+        except Exception:
+            try:
+                self.proc.kill()
+            except Exception:
+                pass
+
+
+_procesos = []                   # vivos (libres + ocupados)
+_libres = []
+_pool_gs = None
+_pool_cond = threading.Condition()
+
+
+def _tomar(gs_path):
+    global _pool_gs
+    cerrar_ahora = []
+    try:
+        with _pool_cond:
+            if _pool_gs != gs_path:
+                # Cambió Ghostscript: los libres se cierran; los ocupados, al devolverse
+                cerrar_ahora = [p for p in _libres]
+                for p in cerrar_ahora:
+                    _procesos.remove(p)
+                _libres.clear()
+                _pool_gs = gs_path
+            while True:
+                if _libres:
+                    return _libres.pop()
+                if len(_procesos) < max(1, GS_PROCESOS):
+                    proceso = _ProcesoGs(gs_path)
+                    _procesos.append(proceso)
+                    if len(_procesos) == 1:
+                        registrar_log_proceso(f"🧰 Ghostscript en proceso: hasta {GS_PROCESOS} procesos")
+                    return proceso
+                _pool_cond.wait()
+    finally:
+        for p in cerrar_ahora:
+            p.cerrar()
+
+
+def _devolver(proceso, sano=True):
+    with _pool_cond:
+        sigue = sano and proceso in _procesos and proceso.gs_path == _pool_gs
+        if sigue:
+            _libres.append(proceso)
+        elif proceso in _procesos:
+            _procesos.remove(proceso)
+        _pool_cond.notify()
+    if not sigue:
+        proceso.cerrar()
+
+
+def disponible(gs_path=None) -> bool:
+    return bool(ruta_libreria(gs_path))
+
+
+def ejecutar(gs_path, argumentos):
+    """
+    Ejecuta Ghostscript con `argumentos` por la API C. Lanza GsApiNoDisponible si
+    no hay DLL y RuntimeError si GS termina con código de error.
+    """
+    if not disponible(gs_path):
+        raise GsApiNoDisponible("no se encontró la DLL de Ghostscript")
+
+    if mp.current_process().daemon:
+        codigo = _ejecutar_local(gs_path, argumentos)
+    else:
+        proceso = _tomar(gs_path)
+        try:
+            codigo = proceso.ejecutar(argumentos)
+        except GsApiNoDisponible:
+            _devolver(proceso, sano=False)
+            raise
+        except BaseException:
+            _devolver(proceso)
+            raise
+        _devolver(proceso)
+
+    if codigo != 0:
+        raise RuntimeError(f"Ghostscript (gsapi) terminó con código {codigo}")
+
+
+def cerrar():
+    """Detiene los procesos Ghostscript (al cerrar la app)."""
+    with _pool_cond:
+        procesos = list(_procesos)
+        _procesos.clear()
+        _libres.clear()
+    for p in procesos:
+        p.cerrar()
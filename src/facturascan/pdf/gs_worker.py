@@ -0,0 +1,52 @@
+# Proceso Ghostscript de larga vida del motor "gsapi" (lo lanza pdf/gs_api.py).
+#
+#  - Punto de entrada liviano: solo importa pdf.gs_api (ctypes). Un hijo de
+#    multiprocessing (spawn) re-importaría app.py como __mp_main__ y con él la
+#    GUI, monitor_core, torch y EasyOCR: cientos de MB por proceso y segundos de
+#    arranque cargados a la primera compresión.
+#  - Protocolo por stdin/stdout, una línea JSON por mensaje:
+#        → {"args": [...]}
+#        ← {"codigo": n} | {"error": "...", "no_disponible": true/false}
+#    El stdout real queda solo para el protocolo: el descriptor 1 se redirige a
+#    nulo para que lo que imprima la DLL no ensucie las respuestas.
+#  - Termina cuando el proceso GUI cierra stdin (o muere).
+#
+# Uso: python -m pdf.gs_worker <gs_path>   (ejecutable congelado: app --gs-worker <gs_path>)
+
+import os
+import sys
+import json
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    gs_path = argv[0] if argv else None
+
+    canal = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    nulo = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(nulo, 1)
+    os.close(nulo)
+
+    from pdf import gs_api
+    try:
+        gs_api._cargar(gs_path)
+    except Exception:
+        pass                     # se reporta en la primera llamada
+
+    for linea in sys.stdin:
+        if not linea.strip():
+            continue
+        try:
+            pedido = json.loads(linea)
+            respuesta = {"codigo": gs_api._ejecutar_local(gs_path, pedido["args"])}
+        except gs_api.GsApiNoDisponible as e:
+            respuesta = {"error": str(e), "no_disponible": True}
+        except Exception as e:
+            respuesta = {"error": str(e), "no_disponible": False}
+        canal.write(json.dumps(respuesta) + "\n")
+        canal.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 # Utilidades para post-procesar PDFs:
 #  - compresión mediante Ghostscript (GS)
 #  - generación de nombres únicos
+#  - metadatos, texto y rasterizado parcial con Poppler (pdfinfo / pdfimages / pdftotext / pdftoppm)
 #
 # Notas:
 #  - Este módulo asume entorno Windows (usa flags de subprocess propios de Windows).
@@ -12,65 +13,127 @@
 import utils.hide as hide_subprocess  # Aplica monkey patch al importar
 import subprocess
 import os
+import io
+import re
 
 from utils.log_utils import registrar_log_proceso
 
-def comprimir_pdf(gs_path, input_path, calidad="screen", dpi=100, tamano_pagina="a4"):
+def argumentos_gs(input_path, output_path, calidad="screen", dpi=100, tamano_pagina="a4", marca=None):
     """
-    Comprime y normaliza un PDF usando Ghostscript.
+    Argumentos de Ghostscript para comprimir (sin el ejecutable).
+    `marca` queda como /Creator del PDF de salida (ver pdf/politica_compresion.py).
+    """
+    extra = []
+    if marca:
+        extra = ["-c", f"[ /Creator ({marca}) /DOCINFO pdfmark"]
+    return [
+        "-sDEVICE=pdfwrite",
+        "-dCompatibilityLevel=1.4",
+        f"-dPDFSETTINGS=/{calidad}",
+        "-dDownsampleColorImages=true",
+        f"-dColorImageResolution={dpi}",
+        "-dAutoFilterColorImages=false",
+        "-dColorImageFilter=/DCTEncode",
+        "-dDownsampleGrayImages=true",
+        f"-dGrayImageResolution={dpi}",
+        "-dAutoFilterGrayImages=false",
+        "-dGrayImageFilter=/DCTEncode",
+        "-dDownsampleMonoImages=true",
+        f"-dMonoImageResolution={dpi}",
+        "-dMonoImageFilter=/CCITTFaxEncode",
+        "-dFIXEDMEDIA",
+        "-dPDFFitPage",
+        f"-sPAPERSIZE={tamano_pagina}",
+        "-dNOPAUSE", "-dQUIET", "-dBATCH",
+        f"-sOutputFile={output_path}",
+        input_path,
+    ] + extra
+
+
+_aviso_gsapi = False
+
+def _ejecutar_gs(gs_path, argumentos, motor="proceso", prioridad_baja=False):
+    """
+    motor="proceso": un gswin64c/gs por documento (subprocess).
+    motor="gsapi":   API C de Ghostscript en procesos reutilizados (pdf/gs_api.py);
+                     si la DLL no está disponible se vuelve al ejecutable.
+    prioridad_baja:  el ejecutable corre con prioridad "debajo de lo normal" (no
+                     aplica a gsapi, cuyos procesos se comparten).
+    """
+    global _aviso_gsapi
+    if motor == "gsapi":
+        from pdf import gs_api
+        try:
+            gs_api.ejecutar(gs_path, argumentos)
+            return
+        except gs_api.GsApiNoDisponible as e:
+            if not _aviso_gsapi:
+                _aviso_gsapi = True
+                registrar_log_proceso(f"⚠️ Ghostscript en proceso no disponible ({e}). Se usa el ejecutable.")
+
+    extra = {}
+    if prioridad_baja:
+        if os.name == "nt":
+            extra["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        else:
+            extra["preexec_fn"] = lambda: os.nice(10)
+
+    # Gracias al monkey patch de utils.hide, esto ya se ejecuta oculto en Windows
+    subprocess.run(
+        [gs_path] + list(argumentos),
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **extra,
+    )
+
+
+def comprimir_pdf(gs_path, input_path, calidad="screen", dpi=100, tamano_pagina="a4", motor="proceso",
+                  marca=None, prioridad_baja=False):
+    """
+    Comprime y normaliza un PDF usando Ghostscript (motor: ver _ejecutar_gs).
+    Si la salida no queda más chica que el original, se descarta y queda el original.
+    Devuelve True si terminó (comprimido o sin ganancia) y False si falló: los errores
+    se registran y no se propagan (la cola diferida usa el False para reintentar).
     """
     try:
         # Validaciones defensivas
         if not gs_path or not os.path.exists(gs_path):
             registrar_log_proceso("⚠️ Ghostscript no encontrado o ruta inválida. Se omite compresión.")
-            return
+            return False
         if not input_path or not os.path.exists(input_path):
             registrar_log_proceso("⚠️ PDF de entrada no existe. Se omite compresión.")
-            return
+            return False
         if not input_path.lower().endswith(".pdf"):
             registrar_log_proceso("⚠️ Archivo de entrada no es PDF. Se omite compresión.")
-            return
+            return False
 
         base, ext = os.path.splitext(input_path)
         output_path = base + "_comprimido.pdf"
 
-        cmd = [
+        _ejecutar_gs(
             gs_path,
-            "-sDEVICE=pdfwrite",
-            "-dCompatibilityLevel=1.4",
-            f"-dPDFSETTINGS=/{calidad}",
-            "-dDownsampleColorImages=true",
-            f"-dColorImageResolution={dpi}",
-            "-dAutoFilterColorImages=false",
-            "-dColorImageFilter=/DCTEncode",
-            "-dDownsampleGrayImages=true",
-            f"-dGrayImageResolution={dpi}",
-            "-dAutoFilterGrayImages=false",
-            "-dGrayImageFilter=/DCTEncode",
-            "-dDownsampleMonoImages=true",
-            f"-dMonoImageResolution={dpi}",
-            "-dMonoImageFilter=/CCITTFaxEncode",
-            "-dFIXEDMEDIA",
-            "-dPDFFitPage",
-            f"-sPAPERSIZE={tamano_pagina}",
-            "-dNOPAUSE", "-dQUIET", "-dBATCH",
-            f"-sOutputFile={output_path}",
-            input_path,
-        ]
-
-        # Gracias al monkey patch de utils.hide, esto ya se ejecuta oculto en Windows
-        subprocess.run(
-            cmd,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
+            argumentos_gs(input_path, output_path, calidad=calidad, dpi=dpi, tamano_pagina=tamano_pagina,
+                          marca=marca),
+            motor=motor,
+            prioridad_baja=prioridad_baja,
         )
 
-        if os.path.exists(output_path):
+        if os.path.exists(output_path) and os.path.getsize(output_path) >= os.path.getsize(input_path):
+            try:
+                os.remove(output_path)
+            except Exception:
+                pass
+            registrar_log_proceso(
+                f"↩️ Compresión sin ganancia: se conserva el original {os.path.basename(input_path)}"
+            )
+            return True
+        elif os.path.exists(output_path):
             try:
                 os.remove(input_path)
                 os.rename(output_path, input_path)
                 registrar_log_proceso(f"✅ PDF comprimido exitosamente: {os.path.basename(input_path)}")
+                return True
             except Exception as e:
                 registrar_log_proceso(f"❌ Error al reemplazar PDF original tras compresión: {e}")
 
@@ -89,15 +152,19 @@ def comprimir_pdf(gs_path, input_path, calidad="screen", dpi=100, tamano_pagina=
                     registrar_log_proceso(f"📦 Guardado como fallback: {fallback_path}")
                 except Exception as e2:
                     registrar_log_proceso(f"❌ Error al mover fallback: {e2}")
+                return False
         else:
             registrar_log_proceso(
                 f"⚠️ Compresión fallida: {os.path.basename(input_path)} no fue reemplazado (no se generó salida)."
             )
+            return False
 
     except subprocess.CalledProcessError as e:
         registrar_log_proceso(f"❌ Error al comprimir PDF con Ghostscript: {e}")
+        return False
     except Exception as e:
         registrar_log_proceso(f"❌ Error inesperado en comprimir_pdf: {e}")
+        return False
 
 
 
@@ -116,4 +183,111 @@ def generar_nombre_unico(base_path, nombre_base):
     while os.path.exists(os.path.join(base_path, nombre_final + ".pdf")):
         nombre_final = f"{nombre_base}_{contador}"
         contador += 1
-    return nombre_final + ".pdf"
\ No newline at end of file
+    return nombre_final + ".pdf"
+
+
+# ====== Poppler: metadatos y rasterizado de regiones ======
+
+def info_pdf(pdf_path):
+    """
+    Devuelve la salida de `pdfinfo` como dict {clave: valor}
+    (claves tal como las imprime Poppler: 'Pages', 'Page size', 'Page rot', 'Producer', ...).
+    """
+    r = subprocess.run(
+        ["pdfinfo", pdf_path],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    info = {}
+    for linea in r.stdout.decode("utf-8", errors="replace").splitlines():
+        clave, sep, valor = linea.partition(":")
+        if sep:
+            info[clave.strip()] = valor.strip()
+    return info
+
+
+def info_imagenes(pdf_path):
+    """
+    Imágenes del PDF según `pdfimages -list`:
+    [{'pagina', 'tipo', 'ancho', 'alto', 'color', 'bpc', 'enc', 'x_ppi', 'y_ppi'}].
+    """
+    r = subprocess.run(
+        ["pdfimages", "-list", pdf_path],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    imagenes = []
+    for linea in r.stdout.decode("utf-8", errors="replace").splitlines()[2:]:
+        campos = linea.split()
+        if len(campos) < 14:
+            continue
+        try:
+            imagenes.append({
+                "pagina": int(campos[0]), "tipo": campos[2],
+                "ancho": int(campos[3]), "alto": int(campos[4]),
+                "color": campos[5], "bpc": int(campos[7]), "enc": campos[8],
+                "x_ppi": int(campos[12]), "y_ppi": int(campos[13]),
+            })
+        except ValueError:
+            continue
+    return imagenes
+
+
+def tamano_pagina_pts(info):
+    """(ancho, alto) en puntos de la página 1 tal como la renderiza Poppler (con /Rotate aplicado)."""
+    m = re.search(r"([\d.]+)\s*x\s*([\d.]+)", info.get("Page size", ""))
+    if not m:
+        return 595.0, 842.0   # A4 por defecto
+    ancho, alto = float(m.group(1)), float(m.group(2))
+    try:
+        rot = int(float(info.get("Page rot", "0"))) % 360
+    except ValueError:
+        rot = 0
+    return (alto, ancho) if rot in (90, 270) else (ancho, alto)
+
+
+def extraer_texto_region(pdf_path, x=None, y=None, w=None, h=None, pagina=1):
+    """
+    Texto de la capa de texto de la página `pagina` (pdftotext -layout, UTF-8).
+    Si se indican x/y/w/h (en puntos) solo se extrae esa ventana.
+    En PDFs escaneados (sin capa de texto) devuelve "" o solo espacios.
+    """
+    cmd = ["pdftotext", "-f", str(pagina), "-l", str(pagina), "-layout", "-enc", "UTF-8"]
+    if w and h:
+        cmd += ["-x", str(int(x or 0)), "-y", str(int(y or 0)), "-W", str(int(w)), "-H", str(int(h))]
+    cmd += [pdf_path, "-"]
+
+    r = subprocess.run(
+        cmd,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    return r.stdout.decode("utf-8", errors="replace")
+
+
+def rasterizar_region(pdf_path, dpi, x=None, y=None, w=None, h=None, pagina=1):
+    """
+    Rasteriza (en gris) la página `pagina` a `dpi`. Si se indican x/y/w/h (en píxeles
+    a ese DPI) Poppler genera SOLO esa ventana (-x/-y/-W/-H), sin producir el resto.
+    Devuelve un PIL.Image en modo 'L'.
+    """
+    from PIL import Image
+
+    cmd = ["pdftoppm", "-f", str(pagina), "-l", str(pagina), "-r", f"{dpi:g}", "-gray"]
+    if w and h:
+        cmd += ["-x", str(int(x or 0)), "-y", str(int(y or 0)), "-W", str(int(w)), "-H", str(int(h))]
+    cmd.append(pdf_path)
+
+    # Sin raíz de salida, pdftoppm escribe el PGM por stdout
+    r = subprocess.run(
+        cmd,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    img = Image.open(io.BytesIO(r.stdout))
+    img.load()
+    return img.convert("L") if img.mode != "L" else img
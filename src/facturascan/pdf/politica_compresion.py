@@ -0,0 +1,118 @@
+# Política de compresión: decide por documento si vale la pena pasar por Ghostscript.
+#
+#  - Datos (baratos frente a una corrida de GS): tamaño en disco, páginas,
+#    Producer/Creator (pdfinfo) e imágenes con su resolución y codificación
+#    (pdfimages -list).
+#  - Se omite la compresión si el PDF:
+#      * ya lleva nuestra marca (/Creator que escribe comprimir_pdf);
+#      * es pequeño (< COMPRESION_MIN_KB) o liviano por página;
+#      * no tiene imágenes (DTE nativo / nacido digital);
+#      * tiene imágenes ya a ≤ dpi objetivo y con codificación con pérdida o
+#        bitonal (JPEG, CCITT, JBIG2, JPX): GS no bajaría resolución ni recodificaría.
+#    Si falta algún dato (Poppler falló) se comprime, como antes.
+#  - comprimir_pdf conserva el original cuando la salida no es más chica.
+#  - Cada decisión y su resultado (KB antes/después, razón, motivo) se anota en
+#    logs/compresion.csv para ajustar los umbrales con datos reales.
+
+import os
+import csv
+import threading
+from datetime import datetime
+
+from pdf.pdf_tools import info_pdf, info_imagenes
+from utils.log_utils import carpeta_logs, registrar_log_proceso
+
+MARCA_COMPRESION          = "FacturaScan"
+COMPRESION_MIN_KB         = 80      # por debajo no se comprime
+COMPRESION_MIN_KB_PAGINA  = 60      # por debajo (promedio por página) tampoco
+COMPRESION_TOLERANCIA_PPI = 1.15    # imágenes hasta dpi × esto no cuentan como "sobre" el objetivo
+_ENC_YA_COMPRIMIDAS = {"jpeg", "ccitt", "jbig2", "jpx"}
+
+ruta_registro = os.path.join(carpeta_logs, "compresion.csv")
+_CAMPOS = ["fecha", "archivo", "etiqueta", "decision", "motivo", "paginas", "ppi_max",
+           "productor", "kb_antes", "kb_despues", "razon", "ms"]
+_registro_lock = threading.Lock()
+
+
+def marca(calidad, dpi) -> str:
+    """Valor de /Creator que deja comprimir_pdf (incluye los ajustes usados)."""
+    return f"{MARCA_COMPRESION} {calidad} {dpi}dpi"
+
+
+def analizar(ruta: str) -> dict:
+    """Datos del PDF para decidir; las claves que no se pudieron obtener quedan en None."""
+    datos = {"tamano": os.path.getsize(ruta), "paginas": None, "productor": "", "creador": "",
+             "imagenes": None}
+    try:
+        info = info_pdf(ruta)
+        datos["paginas"] = int(info.get("Pages", "0") or 0) or None
+        datos["productor"] = info.get("Producer", "")
+        datos["creador"] = info.get("Creator", "")
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ pdfinfo falló en política de compresión: {e}")
+    try:
+        datos["imagenes"] = [i for i in info_imagenes(ruta) if i["tipo"] == "image"]
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ pdfimages falló en política de compresión: {e}")
+    return datos
+
+
+def decidir(datos: dict, dpi: int):
+    """(comprimir, motivo) según los datos de analizar()."""
+    if datos["creador"].startswith(MARCA_COMPRESION):
+        return False, "ya comprimido por FacturaScan"
+    kb = datos["tamano"] / 1024
+    if kb < COMPRESION_MIN_KB:
+        return False, f"pequeño ({kb:.0f} KB)"
+    if datos["paginas"] and kb / datos["paginas"] < COMPRESION_MIN_KB_PAGINA:
+        return False, f"liviano por página ({kb / datos['paginas']:.0f} KB/pág)"
+
+    imagenes = datos["imagenes"]
+    if imagenes is None:
+        return True, "sin datos de imágenes"
+    if not imagenes:
+        return False, "sin imágenes (PDF digital)"
+    ppi_max = max(max(i["x_ppi"], i["y_ppi"]) for i in imagenes)
+    if ppi_max <= dpi * COMPRESION_TOLERANCIA_PPI and all(i["enc"] in _ENC_YA_COMPRIMIDAS for i in imagenes):
+        return False, f"imágenes ya a {ppi_max} ppi y comprimidas"
+    if ppi_max > dpi * COMPRESION_TOLERANCIA_PPI:
+        return True, f"imágenes a {ppi_max} ppi > {dpi}"
+    return True, "imágenes sin compresión con pérdida"
+
+
+def ppi_maximo(datos: dict):
+    imagenes = datos.get("imagenes")
+    if not imagenes:
+        return ""
+    return max(max(i["x_ppi"], i["y_ppi"]) for i in imagenes)
+
+
+def registrar_resultado(ruta, etiqueta, datos, comprimir, motivo, bytes_despues=None, segundos=0.0):
+    """Agrega una fila a logs/compresion.csv (una línea por documento)."""
+    antes = datos.get("tamano") or 0
+    despues = antes if bytes_despues is None else bytes_despues
+    fila = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "archivo": os.path.basename(ruta),
+        "etiqueta": etiqueta or "",
+        "decision": "comprimir" if comprimir else "omitir",
+        "motivo": motivo,
+        "paginas": datos.get("paginas") or "",
+        "ppi_max": ppi_maximo(datos),
+        "productor": (datos.get("productor") or "")[:60],
+        "kb_antes": round(antes / 1024, 1),
+        "kb_despues": round(despues / 1024, 1),
+        "razon": round(despues / antes, 3) if antes else "",
+        "ms": round(segundos * 1000),
+    }
+    try:
+        with _registro_lock:
+            os.makedirs(carpeta_logs, exist_ok=True)
+            nuevo = not os.path.exists(ruta_registro)
+            with open(ruta_registro, "a", encoding="utf-8", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=_CAMPOS)
+                if nuevo:
+                    w.writeheader()
+                w.writerow(fila)
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ No se pudo registrar la compresión: {e}")
@@ -303,6 +303,12 @@ for ($i=0; $i -lt 15; $i++) {{
                 )
 
         # cerrar FacturaScan para que Inno maneje cierre/reinicio sin prompts
+        # (os._exit no corre los atexit: antes se escribe el log pendiente)
+        try:
+            from utils.log_utils import cerrar_logs
+            cerrar_logs()
+        except Exception:
+            pass
         os._exit(0)
 
     else:
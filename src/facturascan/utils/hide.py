@@ -16,7 +16,7 @@ class FullyHiddenPopen(_original_popen):
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             startupinfo.wShowWindow = subprocess.SW_HIDE
             kwargs['startupinfo'] = startupinfo
-            kwargs['creationflags'] = CREATE_NO_WINDOW
+            kwargs['creationflags'] = kwargs.get('creationflags', 0) | CREATE_NO_WINDOW
             # No redirige stdout/stderr para que pdf2image pueda leer
             super().__init__(*args, **kwargs)
             return
@@ -26,7 +26,7 @@ class FullyHiddenPopen(_original_popen):
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         startupinfo.wShowWindow = subprocess.SW_HIDE
         kwargs['startupinfo'] = startupinfo
-        kwargs['creationflags'] = CREATE_NO_WINDOW
+        kwargs['creationflags'] = kwargs.get('creationflags', 0) | CREATE_NO_WINDOW
         kwargs.setdefault('stdin', subprocess.DEVNULL)
         kwargs.setdefault('stdout', subprocess.DEVNULL)
         kwargs.setdefault('stderr', subprocess.DEVNULL)
@@ -40,7 +40,7 @@ def hidden_run(*args, **kwargs):
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             startupinfo.wShowWindow = subprocess.SW_HIDE
             kwargs['startupinfo'] = startupinfo
-        kwargs['creationflags'] = CREATE_NO_WINDOW
+        kwargs['creationflags'] = kwargs.get('creationflags', 0) | CREATE_NO_WINDOW
     return _original_run(*args, **kwargs)
 
 def hidden_call(*args, **kwargs):
@@ -50,7 +50,7 @@ def hidden_call(*args, **kwargs):
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             startupinfo.wShowWindow = subprocess.SW_HIDE
             kwargs['startupinfo'] = startupinfo
-        kwargs['creationflags'] = CREATE_NO_WINDOW
+        kwargs['creationflags'] = kwargs.get('creationflags', 0) | CREATE_NO_WINDOW
     return _original_call(*args, **kwargs)
 
 # Monkey patch
@@ -1,6 +1,9 @@
 import os, sys
 from datetime import datetime
 import re
+import queue
+import atexit
+import threading
 import urllib.parse
 
 
@@ -12,6 +15,7 @@ def _get_base_dir():
 # Carpeta necesaria
 carpeta_base = _get_base_dir()
 carpeta_logs = os.path.join(carpeta_base, "logs")
+carpeta_cache = os.path.join(carpeta_base, "cache")   # caché OCR e índice de historial (SQLite)
 
 def _ensure_logs_dir():
     try:
@@ -29,19 +33,163 @@ def set_debug(enabled: bool):
 def is_debug() -> bool:
     return DEBUG_MODE
 
+# ====== Escritor de logs en segundo plano ======
+# registrar_log / registrar_log_proceso solo encolan (hora, tipo, mensaje): el
+# formateo, el _encode_file_uris y la escritura los hace un único hilo que deja
+# los archivos abiertos, escribe por lotes y hace un flush por lote.
+#  - Cambio de día: el nombre del archivo sale de la hora de cada mensaje.
+#  - Tope por archivo: al superar LOG_MAX_MB se rota (.1, .2 … LOG_ROTACIONES).
+#  - Al salir: atexit vacía la cola; quien sale con os._exit llama cerrar_logs().
+LOG_MAX_MB     = 20
+LOG_ROTACIONES = 3
+LOG_LOTE_MAX   = 500          # mensajes por escritura como máximo
+
+_LOG_GENERAL, _LOG_PROCESOS = 0, 1
+_FIN = object()
+
+_cola_logs = queue.SimpleQueue()
+_hilo_logs = None
+_hilo_logs_lock = threading.Lock()
+_atexit_registrado = False
+
+
+def _nombre_log(tipo, ahora):
+    if tipo == _LOG_PROCESOS:
+        return f"log_procesos_{ahora.strftime('%Y_%m_%d')}.txt"
+    return f"log_{ahora.strftime('%Y_%m')}_{ahora.strftime('%d')}.txt"
+
+
+def _linea_log(tipo, ahora, mensaje):
+    linea = f"{ahora.strftime('[%Y-%m-%d %H:%M:%S]')} {mensaje}"
+    if tipo == _LOG_GENERAL:
+        # Normalizar cualquier file:///... que venga en el mensaje
+        try:
+            linea = _encode_file_uris(linea)
+        except Exception:
+            pass
+    return linea + "\n"
+
+
+class _EscritorLogs:
+    """Estado del hilo escritor: un archivo abierto por tipo de log."""
+
+    def __init__(self):
+        self.abiertos = {}        # tipo -> (nombre, archivo)
+
+    def _archivo(self, tipo, nombre):
+        actual = self.abiertos.get(tipo)
+        if actual and actual[0] == nombre:
+            return actual[1]
+        if actual:                # cambió el día: se cierra el anterior
+            self._cerrar(tipo)
+        _ensure_logs_dir()
+        f = open(os.path.join(carpeta_logs, nombre), "a", encoding="utf-8")
+        self.abiertos[tipo] = (nombre, f)
+        return f
+
+    def _cerrar(self, tipo):
+        nombre, f = self.abiertos.pop(tipo)
+        try:
+            f.close()
+        except Exception:
+            pass
+
+    def _rotar_si_excede(self, tipo):
+        nombre, f = self.abiertos[tipo]
+        try:
+            if f.tell() < LOG_MAX_MB * 1024 * 1024:
+                return
+        except Exception:
+            return
+        self._cerrar(tipo)
+        ruta = os.path.join(carpeta_logs, nombre)
+        try:
+            for i in range(LOG_ROTACIONES - 1, 0, -1):
+                if os.path.exists(f"{ruta}.{i}"):
+                    os.replace(f"{ruta}.{i}", f"{ruta}.{i + 1}")
+            os.replace(ruta, f"{ruta}.1")
+        except OSError:
+            pass                  # otro proceso lo tiene abierto: se sigue en el mismo
+
+    def escribir(self, lote):
+        por_archivo = {}
+        for tipo, ahora, mensaje in lote:
+            clave = (tipo, _nombre_log(tipo, ahora))
+            por_archivo.setdefault(clave, []).append(_linea_log(tipo, ahora, mensaje))
+        for (tipo, nombre), lineas in por_archivo.items():
+            try:
+                f = self._archivo(tipo, nombre)
+                f.write("".join(lineas))
+                f.flush()
+                self._rotar_si_excede(tipo)
+            except Exception:
+                pass
+
+    def cerrar(self):
+        for tipo in list(self.abiertos):
+            self._cerrar(tipo)
+
+
+def _bucle_logs():
+    escritor = _EscritorLogs()
+    try:
+        while True:
+            item = _cola_logs.get()
+            lote, fin = [], item is _FIN
+            if not fin:
+                lote.append(item)
+            # Lo que ya esté en cola va en la misma escritura
+            while not fin and len(lote) < LOG_LOTE_MAX:
+                try:
+                    item = _cola_logs.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _FIN:
+                    fin = True
+                else:
+                    lote.append(item)
+            if lote:
+                escritor.escribir(lote)
+            if fin:
+                return
+    finally:
+        escritor.cerrar()
+
+
+def _encolar(tipo, mensaje):
+    global _hilo_logs, _atexit_registrado
+    if _hilo_logs is None:
+        with _hilo_logs_lock:
+            if _hilo_logs is None:
+                try:
+                    hilo = threading.Thread(target=_bucle_logs, name="escritor-logs", daemon=True)
+                    hilo.start()
+                    _hilo_logs = hilo
+                    if not _atexit_registrado:
+                        atexit.register(cerrar_logs)
+                        _atexit_registrado = True
+                except RuntimeError:
+                    # Intérprete cerrándose: sin hilo, se escribe directo
+                    _EscritorLogs().escribir([(tipo, datetime.now(), mensaje)])
+                    return
+    _cola_logs.put((tipo, datetime.now(), mensaje))
+
+
+def cerrar_logs(timeout=3.0):
+    """Escribe lo pendiente y detiene el hilo escritor (idempotente)."""
+    global _hilo_logs
+    with _hilo_logs_lock:
+        hilo, _hilo_logs = _hilo_logs, None
+    if hilo is None or not hilo.is_alive():
+        return
+    _cola_logs.put(_FIN)
+    hilo.join(timeout)
+
+
 def registrar_log_proceso(mensaje):
     if not DEBUG_MODE:
         return
-    _ensure_logs_dir()
-    ahora = datetime.now()
-    nombre_log = f"log_procesos_{ahora.strftime('%Y_%m_%d')}.txt"
-    ruta_log = os.path.join(carpeta_logs, nombre_log)
-    timestamp = ahora.strftime("[%Y-%m-%d %H:%M:%S]")
-    try:
-        with open(ruta_log, "a", encoding="utf-8") as f:
-            f.write(f"{timestamp} {mensaje}\n")
-    except Exception:
-        pass
+    _encolar(_LOG_PROCESOS, mensaje)
 
 def _encode_file_uris(text: str) -> str:
     """
@@ -73,26 +221,7 @@ def _encode_file_uris(text: str) -> str:
 
 
 def registrar_log(mensaje):
-    _ensure_logs_dir()
-    ahora = datetime.now()
-    nombre_log = f"log_{ahora.strftime('%Y_%m')}_{ahora.strftime('%d')}.txt"
-    ruta_log = os.path.join(carpeta_logs, nombre_log)
-    timestamp = ahora.strftime("[%Y-%m-%d %H:%M:%S]")
-
-    # Construimos la línea
-    linea = f"{timestamp} {mensaje}"
-
-    # Normalizar cualquier file:///... que venga en el mensaje
-    try:
-        linea = _encode_file_uris(linea)
-    except Exception:
-        pass
-
-    try:
-        with open(ruta_log, "a", encoding="utf-8") as f:
-            f.write(linea + "\n")
-    except Exception:
-        pass
+    _encolar(_LOG_GENERAL, mensaje)
 
 
 # ====== Links a documentos procesados (para doble click en el log GUI) ======
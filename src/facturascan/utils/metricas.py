@@ -0,0 +1,181 @@
+# Métricas de tiempo por etapa (siempre activas, bajo costo).
+#
+#  - registrar(etapa, segundos) suma la muestra a un histograma en memoria con
+#    cubetas geométricas (0.5 ms … ~10 min, +20% por cubeta): memoria fija sin
+#    importar cuántos documentos pasen; p50/p95 salen de las cubetas (error < 10%)
+#    y el máximo es exacto.
+#  - Cada METRICAS_EXPORTAR_CADA_S se escriben logs/metricas_etapas.json y .csv
+#    (solo si hubo muestras nuevas) y una última vez al cerrar la app (cerrar()).
+#  - Los procesos hijo del motor OCR no exportan: envían su estado con
+#    tomar_estado(reiniciar=True) y el proceso GUI lo suma con fusionar().
+
+import os
+import csv
+import json
+import math
+import time
+import atexit
+import bisect
+import threading
+from datetime import datetime
+
+from utils.log_utils import carpeta_logs, registrar_log_proceso
+
+METRICAS_EXPORTAR_CADA_S = 60
+EXPORTAR = True                  # False en procesos hijo (exporta el proceso GUI)
+
+_MIN_S, _FACTOR, _N_CUBETAS = 0.0005, 1.2, 76
+_LIMITES = [_MIN_S * _FACTOR ** i for i in range(_N_CUBETAS)]   # límite superior de cada cubeta
+
+ruta_json = os.path.join(carpeta_logs, "metricas_etapas.json")
+ruta_csv = os.path.join(carpeta_logs, "metricas_etapas.csv")
+
+_lock = threading.Lock()
+_etapas = {}                     # etapa -> [cubetas, n, suma, max]
+_orden = []                      # etapas en orden de aparición (así se listan)
+_desde = datetime.now()
+_version = 0                     # sube con cada muestra; el exportador compara
+_exportado = 0
+_hilo = None
+
+
+def registrar(etapa: str, segundos: float):
+    global _version
+    i = bisect.bisect_left(_LIMITES, segundos)
+    with _lock:
+        h = _etapas.get(etapa)
+        if h is None:
+            h = _etapas[etapa] = [[0] * (_N_CUBETAS + 1), 0, 0.0, 0.0]
+            _orden.append(etapa)
+        h[0][i] += 1
+        h[1] += 1
+        h[2] += segundos
+        if segundos > h[3]:
+            h[3] = segundos
+        _version += 1
+    if EXPORTAR and _hilo is None:
+        _iniciar_exportador()
+
+
+def _percentil(cubetas, n, maximo, p):
+    objetivo = p / 100 * n
+    acumulado = 0
+    for i, c in enumerate(cubetas):
+        acumulado += c
+        if c and acumulado >= objetivo:
+            if i >= _N_CUBETAS:
+                return maximo
+            inferior = _LIMITES[i - 1] if i else 0.0
+            # Centro geométrico de la cubeta (o el máximo si es menor)
+            return min(maximo, math.sqrt(inferior * _LIMITES[i]) if inferior else _LIMITES[i] / 2)
+    return maximo
+
+
+def resumen():
+    """[{etapa, n, p50_s, p95_s, max_s, media_s}] en orden de aparición."""
+    with _lock:
+        copia = [(e, list(_etapas[e][0]), *_etapas[e][1:]) for e in _orden]
+    filas = []
+    for etapa, cubetas, n, suma, maximo in copia:
+        filas.append({
+            "etapa": etapa,
+            "n": n,
+            "p50_s": round(_percentil(cubetas, n, maximo, 50), 4),
+            "p95_s": round(_percentil(cubetas, n, maximo, 95), 4),
+            "max_s": round(maximo, 4),
+            "media_s": round(suma / n, 4) if n else 0.0,
+        })
+    return filas
+
+
+def reiniciar():
+    global _desde, _version
+    with _lock:
+        _etapas.clear()
+        _orden.clear()
+        _desde = datetime.now()
+        _version += 1
+
+
+# ---------------- procesos hijo ----------------
+def tomar_estado(reiniciar=False):
+    """Estado crudo (serializable) para enviarlo a otro proceso."""
+    with _lock:
+        estado = {e: [list(h[0]), h[1], h[2], h[3]] for e, h in _etapas.items()}
+        if reiniciar:
+            _etapas.clear()
+            _orden.clear()
+    return estado
+
+
+def fusionar(estado):
+    """Suma el estado de un proceso hijo (ver tomar_estado)."""
+    global _version
+    if not estado:
+        return
+    with _lock:
+        for etapa, (cubetas, n, suma, maximo) in estado.items():
+            h = _etapas.get(etapa)
+            if h is None:
+                h = _etapas[etapa] = [[0] * (_N_CUBETAS + 1), 0, 0.0, 0.0]
+                _orden.append(etapa)
+            h[0] = [a + b for a, b in zip(h[0], cubetas)]
+            h[1] += n
+            h[2] += suma
+            h[3] = max(h[3], maximo)
+        _version += 1
+    if EXPORTAR and _hilo is None:
+        _iniciar_exportador()
+
+
+# ---------------- exportación ----------------
+def exportar():
+    """Escribe JSON y CSV con el resumen actual (escritura atómica: .tmp + replace)."""
+    global _exportado
+    version = _version
+    filas = resumen()
+    try:
+        os.makedirs(carpeta_logs, exist_ok=True)
+        datos = {
+            "generado": datetime.now().isoformat(timespec="seconds"),
+            "desde": _desde.isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "etapas": filas,
+        }
+        tmp = ruta_json + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, ruta_json)
+
+        tmp = ruta_csv + ".tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=["etapa", "n", "p50_s", "p95_s", "max_s", "media_s"])
+            w.writeheader()
+            w.writerows(filas)
+        os.replace(tmp, ruta_csv)
+        _exportado = version
+    except Exception as e:
+        registrar_log_proceso(f"⚠️ No se pudieron exportar métricas: {e}")
+
+
+def _bucle_exportador():
+    while True:
+        time.sleep(METRICAS_EXPORTAR_CADA_S)
+        if _version != _exportado:
+            exportar()
+
+
+def cerrar():
+    """Última exportación. Se registra con atexit; quien sale con os._exit la llama antes."""
+    if EXPORTAR and _version != _exportado:
+        exportar()
+
+
+def _iniciar_exportador():
+    global _hilo
+    with _lock:
+        if _hilo is not None:
+            return
+        _hilo = threading.Thread(target=_bucle_exportador, name="metricas-export", daemon=True)
+    _hilo.start()
+    atexit.register(cerrar)
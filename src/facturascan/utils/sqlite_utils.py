@@ -0,0 +1,53 @@
+# Almacenes SQLite locales (<carpeta_base>/cache): caché OCR, historial, plantillas,
+# orientación por origen y cola de compresión diferida.
+#
+#  - abrir_sqlite(nombre, esquema) devuelve un objeto invocable que entrega la
+#    conexión de ESTE hilo (sqlite3 no comparte conexiones entre hilos) y la crea
+#    la primera vez: carpeta, WAL (lectores y un escritor a la vez, también entre
+#    procesos), synchronous=NORMAL y el esquema.
+#  - `migraciones`: sentencias que pueden fallar si ya se aplicaron (ALTER TABLE
+#    ... ADD COLUMN en bases de una versión anterior).
+
+import os
+import sqlite3
+import threading
+
+from utils.log_utils import carpeta_cache
+
+
+class Almacen:
+    def __init__(self, ruta, esquema, timeout=5, migraciones=()):
+        self.ruta = ruta
+        self.esquema = esquema
+        self.timeout = timeout
+        self.migraciones = tuple(migraciones)
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=self.timeout)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(self.esquema)
+            for sentencia in self.migraciones:
+                try:
+                    con.execute(sentencia)
+                except sqlite3.OperationalError:
+                    pass
+            con.commit()
+            self._local.con = con
+        return con
+
+    def cerrar(self):
+        """Cierra la conexión de este hilo (la próxima llamada abre otra, p. ej. tras cambiar `ruta`)."""
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            self._local.con = None
+            con.close()
+
+
+def abrir_sqlite(nombre, esquema, timeout=5, migraciones=()) -> Almacen:
+    """Almacén `nombre` dentro de la carpeta de caché; la conexión se abre al primer uso."""
+    return Almacen(os.path.join(carpeta_cache, nombre), esquema, timeout, migraciones)
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from core import historial
+
+
+@pytest.fixture
+def salida(tmp_path):
+    historial._conexion.cerrar()
+    historial._conexion.ruta = str(tmp_path / "historial.sqlite")
+    carpeta = tmp_path / "salida"
+    carpeta.mkdir()
+    yield carpeta
+    historial._conexion.cerrar()
+
+
+def _pdf(carpeta, nombre, fecha):
+    ruta = carpeta / nombre
+    ruta.write_bytes(b"%PDF-1.4\n")
+    ts = fecha.timestamp()
+    os.utime(ruta, (ts, ts))
+    historial.registrar(str(ruta))
+    return nombre
+
+
+@pytest.fixture
+def documentos(salida):
+    return salida, {
+        "ene15": _pdf(salida, "Suc_76123456-7_factura_1_2025_1.pdf", datetime(2025, 1, 15, 10)),
+        "mar15": _pdf(salida, "Suc_76123456-7_factura_2_2025_3.pdf", datetime(2025, 3, 15, 18)),
+        "mar16": _pdf(salida, "Suc_76123456-7_factura_3_2025_3.pdf", datetime(2025, 3, 16, 9)),
+        "jul15": _pdf(salida, "Suc_76123456-7_guia_4_2025.pdf", datetime(2025, 7, 15, 12)),
+        "otro":  _pdf(salida, "Suc_76123456-7_factura_5_2024_3.pdf", datetime(2024, 3, 15, 12)),
+    }
+
+
+def _archivos(carpeta, **filtros):
+    return {r["archivo"] for r in historial.buscar(str(carpeta), **filtros)}
+
+
+def test_solo_anio(documentos):
+    carpeta, d = documentos
+    assert _archivos(carpeta, anio=2025) == {d["ene15"], d["mar15"], d["mar16"], d["jul15"]}
+
+
+def test_anio_y_dia_sin_mes_busca_ese_dia_en_todos_los_meses(documentos):
+    carpeta, d = documentos
+    assert _archivos(carpeta, anio=2025, dia=15) == {d["ene15"], d["mar15"], d["jul15"]}
+
+
+def test_anio_mes_y_dia(documentos):
+    carpeta, d = documentos
+    assert _archivos(carpeta, anio=2025, mes=3, dia=15) == {d["mar15"]}
+    assert _archivos(carpeta, anio=2025, mes=3) == {d["mar15"], d["mar16"]}
+
+
+def test_fecha_imposible_no_encuentra_nada(documentos):
+    carpeta, _ = documentos
+    assert _archivos(carpeta, anio=2025, mes=2, dia=31) == set()
+
+
+def test_reconciliar_actualiza_la_fecha_de_un_pdf_reemplazado(salida):
+    nombre = _pdf(salida, "Suc_76123456-7_factura_9_2025_3.pdf", datetime(2025, 3, 15, 12))
+    historial.reconciliar(str(salida))
+
+    # Reemplazo con el mismo nombre (p. ej. la compresión diferida) + otro archivo
+    # para que cambie el mtime de la carpeta
+    ts = datetime(2025, 4, 2, 8).timestamp()
+    os.utime(salida / nombre, (ts, ts))
+    (salida / "Suc_76123456-7_factura_10_2025_4.pdf").write_bytes(b"%PDF-1.4\n")
+    cambios = []
+    historial.reconciliar(str(salida), al_avanzar=lambda nuevas, n: cambios.append(n))
+
+    assert cambios == [1]
+    assert _archivos(salida, anio=2025, mes=4, dia=2) == {nombre}
+    assert _archivos(salida, anio=2025, mes=3) == set()
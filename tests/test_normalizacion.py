@@ -0,0 +1,36 @@
+import pytest
+
+from ocr.normalizacion import compilar_reemplazos, corpus_sintetico, verificar_equivalencia
+
+TABLAS = ("_NORMALIZAR_RUT", "_NORMALIZAR_NUMERO", "_NORMALIZAR_FACTURA_ELECTRONICA")
+
+
+@pytest.fixture(scope="module")
+def ocr_utils():
+    # ocr_utils carga EasyOCR al importarse
+    pytest.importorskip("easyocr")
+    from ocr import ocr_utils
+    return ocr_utils
+
+
+def test_tabla_con_claves_encadenadas_y_solapadas_equivale_a_la_secuencial():
+    # "R.U.T" crea "RUT" (que lo toma una clave posterior) y "NRO" / "NRO." se solapan
+    r = compilar_reemplazos([("R.U.T", "RUT"), ("RUT:", "RUT "), ("NRO.", "N°"),
+                             ("NRO", "N°"), ("Nro.", "N°"), ("O", "0")])
+    assert "Nro." in r.descartadas
+    assert verificar_equivalencia(r, corpus_sintetico(r.pares, n=2000)) == []
+
+
+@pytest.mark.parametrize("nombre", TABLAS)
+def test_tablas_compiladas_equivalen_a_las_secuenciales(ocr_utils, nombre):
+    r = getattr(ocr_utils, nombre)
+    assert verificar_equivalencia(r, corpus_sintetico(r.pares)) == []
+
+
+def test_extractores_dan_las_salidas_de_referencia(ocr_utils):
+    from debug import bench_extractores
+
+    _, n, difs = bench_extractores.equivalencia()
+    assert n > 0
+    assert [(fila["texto"], funcion, esperado, obtenido)
+            for fila, funcion, esperado, obtenido in difs[:5]] == []